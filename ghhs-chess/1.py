@@ -1,25 +1,57 @@
 import pygame
-import os
+import argparse
 import sys
 from pygame.locals import *
 import time
+import threading
+import multiprocessing
+
+from position import EMPTY, BLACK, PIECE_NAMES
+from engine import Game, ЧИСЛО_ПРОЦЕССОВ_ПОИСКА, ЧИСЛО_ВАРИАНТОВ
+from search import MATE, MATE_BOUND
+from pgn import move_to_san
+import profiler
+import sprites
 
 # Константы
-ШИРИНА, ВЫСОТА = 1000, 1000
+ШИРИНА, ВЫСОТА = 1000, 1000  # Размер окна при запуске (меняется параметром --size и мышью)
 РАЗМЕР_ДОСКИ = 8
-РАЗМЕР_КЛЕТКИ = ШИРИНА // РАЗМЕР_ДОСКИ
-ЧАСТОТА_КАДРОВ = 60
+МИН_РАЗМЕР_ОКНА = 480  # Меньше таймеры и панель анализа не помещаются
+ЧАСТОТА_КАДРОВ = 60  # Не чаще, даже если события идут потоком
+ПЕРИОД_ИНДИКАТОРА = 0.5  # Точки в "Думаю..." меняются два раза в секунду
+СОБЫТИЕ_ХОД_ИИ = pygame.USEREVENT + 1  # Фоновый поиск ИИ закончил ход
+СОБЫТИЕ_АНАЛИЗ = pygame.USEREVENT + 2  # Анализ закончил очередную глубину - обновить панель
+ПОНДЕРИНГ = False  # ИИ ищет ответ на ожидаемый ход, пока думает человек (--ponder): занимает все процессы поиска
+ХОДОВ_В_ВАРИАНТЕ = 6  # Сколько ходов варианта показывать на панели анализа
 ЦВЕТ_ВЫДЕЛЕНИЯ = (177, 167, 252, 150)  # Цвет выделения с прозрачностью
 ЦВЕТ_ВОЗМОЖНЫХ_ХОДОВ = (177, 167, 252, 150)    # Цвет возможных ходов
+ФАЙЛ_ПАРТИЙ = 'games.pgn'  # Сюда дописываются законченные партии
+ПЕРИОД_ЗАМЕРОВ = 0.5  # Как часто обновлять замеры поверх доски (F3)
+ЦВЕТ_ЗАМЕРОВ = (255, 255, 255, 210)
+
+
+
+def timer_areas(size):
+    """Области таймеров, индикатора раздумий и панели анализа (нарисованы поверх доски size x size)"""
+    return [
+        pygame.Rect(5, size - 310, 200, 50),
+        pygame.Rect(size - 205, size - 310, 200, 50),
+        pygame.Rect(size - 200, size - 250, 200, 40),
+        pygame.Rect(5, size - 250, 480, 110),  # Панель анализа (F2)
+    ]
+
 
 # Цвета клеток
 ЦВЕТ_СВЕТЛОЙ_КЛЕТКИ = (232, 237, 249)
 ЦВЕТ_ТЕМНОЙ_КЛЕТКИ = (183, 192, 216)
 
-# Инициализация Pygame
-pygame.init()
-экран = pygame.display.set_mode((ШИРИНА, ВЫСОТА))
-pygame.display.set_caption("Ghhs-chess")
+# Инициализация Pygame (только в главном процессе: процессы параллельного поиска
+# при запуске через spawn заново импортируют этот файл, и окно им не нужно)
+if multiprocessing.parent_process() is None:
+    pygame.init()
+    экран = pygame.display.set_mode((ШИРИНА, ВЫСОТА), RESIZABLE)
+    pygame.display.set_caption("Ghhs-chess")
+    pygame.event.set_blocked(MOUSEMOTION)  # Движения мыши не нужны - пусть не будят цикл
 часы = pygame.time.Clock()
 
 # Цвета
@@ -28,321 +60,360 @@ pygame.display.set_caption("Ghhs-chess")
 КРАСНЫЙ = (255, 0, 0)
 ЗЕЛЕНЫЙ = (0, 255, 0)
 
-class ChessGame:
-    def __init__(self):
-        self.board = self.fen_to_board("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+class ChessGame(Game):
+    """Окно партии: правила, часы и ИИ - в engine.Game, здесь отрисовка и ввод"""
+
+    def __init__(self, movegen='mailbox', workers=ЧИСЛО_ПРОЦЕССОВ_ПОИСКА, size=None):
+        super().__init__(movegen, workers)
         self.selected_piece = None
         self.valid_moves = []
-        self.current_player = 'white'
-        self.game_over = False
-        self.winner = None # победитель
         self.vs_computer = False
-
-        # Таймеры
-        self.white_time = 180  # 3 минуты в секундах
-        self.black_time = 180
-        self.start_time = time.time()
-
+        self.thinking = False  # ИИ ищет ход в фоновом потоке
+        self.think_started = 0
+        self.stop_thinking = None
+        self.show_profile = False  # Замеры поверх доски (F3)
+        self.show_analysis = False  # Панель лучших вариантов (F2)
+        self.ponder = ПОНДЕРИНГ
+        self.analysis_worker = None  # Поток анализа, пока ход человека
+        self.analysis_stop = None
+        self.analysis_key = None  # Какую позицию анализирует поток
+        self.analysis_lines = ()  # Строки панели анализа
+        self.ponder_move = None  # Ожидаемый ход человека - из главного варианта последнего хода ИИ
+        self.ponder_worker = None  # Поиск ответа на ponder_move, пока человек думает
+        self.ponder_stop = None
+        self.ponder_key = None  # Позиция после ожидаемого хода
+        self.ponder_event = None  # Ход, найденный пондерингом до хода человека
+
+        # Шрифты и картинки фигур общие на процесс (sprites): новая партия их не загружает
+        self.font = sprites.font('Calibri', 30)  # Шрифт для таймера
+        self.large_font = sprites.font('Calibri', 60) # шрифт для объявление победителя
+        self.coord_font = sprites.font('Calibri', 20)  # шрифт для координат
+        self.text_cache = {}
+        self.drawn_timers = None
+        self.resize(size or min(экран.get_size()))
+
+    def resize(self, size):
+        """Доска под окно size x size: клетки, картинки фигур и области таймеров"""
+        self.cell = max(МИН_РАЗМЕР_ОКНА, size) // РАЗМЕР_ДОСКИ
+        self.size = self.cell * РАЗМЕР_ДОСКИ
+        self.timer_areas = timer_areas(self.size)
         self.load_images()
-        self.font = pygame.font.SysFont('Calibri', 30)  # Шрифт для таймера
-        self.large_font = pygame.font.SysFont('Calibri', 60) # шрифт для объявление победителя
-        self.coord_font = pygame.font.SysFont('Calibri', 20)  # шрифт для координат
 
-    def load_images(self):
-        """Загружает изображения фигур"""
-        self.piece_images = {}
-        pieces = {
-            'white_pawn': 'assets/White_Pawn.png',
-            'white_rook': 'assets/White_rook.png',
-            'white_knight': 'assets/White_Knight.png',
-            'white_bishop': 'assets/White_Bishop.png',
-            'white_queen': 'assets/White_Queen.png',
-            'white_king': 'assets/White_King.png',
-            'black_pawn': 'assets/Black_Pawn.png',
-            'black_rook': 'assets/Black_Rook.png',
-            'black_knight': 'assets/Black_Knight.png',
-            'black_bishop': 'assets/Black_Bishop.png',
-            'black_queen': 'assets/Black_Queen.png',
-            'black_king': 'assets/Black_King.png'
-        }
-        
-        for piece, filename in pieces.items():
-            try:
-                path = os.path.join(r"", filename)
-                image = pygame.image.load(path)
-                self.piece_images[piece] = pygame.transform.scale(image, (РАЗМЕР_КЛЕТКИ, РАЗМЕР_КЛЕТКИ))
-            except:
-                print(f"Не удалось загрузить {filename}")
-                # Заглушка для отсутствующих изображений
-                surf = pygame.Surface((РАЗМЕР_КЛЕТКИ, РАЗМЕР_КЛЕТКИ))
-                surf.fill((255, 0, 0) if 'white' in piece else (0, 0, 255))
-                self.piece_images[piece] = surf
-
-    def fen_to_board(self, fen):
-        """Преобразует FEN в доску"""
-        board = [[None for _ in range(8)] for _ in range(8)]
-        parts = fen.split()
-        rows = parts[0].split('/')
-        
-        piece_map = {
-            'p': 'black_pawn', 'r': 'black_rook', 'n': 'black_knight',
-            'b': 'black_bishop', 'q': 'black_queen', 'k': 'black_king',
-            'P': 'white_pawn', 'R': 'white_rook', 'N': 'white_knight',
-            'B': 'white_bishop', 'Q': 'white_queen', 'K': 'white_king'
-        }
-        
-        for row_idx, row in enumerate(rows):
-            col_idx = 0
-            for char in row:
-                if char.isdigit():
-                    col_idx += int(char)
-                else:
-                    board[row_idx][col_idx] = piece_map[char]
-                    col_idx += 1
-        return board
+        # Заранее нарисованные поверхности: доска с координатами, подсветка, строки таймеров
+        self.board_surface = self.build_board_surface()
+        self.selection_surface = self.build_highlight(ЦВЕТ_ВЫДЕЛЕНИЯ)
+        self.move_surface = self.build_highlight(ЦВЕТ_ВОЗМОЖНЫХ_ХОДОВ)
+        self.timer_cells = [(row, col) for row in range(8) for col in range(8)
+                            if any(area.colliderect(self.cell_rect(row, col)) for area in self.timer_areas)]
+        self.invalidate()
 
-    def draw_board(self):
-        """Рисует доску и фигуры"""
-        # Рисуем клетки
+    def load_images(self):
+        """Картинки фигур под размер клетки (из общего атласа, масштабируются один раз на размер)"""
+        self.piece_images = sprites.pieces(self.cell)
+
+    def cell_rect(self, row, col):
+        return pygame.Rect(col * self.cell, row * self.cell, self.cell, self.cell)
+
+    def square_at(self, x, y):
+        """Клетка (строка, столбец) под точкой окна или None, если точка вне доски"""
+        if 0 <= x < self.size and 0 <= y < self.size:
+            return y // self.cell, x // self.cell
+        return None
+
+    def build_board_surface(self):
+        """Рисует клетки и координаты один раз - дальше доска только копируется"""
+        surface = pygame.Surface((self.size, self.size))
+        surface.fill(ЧЕРНЫЙ)
         for row in range(8):
             for col in range(8):
                 color = ЦВЕТ_СВЕТЛОЙ_КЛЕТКИ if (row + col) % 2 == 0 else ЦВЕТ_ТЕМНОЙ_КЛЕТКИ
-                pygame.draw.rect(экран, color, (col*РАЗМЕР_КЛЕТКИ, row*РАЗМЕР_КЛЕТКИ, РАЗМЕР_КЛЕТКИ, РАЗМЕР_КЛЕТКИ))
+                pygame.draw.rect(surface, color, self.cell_rect(row, col))
 
                 # Рисуем координаты
                 if row == 7: # Нижняя строка (буквы)
                     letter = chr(ord('a') + col) # Преобразуем номер столбца в букву
                     text_surface = self.coord_font.render(letter, True, ЧЕРНЫЙ if (row + col) % 2 == 0 else БЕЛЫЙ)
-                    text_rect = text_surface.get_rect(bottomright=( (col + 1) * РАЗМЕР_КЛЕТКИ - 5, (row + 1) * РАЗМЕР_КЛЕТКИ - 5))
-                    экран.blit(text_surface, text_rect)
+                    text_rect = text_surface.get_rect(bottomright=( (col + 1) * self.cell - 5, (row + 1) * self.cell - 5))
+                    surface.blit(text_surface, text_rect)
 
                 if col == 0: # Левый столбец (цифры)
                     number = str(8 - row) # Преобразуем номер строки в цифру (обратный порядок)
                     text_surface = self.coord_font.render(number, True, ЧЕРНЫЙ if (row + col) % 2 == 0 else БЕЛЫЙ)
-                    text_rect = text_surface.get_rect(bottomleft=(col * РАЗМЕР_КЛЕТКИ + 5, (row + 1) * РАЗМЕР_КЛЕТКИ - 5))
-                    экран.blit(text_surface, text_rect)
-        
-        # Подсветка возможных ходов
-        if self.selected_piece:
-            row, col = self.selected_piece
-            s = pygame.Surface((РАЗМЕР_КЛЕТКИ, РАЗМЕР_КЛЕТКИ), pygame.SRCALPHA)
-            s.fill(ЦВЕТ_ВЫДЕЛЕНИЯ)
-            экран.blit(s, (col*РАЗМЕР_КЛЕТКИ, row*РАЗМЕР_КЛЕТКИ))
-            
-            for move in self.valid_moves:
-                s = pygame.Surface((РАЗМЕР_КЛЕТКИ, РАЗМЕР_КЛЕТКИ), pygame.SRCALPHA)
-                s.fill(ЦВЕТ_ВОЗМОЖНЫХ_ХОДОВ)
-                экран.blit(s, (move[1]*РАЗМЕР_КЛЕТКИ, move[0]*РАЗМЕР_КЛЕТКИ))
-        
-        # Рисуем фигуры
+                    text_rect = text_surface.get_rect(bottomleft=(col * self.cell + 5, (row + 1) * self.cell - 5))
+                    surface.blit(text_surface, text_rect)
+        return surface
+
+    def build_highlight(self, color):
+        surface = pygame.Surface((self.cell, self.cell), pygame.SRCALPHA)
+        surface.fill(color)
+        return surface
+
+    def render_text(self, text):
+        """Текст таймеров: одна и та же строка рендерится один раз"""
+        surface = self.text_cache.get(text)
+        if surface is None:
+            if len(self.text_cache) > 64:
+                self.text_cache.clear()  # Время на часах постоянно новое - не копим старые строки
+            surface = self.text_cache[text] = self.font.render(text, True, ЧЕРНЫЙ)
+        return surface
+
+    def square_state(self, row, col, highlighted):
+        """Что должно быть нарисовано на клетке: (фигура, подсветка)"""
+        if self.selected_piece == (row, col):
+            mark = 1
+        elif (row, col) in highlighted:
+            mark = 2
+        else:
+            mark = 0
+        return self.board.piece_at(row, col), mark
+
+    def draw_square(self, row, col, state):
+        """Рисует одну клетку: фон с координатами, подсветку и фигуру"""
+        rect = self.cell_rect(row, col)
+        экран.blit(self.board_surface, rect, rect)
+        piece, mark = state
+        if mark == 1:
+            экран.blit(self.selection_surface, rect)
+        elif mark == 2:
+            экран.blit(self.move_surface, rect)
+        if piece:
+            экран.blit(self.piece_images[PIECE_NAMES[piece]], rect)
+        self.drawn[row * 8 + col] = state
+        return rect
+
+    def invalidate(self):
+        """Экран перерисован кем-то еще (меню, итог игры) - в следующем кадре рисуем все"""
+        self.drawn = None
+
+    def draw_board(self):
+        """Рисует доску и фигуры целиком"""
+        экран.fill(ЧЕРНЫЙ)  # Окно могло стать больше доски
+        экран.blit(self.board_surface, (0, 0))
+        self.drawn = [None] * 64
+        highlighted = set(self.valid_moves)
         for row in range(8):
             for col in range(8):
-                piece = self.board[row][col]
-                if piece:
-                    экран.blit(self.piece_images[piece], (col*РАЗМЕР_КЛЕТКИ, row*РАЗМЕР_КЛЕТКИ))
-    
-    def draw_timer(self):
-       # Рамка для таймеров
-        pygame.draw.rect(экран, ЧЕРНЫЙ, (5, ВЫСОТА - 310, 200, 50), 2)  # Рамка для белого таймера
-        pygame.draw.rect(экран, ЧЕРНЫЙ, (ШИРИНА - 205, ВЫСОТА - 310, 200, 50), 2)  # Рамка для черного таймера
-        """Отображает таймеры для игроков"""
+                state = self.square_state(row, col, highlighted)
+                if state != (EMPTY, 0):
+                    self.draw_square(row, col, state)
+                else:
+                    self.drawn[row * 8 + col] = state
+
+    def render(self):
+        """Перерисовывает только изменившиеся клетки и таймеры; возвращает области для display.update"""
+        if self.drawn is None:
+            self.draw_board()
+            self.draw_timer()
+            return [экран.get_rect()]
+
+        highlighted = set(self.valid_moves)
+        dirty = {}
+        for row in range(8):
+            for col in range(8):
+                state = self.square_state(row, col, highlighted)
+                if state != self.drawn[row * 8 + col]:
+                    dirty[(row, col)] = state
+
+        # Таймеры нарисованы поверх клеток: при их изменении перерисовываем клетки под ними
+        timers_changed = self.timer_texts() != self.drawn_timers
+        if timers_changed or any(cell in self.timer_cells for cell in dirty):
+            timers_changed = True
+            for row, col in self.timer_cells:
+                dirty[(row, col)] = self.square_state(row, col, highlighted)
+
+        rects = [self.draw_square(row, col, state) for (row, col), state in dirty.items()]
+        if timers_changed:
+            self.draw_timer()
+        return rects
+
+    def timer_texts(self):
         white_time_str = time.strftime("%M:%S", time.gmtime(self.white_time))
         black_time_str = time.strftime("%M:%S", time.gmtime(self.black_time))
+        thinking = None
+        if self.thinking:
+            # Индикатор раздумий ИИ под таймером черных
+            thinking = "Думаю" + '.' * (int((time.time() - self.think_started) / ПЕРИОД_ИНДИКАТОРА) % 4)
+        analysis = None
+        if self.show_analysis:
+            analysis = self.analysis_lines or (("Анализ...",) if self.analysis_worker else ())
+        return f"White: {white_time_str}", f"Black: {black_time_str}", thinking, analysis
 
-        white_text = self.font.render(f"White: {white_time_str}", True, ЧЕРНЫЙ)
-        black_text = self.font.render(f"Black: {black_time_str}", True, ЧЕРНЫЙ)
-
-        экран.blit(white_text, (10, ВЫСОТА - 300))  # Позиция для белого таймера
-        экран.blit(black_text, (ШИРИНА - black_text.get_width() - 10, ВЫСОТА - 300))  # Позиция для черного таймера
+    def draw_timer(self):
+       # Рамка для таймеров
+        white_area, black_area, thinking_area = self.timer_areas[:3]
+        pygame.draw.rect(экран, ЧЕРНЫЙ, white_area, 2)  # Рамка для белого таймера
+        pygame.draw.rect(экран, ЧЕРНЫЙ, black_area, 2)  # Рамка для черного таймера
+        """Отображает таймеры для игроков"""
+        self.drawn_timers = self.timer_texts()
+        white_str, black_str, thinking, analysis = self.drawn_timers
+
+        white_text = self.render_text(white_str)
+        black_text = self.render_text(black_str)
+
+        экран.blit(white_text, (white_area.x + 5, white_area.y + 10))  # Позиция для белого таймера
+        экран.blit(black_text, (black_area.right - black_text.get_width() - 5, black_area.y + 10))  # Позиция для черного таймера
+
+        if thinking:
+            экран.blit(self.render_text(thinking), thinking_area.topleft)
+        if analysis is not None:
+            self.draw_analysis(analysis)
+
+    def draw_analysis(self, lines):
+        """Панель анализа под таймером белых: глубина и лучшие варианты с оценками"""
+        area = self.timer_areas[3]
+        pygame.draw.rect(экран, ЧЕРНЫЙ, area, 2)
+        y = area.top + 5
+        for line in lines:
+            экран.blit(self.coord_font.render(line, True, ЧЕРНЫЙ), (area.left + 8, y))
+            y += self.coord_font.get_linesize()
+
+    def toggle_analysis(self):
+        """F2: показывает или прячет панель анализа"""
+        self.show_analysis = not self.show_analysis
+        self.update_analysis()
+
+    def wants_analysis(self):
+        """Нужен ли анализ сейчас: панель открыта, а ИИ свободен"""
+        return self.show_analysis and not self.game_over and not self.thinking
+
+    def wants_ponder(self):
+        """Нужен ли пондеринг: ход человека против ИИ, ожидаемый ход известен, панель закрыта"""
+        if self.game_over or self.thinking or self.show_analysis or not self.ponder:
+            return False
+        return self.vs_computer and self.current_player == 'white' and self.ponder_move is not None
+
+    def update_analysis(self):
+        """Запускает анализ или пондеринг текущей позиции, останавливает ненужные"""
+        # Анализ и пондеринг делят один поиск: сначала останавливаем ненужное
+        if not self.wants_ponder():
+            self.stop_ponder()
+        if not self.wants_analysis():
+            self.stop_analysis()
+        elif self.analysis_key != self.board.key or self.analysis_worker is None:
+            self.stop_analysis()
+            self.analysis_key = self.board.key
+            self.analysis_stop = threading.Event()
+            self.analysis_worker = threading.Thread(
+                target=self._analyze, args=(self.board.copy(), self.analysis_stop), daemon=True)
+            self.analysis_worker.start()
+        if self.wants_ponder() and self.ponder_worker is None:
+            self.start_ponder()
+
+    def stop_analysis(self):
+        """Останавливает анализ и ждет поток: поиск и таблица транспозиций нужны ходу ИИ"""
+        if self.analysis_worker is not None:
+            self.analysis_stop.set()
+            self.analysis_worker.join()
+            self.analysis_worker = None
+            self.analysis_key = None
+            self.analysis_lines = ()
+
+    def _analyze(self, position, stop_event):
+        def on_update(lines, depth):
+            texts = [f"Глубина {depth}"]
+            for score, moves in lines:
+                texts.append(f"{format_score(score, position.side)}  {format_line(position, moves)}")
+            self.analysis_lines = tuple(texts)
+            if self.show_analysis:
+                pygame.event.post(pygame.event.Event(СОБЫТИЕ_АНАЛИЗ))
+
+        self.analyze(stop_event, ЧИСЛО_ВАРИАНТОВ, on_update, position)
+
+    def start_ponder(self):
+        """Начинает поиск хода ИИ в позиции после ожидаемого хода человека.
+
+        Это обычный поиск хода (_think) со временем, которое ИИ думал бы над ответом. Если
+        человек сыграл ожидаемый ход, поиск продолжается как ход ИИ, а найденный раньше ход
+        играется сразу; иначе поиск останавливается и ИИ думает заново.
+        """
+        position = self.board.copy()
+        position.make_move(self.ponder_move)
+        self.ponder_key = position.key
+        self.ponder_event = None
+        self.ponder_stop = threading.Event()
+        self.ponder_worker = threading.Thread(
+            target=self._think,
+            args=(position, self.computer_time_limit('black'), self.ponder_stop, len(position.undo_stack)),
+            daemon=True)
+        self.ponder_worker.start()
+
+    def stop_ponder(self):
+        """Останавливает пондеринг и ждет поток: поиск нужен следующему ходу ИИ или анализу"""
+        if self.ponder_worker is not None:
+            self.ponder_stop.set()
+            self.ponder_worker.join()
+            self.ponder_worker = None
+            self.ponder_key = None
+            self.ponder_event = None
     
+    def toggle_profile(self):
+        """F3: включает замеры (при первом нажатии) и показывает или прячет их"""
+        enable_profiling()
+        self.show_profile = not self.show_profile
+        self.invalidate()
+
+    def draw_profile(self):
+        """Рисует замеры в левом верхнем углу; клетки под ними перерисуются в следующем кадре"""
+        lines = [self.coord_font.render(line, True, ЧЕРНЫЙ) for line in profiler.summary_lines()]
+        width = max((line.get_width() for line in lines), default=0) + 20
+        height = sum(line.get_height() for line in lines) + 20
+        panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        panel.fill(ЦВЕТ_ЗАМЕРОВ)
+        y = 10
+        for line in lines:
+            panel.blit(line, (10, y))
+            y += line.get_height()
+        rect = экран.blit(panel, (0, 0))
+        if self.drawn is not None:
+            for row in range(min(8, rect.bottom // self.cell + 1)):
+                for col in range(min(8, rect.right // self.cell + 1)):
+                    self.drawn[row * 8 + col] = None
+        return rect
+
+    def next_redraw_delay(self):
+        """Через сколько секунд что-то изменится на экране без участия игрока (None - ничего)"""
+        if self.show_profile:
+            return ПЕРИОД_ЗАМЕРОВ
+        if self.game_over:
+            return None
+        clock = self.white_time if self.current_player == 'white' else self.black_time
+        delay = clock % 1 or 1.0  # До смены секунды на идущих часах
+        if self.thinking:
+            delay = min(delay, ПЕРИОД_ИНДИКАТОРА - (time.time() - self.think_started) % ПЕРИОД_ИНДИКАТОРА)
+        return delay + 0.001
+
     def update_timer(self):
-        """Обновляет таймеры игроков"""
-        if not self.game_over:
-            elapsed_time = time.time() - self.start_time
-            self.start_time = time.time()  # Сбрасываем время
-
-            if self.current_player == 'white':
-                self.white_time -= elapsed_time
-                if self.white_time <= 0:
-                    self.white_time = 0
-                    self.game_over = True
-                    self.winner = 'black'
-                    print("Black wins on time!")
-            else:
-                self.black_time -= elapsed_time
-                if self.black_time <= 0:
-                    self.black_time = 0
-                    self.game_over = True
-                    self.winner = 'white'
-                    print("White wins on time!")
-            self.white_time = max(0, self.white_time)
-            self.black_time = max(0, self.black_time)
-
-    def get_valid_moves(self, row, col):
-       """Возвращает допустимые ходы для фигуры, исключая те, после которых король под шахом."""
-       piece = self.board[row][col]
-       if not piece or not piece.startswith(self.current_player):
-           return []
-
-       moves = []
-       piece_type = piece.split('_')[1]
-
-       if piece_type == 'pawn':
-           moves = self.get_pawn_moves(row, col)
-       elif piece_type == 'rook':
-           moves = self.get_rook_moves(row, col)
-       elif piece_type == 'knight':
-           moves = self.get_knight_moves(row, col)
-       elif piece_type == 'bishop':
-           moves = self.get_bishop_moves(row, col)
-       elif piece_type == 'queen':
-           moves = self.get_queen_moves(row, col)
-       elif piece_type == 'king':
-           moves = self.get_king_moves(row, col)
-
-       real_moves = []
-       for move in moves:
-           # Имитируем ход
-           temp_board = [r[:] for r in self.board]  # Создаем копию доски
-           temp_board[move[0]][move[1]] = temp_board[row][col]  # Перемещаем фигуру
-           temp_board[row][col] = None  # Освобождаем исходную клетку
-
-           # Проверяем, не под шахом ли свой король после хода
-           if not self.is_king_in_check(self.current_player, temp_board):
-               real_moves.append(move)
-
-       return real_moves
-
-    def get_pawn_moves(self, row, col):
-        """Возвращает допустимые ходы для пешки"""
-        moves = []
-        direction = -1 if self.current_player == 'white' else 1
-
-        # Ход на 1 вперед
-        if 0 <= row + direction < 8 and not self.board[row + direction][col]:
-            moves.append((row + direction, col))
-
-            # Ход на 2 вперед из начальной позиции
-            if (row == 6 and self.current_player == 'white') or (row == 1 and self.current_player == 'black'):
-                if not self.board[row + 2 * direction][col] and not self.board[row + direction][col]:
-                    moves.append((row + 2 * direction, col))
-
-        # Взятие
-        for dc in [-1, 1]:
-            if 0 <= col + dc < 8 and 0 <= row + direction < 8:
-                target = self.board[row + direction][col + dc]
-                if target and target.startswith('black' if self.current_player == 'white' else 'white'):
-                    moves.append((row + direction, col + dc))
-
-        return moves
-
-    def get_rook_moves(self, row, col):
-        """Возвращает допустимые ходы для ладьи"""
-        moves = []
-        # Проверка по горизонтали и вертикали
-        for dr, dc in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
-            for i in range(1, 8):
-                new_row, new_col = row + i * dr, col + i * dc
-                if 0 <= new_row < 8 and 0 <= new_col < 8:
-                    target = self.board[new_row][new_col]
-                    if target is None:
-                        moves.append((new_row, new_col))
-                    elif target.startswith('black' if self.current_player == 'white' else 'white'):
-                        moves.append((new_row, new_col))
-                        break  # Останавливаемся после взятия фигуры
-                    else:
-                        break  # Упираемся в свою фигуру
-                else:
-                    break  # Выход за пределы доски
-        return moves
-
-    def get_knight_moves(self, row, col):
-        """Возвращает допустимые ходы для коня"""
-        moves = []
-        # Возможные смещения для коня
-        knight_moves = [
-            (-2, -1), (-2, 1), (-1, -2), (-1, 2),
-            (1, -2), (1, 2), (2, -1), (2, 1)
-        ]
-        for dr, dc in knight_moves:
-            new_row, new_col = row + dr, col + dc
-            if 0 <= new_row < 8 and 0 <= new_col < 8:
-                target = self.board[new_row][new_col]
-                if target is None or target.startswith('black' if self.current_player == 'white' else 'white'):
-                    moves.append((new_row, new_col))
-        return moves
-
-    def get_bishop_moves(self, row, col):
-        """Возвращает допустимые ходы для слона"""
-        moves = []
-        # Проверка по диагоналям
-        for dr, dc in [(1, 1), (1, -1), (-1, 1), (-1, -1)]:
-            for i in range(1, 8):
-                new_row, new_col = row + i * dr, col + i * dc
-                if 0 <= new_row < 8 and 0 <= new_col < 8:
-                    target = self.board[new_row][new_col]
-                    if target is None:
-                        moves.append((new_row, new_col))
-                    elif target.startswith('black' if self.current_player == 'white' else 'white'):
-                        moves.append((new_row, new_col))
-                        break  # Останавливаемся после взятия фигуры
-                    else:
-                        break  # Упираемся в свою фигуру
-                else:
-                    break  # Выход за пределы доски
-        return moves
-
-    def get_queen_moves(self, row, col):
-        """Возвращает допустимые ходы для ферзя"""
-        # Ферзь объединяет ходы ладьи и слона
-        rook_moves = self.get_rook_moves(row, col)
-        bishop_moves = self.get_bishop_moves(row, col)
-        return rook_moves + bishop_moves
-
-    def get_king_moves(self, row, col):
-        """Возвращает допустимые ходы для короля"""
-        moves = []
-        # Возможные смещения для короля
-        king_moves = [
-            (-1, -1), (-1, 0), (-1, 1),
-            (0, -1),         (0, 1),
-            (1, -1), (1, 0), (1, 1)
-        ]
-        for dr, dc in king_moves:
-            new_row, new_col = row + dr, col + dc
-            if 0 <= new_row < 8 and 0 <= new_col < 8:
-                target = self.board[new_row][new_col]
-                if target is None or target.startswith('black' if self.current_player == 'white' else 'white'):
-                    moves.append((new_row, new_col))
-        return moves
+        """Обновляет таймеры; о проигрыше по времени пишем в консоль"""
+        was_over = self.game_over
+        super().update_timer()
+        if self.game_over and not was_over:
+            print(self.message)
+            self.save_game()
 
     def handle_click(self, row, col):
         """Обрабатывает клик на доске"""
-        if self.game_over:
+        if self.game_over or self.thinking:
             return
     
         # Если фигура уже выбрана, пытаемся сделать ход
         if self.selected_piece:
             if (row, col) in self.valid_moves:
+                # Цикл просыпается раз в секунду: списываем с часов время раздумий до самого хода
+                self.update_timer()
+                if self.game_over:
+                    self.selected_piece = None
+                    self.valid_moves = []
+                    return  # Флаг упал раньше хода
                 self.make_move(self.selected_piece, (row, col))
                 self.selected_piece = None
                 self.valid_moves = []
                 self.switch_player()
                 self.start_time = time.time()  # Сбрасываем таймер после хода
-                
-                if self.is_checkmate(self.current_player):
-                    self.game_over = True
-                    self.winner = 'white' if self.current_player == 'black' else 'black'
-                    print(f"{'Белые' if self.current_player == 'black' else 'Черные'} выиграли матом!")
-                elif self.is_stalemate(self.current_player):
-                    self.game_over = True
-                    print("Пат!")
-                elif self.is_king_in_check(self.current_player):
-                    print("Шах!")
+                self.check_game_end()
         
                 if self.vs_computer and self.current_player == 'black':
-                    self.computer_move()
-            elif self.board[row][col] and self.board[row][col].startswith(self.current_player):
+                    self.start_computer_move()
+            elif self.is_own_piece(row, col):
                 # Выбрали другую свою фигуру
                 self.selected_piece = (row, col)
                 self.valid_moves = self.get_valid_moves(row, col)
@@ -352,154 +423,101 @@ class ChessGame:
                 self.valid_moves = []
         else:
             # Выбираем фигуру
-            if self.board[row][col] and self.board[row][col].startswith(self.current_player):
+            if self.is_own_piece(row, col):
                 self.selected_piece = (row, col)
                 self.valid_moves = self.get_valid_moves(row, col)
 
-    def make_move(self, start, end):
-        """Выполняет ход"""
-        start_row, start_col = start
-        end_row, end_col = end
-        self.board[end_row][end_col] = self.board[start_row][start_col]
-        self.board[start_row][start_col] = None
-
-    def switch_player(self):
-        """Меняет текущего игрока"""
-        self.current_player = 'black' if self.current_player == 'white' else 'white'
-        self.start_time = time.time() # Сбрасываем таймер
-
-    def computer_move(self):
-        """Простой ИИ для игры против компьютера"""
-        # Находим все возможные ходы
-        all_moves = []
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece.startswith('black'):
-                    moves = self.get_valid_moves(row, col)
-                    for move in moves:
-                        all_moves.append(((row, col), move))
-    
-        # Выбираем случайный ход
-        if all_moves:
-            import random
-            start, end = random.choice(all_moves)
-            self.make_move(start, end)
-            self.switch_player()
-
-            if self.is_checkmate(self.current_player):
-                self.game_over = True
-                self.winner = 'white' if self.current_player == 'black' else 'black'
-                print(f"{'Белые' if self.current_player == 'black' else 'Черные'} выиграли матом!")
-            elif self.is_stalemate(self.current_player):
-                self.game_over = True
-                print("Пат!")
-            elif self.is_king_in_check(self.current_player):
-                print("Шах!")
-
-    def is_king_in_check(self, player, board=None):
-        """Проверяет, находится ли король под шахом."""
-        if board is None:
-            board = self.board
-
-        # Находим позицию короля
-        king_pos = None
-        for row in range(8):
-            for col in range(8):
-                piece = board[row][col]
-                if piece == f'{player}_king':
-                    king_pos = (row, col)
-                    break
-            if king_pos:
-                break
-
-        if not king_pos:
-            return False  # Король не найден
-
-        # Проверяем каждую вражескую фигуру, может ли она атаковать короля
-        opponent = 'black' if player == 'white' else 'white'
-        for row in range(8):
-            for col in range(8):
-                piece = board[row][col]
-                if piece and piece.startswith(opponent):
-                    # !!! Ключевое изменение: Передаем opponent, чтобы получить ходы атакующей стороны
-                    moves = self.get_valid_moves(row, col)
-                    if king_pos in moves:
-                        return True  # Король под шахом
-
-        return False
-
-    def is_checkmate(self, player):
-        """Проверяет, есть ли мат"""
-        if not self.is_king_in_check(player):
-            return False  # Нет шаха - нет мата
-    
-        # Проверяем, есть ли хоть один ход, чтобы спасти короля
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece.startswith(player):
-                    moves = self.get_valid_moves(row, col)
-                    if moves: # проверяем что ходы вообще есть
-                      for move in moves:
-                          # Имитируем ход
-                          temp_board = [r[:] for r in self.board]
-                          temp_board[move[0]][move[1]] = temp_board[row][col]
-                          temp_board[row][col] = None
-                          # Если после хода нет шаха, это не мат
-                          if not self.is_king_in_check(player, temp_board):
-                              return False
-        return True  # Ходов нет, это мат
-
-    def is_stalemate(self, player):
-        """Проверяет, есть ли пат"""
-        if self.is_king_in_check(player):
-            return False # Если есть шах, то это не пат
-        
-        # Проверяем, есть ли у игрока фигуры на доске
-        has_pieces = False
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece.startswith(player):
-                    has_pieces = True
-                    break
-            if has_pieces:
-                break
-        
-        # Если у игрока нет фигур, это не пат, а проигрыш
-        if not has_pieces:
-            return False
+    def start_computer_move(self):
+        """Запускает поиск хода ИИ в фоновом потоке, результат придет событием СОБЫТИЕ_ХОД_ИИ"""
+        self.stop_analysis()
+        self.thinking = True
+        self.think_started = time.time()
+        self.ponder_move = None
+        if self.ponder_worker is not None:
+            hit = self.ponder_key == self.board.key
+            if profiler.ENABLED:
+                profiler.counters['ponder_hits' if hit else 'ponder_misses'] += 1
+            if hit:
+                # Человек сыграл ожидаемый ход: пондеринг и есть поиск этого хода ИИ
+                self.stop_thinking = self.ponder_stop
+                if self.ponder_event is not None:
+                    pygame.event.post(self.ponder_event)
+                self.ponder_worker = None
+                self.ponder_key = None
+                self.ponder_event = None
+                return
+            self.stop_ponder()
+        self.stop_thinking = threading.Event()
+        # Поток работает с копией позиции, чтобы отрисовка не видела промежуточных ходов
+        worker = threading.Thread(
+            target=self._think,
+            args=(self.board.copy(), self.computer_time_limit(), self.stop_thinking, len(self.board.undo_stack)),
+            daemon=True)
+        worker.start()
+
+    def _think(self, position, time_limit, stop_event, ply):
+        result = self.find_move(time_limit, stop_event, position)
+        if not stop_event.is_set():
+            reply = self.expected_reply(position, result.move)
+            pygame.event.post(pygame.event.Event(
+                СОБЫТИЕ_ХОД_ИИ, game=self, move=result.move, reply=reply, key=position.key, ply=ply))
+
+    def on_computer_move(self, event):
+        """Применяет ход, найденный в фоновом потоке"""
+        if event.game is not self:
+            return
+        if not self.thinking:
+            if self.ponder_worker is not None and event.key == self.ponder_key:
+                self.ponder_event = event  # Пондеринг успел раньше человека - ход пригодится при попадании
+            return
+        # Ход мог устареть: поиск отменен или позиция уже другая
+        if event.ply != len(self.board.undo_stack) or event.key != self.board.key:
+            return
+        self.thinking = False
+        if not self.game_over and event.move is not None:
+            self.play(event.move)
+            self.ponder_move = event.reply
+
+    def cancel_thinking(self):
+        """Останавливает фоновый поиск; его результат будет отброшен"""
+        if self.thinking:
+            self.thinking = False
+            self.stop_thinking.set()
+        self.stop_analysis()
+        self.stop_ponder()
+
+    def check_game_end(self):
+        """Проверяет конец партии и пишет результат в консоль"""
+        if self.game_over:
+            return self.message  # Итог уже записан (например, update_timer при падении флажка)
+        message = super().check_game_end()
+        if message:
+            print(message)
+        if self.game_over:
+            self.save_game()
+        return message
 
-        has_valid_moves = False
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece.startswith(player):
-                    moves = self.get_valid_moves(row, col)
-                    if len(moves) > 0:
-                        has_valid_moves = True
-                        break
-            if has_valid_moves:
-                break
-        
-        if has_valid_moves:
-            return False # Если есть ходы, то это не пат
-        else:
-            return True # Если нет шаха и ходов, то это пат
+    def save_game(self):
+        """Записывает законченную партию в ФАЙЛ_ПАРТИЙ"""
+        players = {'White': 'Игрок', 'Black': 'Компьютер' if self.vs_computer else 'Игрок'}
+        try:
+            self.save_pgn(ФАЙЛ_ПАРТИЙ, players)
+        except OSError as error:
+            print(f"Не удалось сохранить партию: {error}")
 
     def draw_winner(self):
       """Отображает окно с объявлением победителя."""
       if self.winner:
           winner_text = self.large_font.render(f"{'Белые' if self.winner == 'white' else 'Черные'} выиграли!", True, ЗЕЛЕНЫЙ)
-          text_rect = winner_text.get_rect(center=(ШИРИНА // 2, ВЫСОТА // 2))
+          text_rect = winner_text.get_rect(center=(self.size // 2, self.size // 2))
 
           #Затемнение фона
-          overlay = pygame.Surface((ШИРИНА, ВЫСОТА), pygame.SRCALPHA)
+          overlay = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
           overlay.fill((0, 0, 0, 150))  # Черный цвет с прозрачностью 150
           экран.blit(overlay, (0, 0))
 
           экран.blit(winner_text, text_rect)
+      self.invalidate()  # Затемнение легло на всю доску
 
     def handle_game_over(self):
       """Обрабатывает завершение игры, отображая победителя."""
@@ -509,7 +527,7 @@ class ChessGame:
       # Ждем, пока игрок не нажмет клавишу или закроет окно
       waiting = True
       while waiting:
-          for event in pygame.event.get():
+          for event in wait_events():
               if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
                   pygame.quit()
                   sys.exit()
@@ -517,28 +535,71 @@ class ChessGame:
                   waiting = False  # Нажата клавиша, выходим из цикла ожидания и возвращаемся в меню
                   
 
-def main_menu():
+def format_score(score, side):
+    """Оценка для панели анализа: в пешках за белых или '#N' - мат в N ходов"""
+    if side == BLACK:
+        score = -score
+    if abs(score) >= MATE_BOUND:
+        moves = (MATE - abs(score) + 1) // 2
+        return f"#{moves}" if score > 0 else f"#-{moves}"
+    return f"{score / 100:+.2f}"
+
+
+def format_line(position, moves):
+    """Начало варианта в SAN"""
+    position = position.copy()
+    parts = []
+    for move in moves[:ХОДОВ_В_ВАРИАНТЕ]:
+        parts.append(move_to_san(position, move))
+        position.make_move(move)
+    return ' '.join(parts)
+
+
+def enable_profiling(path=None):
+    """Замеры движка и окна: отрисовка и клики считаются вместе с генератором ходов и поиском"""
+    if not profiler.ENABLED:
+        profiler.enable(path)
+        profiler.instrument(ChessGame, 'render', 'render')
+        profiler.instrument(ChessGame, 'handle_click', 'click')
+
+
+def wait_events(timeout=None):
+    """Спит до события или до истечения timeout секунд; возвращает все накопившиеся события"""
+    if timeout is None:
+        event = pygame.event.wait()
+    else:
+        event = pygame.event.wait(max(1, int(timeout * 1000)))
+    if event.type == NOEVENT:
+        return []  # Истек timeout
+    return [event] + pygame.event.get()
+
+
+def main_menu(ponder=ПОНДЕРИНГ):
     """Главное меню для выбора режима игры"""
     game = None
-    font = pygame.font.SysFont('Arial', 40)
+    font = sprites.font('Arial', 40)
 
     while True:
+        # Меню перерисовывается только после событий - между ними процесс спит
         экран.fill((50, 50, 50))
 
         title = font.render("Шахматы", True, (255, 255, 255))
         pvp = font.render("1 - Игра против друга", True, (255, 255, 255))
         pvc = font.render("2 - Игра против компьютера", True, (255, 255, 255))
 
-        экран.blit(title, (ШИРИНА // 2 - title.get_width() // 2, 100))
-        экран.blit(pvp, (ШИРИНА // 2 - pvp.get_width() // 2, 300))
-        экран.blit(pvc, (ШИРИНА // 2 - pvc.get_width() // 2, 400))
+        center = экран.get_width() // 2
+        экран.blit(title, (center - title.get_width() // 2, 100))
+        экран.blit(pvp, (center - pvp.get_width() // 2, 300))
+        экран.blit(pvc, (center - pvc.get_width() // 2, 400))
 
         pygame.display.flip()
 
-        for event in pygame.event.get():
+        for event in wait_events():
             if event.type == QUIT:
                 pygame.quit()
                 sys.exit()
+            elif event.type == VIDEORESIZE:
+                window_resized()
             elif event.type == KEYDOWN:
                 if event.key == K_1:
                     game = ChessGame()
@@ -547,29 +608,63 @@ def main_menu():
                 elif event.key == K_2:
                     game = ChessGame()
                     game.vs_computer = True
+                    game.ponder = ponder
                     return game
 
-def main():
-    game = main_menu()
+def window_resized():
+    """Окно поменяло размер: берем новую поверхность экрана, возвращаем сторону доски"""
+    global экран
+    экран = pygame.display.get_surface()
+    return min(экран.get_size())
+
+
+def main(argv=None):
+    global экран
+    parser = argparse.ArgumentParser(description="Шахматы в окне")
+    parser.add_argument('--size', type=int, help=f"сторона окна в пикселях (не меньше {МИН_РАЗМЕР_ОКНА})")
+    parser.add_argument('--ponder', action='store_true', default=ПОНДЕРИНГ,
+                        help="ИИ ищет ответ на ожидаемый ход, пока думает человек (нагружает все ядра)")
+    args = parser.parse_args(argv)
+    if args.size:
+        size = max(МИН_РАЗМЕР_ОКНА, args.size)
+        экран = pygame.display.set_mode((size, size), RESIZABLE)
+
+    path = profiler.path_from_env()
+    if path:
+        enable_profiling(path)  # Замеры на весь запуск, JSON - при выходе
+    game = main_menu(args.ponder)
     if game is None:
         return
 
     while True:
-        for event in pygame.event.get():
+        # Просыпаемся от ввода, хода ИИ или к следующей смене цифр на часах
+        events = wait_events(game.next_redraw_delay())
+        frame_started = time.perf_counter()
+        for event in events:
             if event.type == QUIT:
                 pygame.quit()
                 sys.exit()
+            elif event.type in (VIDEOEXPOSE, WINDOWEXPOSED):
+                game.invalidate()  # Окно было перекрыто - рисуем заново целиком
+            elif event.type == VIDEORESIZE:
+                game.resize(window_resized())  # Картинки под новый размер клетки - из общего кеша
             elif event.type == MOUSEBUTTONDOWN:
                 if event.button == 1:  # Левая кнопка мыши
-                    x, y = event.pos
-                    col = x // РАЗМЕР_КЛЕТКИ
-                    row = y // РАЗМЕР_КЛЕТКИ
-                    game.handle_click(row, col)
+                    cell = game.square_at(*event.pos)
+                    if cell is not None:
+                        game.handle_click(*cell)
+            elif event.type == СОБЫТИЕ_ХОД_ИИ:
+                game.on_computer_move(event)
+            elif event.type == KEYDOWN and event.key == K_F3:
+                game.toggle_profile()
+            elif event.type == KEYDOWN and event.key == K_F2:
+                game.toggle_analysis()
             elif event.type == KEYDOWN:
                 if event.key == K_ESCAPE:
+                    game.cancel_thinking()  # Ход ИИ, найденный после ESC, не нужен
                     # Если игра закончена, возвращаемся в главное меню. Иначе ничего не делаем.
                     if game.game_over:
-                        game = main_menu()
+                        game = main_menu(args.ponder)
                         if game is None:
                             return
                     else:
@@ -577,9 +672,9 @@ def main():
                         print("Игра приостановлена. Нажмите ESC еще раз для выхода в меню.")
                         waiting_for_esc = True
                         while waiting_for_esc:
-                            for event2 in pygame.event.get():
+                            for event2 in wait_events():
                                 if event2.type == KEYDOWN and event2.key == K_ESCAPE:
-                                    game = main_menu()
+                                    game = main_menu(args.ponder)
                                     if game is None:
                                         return
                                     waiting_for_esc = False
@@ -588,15 +683,23 @@ def main():
                                     sys.exit()
 
         game.update_timer()
-        экран.fill(ЧЕРНЫЙ)
-        game.draw_board()
-        game.draw_timer()
+        if game.game_over:
+            game.cancel_thinking()  # Например, у черных кончилось время во время раздумий
+        game.update_analysis()
+        # Обновляем на экране только то, что изменилось
+        dirty_rects = game.render()
+        if game.show_profile:
+            dirty_rects.append(game.draw_profile())
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
+        if profiler.ENABLED:
+            profiler.frame(time.perf_counter() - frame_started)
 
         if game.game_over:
            game.handle_game_over()
         
-        pygame.display.flip()
-        часы.tick(ЧАСТОТА_КАДРОВ)
+        часы.tick(ЧАСТОТА_КАДРОВ)  # Ограничиваем частоту, когда события идут подряд
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Для сборки PyInstaller
     main()
@@ -0,0 +1,230 @@
+"""Пакетная оценка позиций на NumPy: материал, таблицы положения фигур, подвижность и пешечная структура.
+
+Позиции кодируются массивом 12x64 (плоскость на каждый вид фигуры каждого цвета) и
+оцениваются тысячами за один вызов - это для разбора баз партий, где важны позиции в
+секунду, а не время одного вызова. Поиск может отдавать сюда листья пачкой (Search.batch_eval).
+
+NumPy нужен только этому модулю; без него остальная программа работает как раньше.
+
+    python batcheval.py games.pgn                        # оценить все позиции, показать скорость
+    python batcheval.py games.pgn --output scores.jsonl  # оценки по ходам каждой партии
+"""
+
+import argparse
+import json
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:  # Пакетная оценка недоступна, остальное работает
+    np = None
+
+from position import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, START_FEN, Position, square
+from evaluation import SQUARE_VALUES, evaluate
+from pgn import iter_games
+
+РАЗМЕР_ПАЧКИ = 4096  # Позиций за один вызов при разборе партий
+
+KINDS = (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING)
+PLANE_CODES = tuple(WHITE | kind for kind in KINDS) + tuple(BLACK | kind for kind in KINDS)
+BOARD_INDEX = tuple(square(row, col) for row in range(8) for col in range(8))  # Клетки 10x12 в порядке row * 8 + col
+
+# Подвижность: сантипешки за клетку, которую бьет фигура (кроме занятых своими)
+MOBILITY = {KNIGHT: 4, BISHOP: 5, ROOK: 2, QUEEN: 1}
+KNIGHT_STEPS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+ROOK_STEPS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_STEPS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+# Пешечная структура
+DOUBLED = -10  # За каждую лишнюю пешку на вертикали
+ISOLATED = -10  # За пешку без своих пешек на соседних вертикалях
+PASSED = (0, 100, 60, 35, 20, 10, 5, 0)  # Проходная белая пешка по строке (для черных - зеркально)
+
+
+def _tables():
+    """Веса материала и положения фигур [плоскость, клетка] - со знаком: белые +, черные -"""
+    weights = np.zeros((12, 64), np.float32)
+    for plane, code in enumerate(PLANE_CODES):
+        sign = 1 if code & BLACK == WHITE else -1
+        for index, sq in enumerate(BOARD_INDEX):
+            weights[plane, index] = sign * SQUARE_VALUES[code][sq]
+    return weights.reshape(768)
+
+
+if np is not None:
+    SQUARE_WEIGHTS = _tables()
+    PLANE_ARRAY = np.array(PLANE_CODES, np.uint8)[None, :, None]
+    ROWS = np.arange(8)[None, :, None]
+    PASSED_WHITE = np.array(PASSED, np.int32)[None, :, None]
+    PASSED_BLACK = PASSED_WHITE[:, ::-1]
+
+
+def require_numpy():
+    if np is None:
+        raise RuntimeError("Для пакетной оценки нужен numpy: pip install numpy")
+
+
+def encode(boards):
+    """Доски (bytes клеток 10x12, как Position.squares) -> массив (N, 12, 64) из 0 и 1"""
+    require_numpy()
+    codes = np.frombuffer(b''.join(boards), np.uint8).reshape(-1, 120)[:, BOARD_INDEX]
+    return (codes[:, None, :] == PLANE_ARRAY).astype(np.uint8)
+
+
+def _shift(board, dr, dc):
+    """Сдвиг масок (N, 8, 8) на dr строк и dc столбцов; ушедшее за край пропадает"""
+    result = np.zeros_like(board)
+    result[:, max(dr, 0):8 + min(dr, 0), max(dc, 0):8 + min(dc, 0)] = \
+        board[:, max(-dr, 0):8 + min(-dr, 0), max(-dc, 0):8 + min(-dc, 0)]
+    return result
+
+
+def _mobility(pieces, own, empty):
+    """Взвешенная подвижность одной стороны; pieces - плоскости (N, 6, 8, 8) ее фигур"""
+    free = 1 - own
+    knights = pieces[:, KINDS.index(KNIGHT)] * MOBILITY[KNIGHT]
+    total = sum((_shift(knights, dr, dc) * free).sum(axis=(1, 2), dtype=np.int32) for dr, dc in KNIGHT_STEPS)
+    queens = pieces[:, KINDS.index(QUEEN)] * MOBILITY[QUEEN]
+    for kind, steps in ((ROOK, ROOK_STEPS), (BISHOP, BISHOP_STEPS)):
+        # Лучи разных фигур одного направления не пересекаются: первую же фигуру на пути
+        # луч не проходит, поэтому вес фигуры можно нести по лучу прямо в клетках маски
+        start = pieces[:, KINDS.index(kind)] * MOBILITY[kind] + queens
+        for dr, dc in steps:
+            front = start
+            for _ in range(7):
+                front = _shift(front, dr, dc)
+                if not front.any():
+                    break
+                total = total + (front * free).sum(axis=(1, 2), dtype=np.int32)
+                front = front * empty
+    return total
+
+
+def _pawn_structure(white_pawns, black_pawns):
+    """Сдвоенные, изолированные и проходные пешки: оценка с точки зрения белых"""
+    score = np.zeros(len(white_pawns), np.int32)
+    for pawns, sign in ((white_pawns, 1), (black_pawns, -1)):
+        files = pawns.sum(axis=1, dtype=np.int32)
+        neighbours = np.zeros_like(files)
+        neighbours[:, 1:] += files[:, :-1]
+        neighbours[:, :-1] += files[:, 1:]
+        score += sign * (DOUBLED * np.maximum(files - 1, 0).sum(axis=1)
+                         + ISOLATED * (files * (neighbours == 0)).sum(axis=1))
+
+    # Белая пешка проходная, если на ее и соседних вертикалях нет черных пешек впереди (строки меньше)
+    black_front = np.where(black_pawns, ROWS, 8).min(axis=1)
+    black_front = np.minimum(black_front, np.minimum(np.pad(black_front[:, 1:], ((0, 0), (0, 1)), constant_values=8),
+                                                     np.pad(black_front[:, :-1], ((0, 0), (1, 0)), constant_values=8)))
+    passed = white_pawns * (ROWS <= black_front[:, None, :])
+    score += (passed * PASSED_WHITE).sum(axis=(1, 2))
+    white_front = np.where(white_pawns, ROWS, -1).max(axis=1)
+    white_front = np.maximum(white_front, np.maximum(np.pad(white_front[:, 1:], ((0, 0), (0, 1)), constant_values=-1),
+                                                     np.pad(white_front[:, :-1], ((0, 0), (1, 0)), constant_values=-1)))
+    passed = black_pawns * (ROWS >= white_front[:, None, :])
+    score -= (passed * PASSED_BLACK).sum(axis=(1, 2))
+    return score
+
+
+def evaluate_planes(planes, sides):
+    """Оценки (N,) в сантипешках с точки зрения стороны, чей ход; sides - WHITE/BLACK или массив (N,)"""
+    require_numpy()
+    count = len(planes)
+    score = np.rint(planes.reshape(count, 768).astype(np.float32) @ SQUARE_WEIGHTS).astype(np.int32)
+    boards = planes.reshape(count, 12, 8, 8)
+    white, black = boards[:, :6], boards[:, 6:]
+    white_own = white.sum(axis=1, dtype=np.uint8)
+    black_own = black.sum(axis=1, dtype=np.uint8)
+    empty = 1 - white_own - black_own
+    score += _mobility(white, white_own, empty) - _mobility(black, black_own, empty)
+    score += _pawn_structure(white[:, KINDS.index(PAWN)], black[:, KINDS.index(PAWN)])
+    return np.where(np.asarray(sides) == BLACK, -score, score)
+
+
+def evaluate_boards(boards, sides):
+    """Оценка пачки досок (bytes клеток) - для листьев поиска"""
+    if not boards:
+        return []
+    return evaluate_planes(encode(boards), sides).tolist()
+
+
+def evaluate_positions(positions):
+    """Оценка списка Position с точки зрения стороны, чей ход в каждой"""
+    return evaluate_boards([bytes(position.squares) for position in positions],
+                           [position.side for position in positions])
+
+
+def game_boards(game):
+    """Доски начальной позиции и после каждого хода партии"""
+    position = Position.from_fen(game.headers.get('FEN', START_FEN))
+    boards = [bytes(position.squares)]
+    for move in game.moves:
+        position.make_move(move)
+        boards.append(bytes(position.squares))
+    return boards
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная оценка всех позиций из файла PGN")
+    parser.add_argument('path', help="файл PGN")
+    parser.add_argument('--batch', type=int, default=РАЗМЕР_ПАЧКИ, help="позиций за один вызов оценки")
+    parser.add_argument('--output', help="файл JSONL: оценки (за белых) после каждого хода партии")
+    parser.add_argument('--compare', action='store_true', help="для сравнения оценить те же позиции по одной (evaluation.py)")
+    args = parser.parse_args(argv)
+    require_numpy()
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else None
+    games = []  # (номер партии, число позиций) текущей пачки
+    boards = []
+    total = 0
+    seconds = 0.0
+
+    def flush():
+        nonlocal seconds, total
+        started = time.perf_counter()
+        # Оценки - за белых: так их удобнее сравнивать по ходу партии
+        scores = evaluate_planes(encode(boards), WHITE) if boards else []
+        seconds += time.perf_counter() - started
+        total += len(boards)
+        if output is not None:
+            offset = 0
+            for number, count in games:
+                output.write(json.dumps({'game': number, 'scores': scores[offset:offset + count].tolist()}) + '\n')
+                offset += count
+        games.clear()
+        boards.clear()
+
+    try:
+        with open(args.path, encoding='utf-8', errors='replace') as source:
+            for number, game in enumerate(iter_games(source, 'skip'), start=1):
+                game_positions = game_boards(game)
+                games.append((number, len(game_positions)))
+                boards.extend(game_positions)
+                if len(boards) >= args.batch:
+                    flush()
+        flush()
+    finally:
+        if output is not None:
+            output.close()
+    print(f"Позиций: {total}, оценка: {seconds:.2f} с")
+    if seconds > 0:
+        print(f"Позиций/с (NumPy): {total / seconds:,.0f}")
+    if args.compare:
+        with open(args.path, encoding='utf-8', errors='replace') as source:
+            positions = []
+            for game in iter_games(source, 'skip'):
+                position = Position.from_fen(game.headers.get('FEN', START_FEN))
+                positions.append(position.copy())
+                for move in game.moves:
+                    position.make_move(move)
+                    positions.append(position.copy())
+        started = time.perf_counter()
+        for position in positions:
+            evaluate(position)
+        elapsed = time.perf_counter() - started
+        print(f"Позиций/с (evaluation.evaluate, без подвижности и пешек): {len(positions) / elapsed:,.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""Генерация ходов на битбордах: 64-битные маски на каждый тип фигуры и цвет.
+
+Битборды хранит сама позиция (Position.boards) и обновляет их в make_move/unmake_move,
+так что генератор их не пересобирает.
+"""
+
+from position import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, PROMOTIONS, CASTLES, square
+
+# Индекс битборда: row * 8 + col (строка 0 - восьмая горизонталь), как Position.boards
+TO_MAILBOX = tuple(square(i // 8, i % 8) for i in range(64))
+FROM_MAILBOX = [None] * 120
+for _i, _sq in enumerate(TO_MAILBOX):
+    FROM_MAILBOX[_sq] = _i
+
+FULL = (1 << 64) - 1
+ROW_2 = 0xFF << 48  # Начальная горизонталь белых пешек (строка 6)
+ROW_7 = 0xFF << 8   # Начальная горизонталь черных пешек (строка 1)
+LAST_ROWS = 0xFF | (0xFF << 56)  # Горизонтали превращения
+
+
+def _step_table(offsets):
+    table = []
+    for i in range(64):
+        row, col = divmod(i, 8)
+        mask = 0
+        for dr, dc in offsets:
+            r, c = row + dr, col + dc
+            if 0 <= r < 8 and 0 <= c < 8:
+                mask |= 1 << (r * 8 + c)
+        table.append(mask)
+    return tuple(table)
+
+
+KNIGHT_ATTACKS = _step_table([(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)])
+KING_ATTACKS = _step_table([(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)])
+# PAWN_ATTACKS[индекс цвета][клетка] - клетки, которые бьет пешка этого цвета
+PAWN_ATTACKS = (_step_table([(-1, -1), (-1, 1)]), _step_table([(1, -1), (1, 1)]))
+
+
+def _ray_table(dr, dc):
+    table = []
+    for i in range(64):
+        row, col = divmod(i, 8)
+        mask = 0
+        r, c = row + dr, col + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            mask |= 1 << (r * 8 + c)
+            r, c = r + dr, c + dc
+        table.append(mask)
+    return tuple(table)
+
+
+# Лучи, идущие в сторону роста индекса: ближайший блокирующий - младший бит
+ROOK_RAYS_UP = (_ray_table(0, 1), _ray_table(1, 0))
+BISHOP_RAYS_UP = (_ray_table(1, 1), _ray_table(1, -1))
+# Лучи в сторону уменьшения индекса: ближайший блокирующий - старший бит
+ROOK_RAYS_DOWN = (_ray_table(0, -1), _ray_table(-1, 0))
+BISHOP_RAYS_DOWN = (_ray_table(-1, -1), _ray_table(-1, 1))
+
+
+def _between_table():
+    """BETWEEN[i][j] - клетки строго между i и j на одной линии (0, если не на линии)"""
+    table = [[0] * 64 for _ in range(64)]
+    for i in range(64):
+        row, col = divmod(i, 8)
+        for dr, dc in ((0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (1, -1), (-1, -1), (-1, 1)):
+            mask = 0
+            r, c = row + dr, col + dc
+            while 0 <= r < 8 and 0 <= c < 8:
+                table[i][r * 8 + c] = mask
+                mask |= 1 << (r * 8 + c)
+                r, c = r + dr, c + dc
+    return table
+
+
+BETWEEN = _between_table()
+
+
+def _slide(i, occ, rays_up, rays_down):
+    attacks = 0
+    for rays in rays_up:
+        ray = rays[i]
+        blockers = ray & occ
+        if blockers:
+            ray ^= rays[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for rays in rays_down:
+        ray = rays[i]
+        blockers = ray & occ
+        if blockers:
+            ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(i, occ):
+    return _slide(i, occ, ROOK_RAYS_UP, ROOK_RAYS_DOWN)
+
+
+def bishop_attacks(i, occ):
+    return _slide(i, occ, BISHOP_RAYS_UP, BISHOP_RAYS_DOWN)
+
+
+def attacked(i, by_color, boards, occ, mask=-1):
+    """Бьет ли сторона by_color клетку i; mask убирает взятые фигуры из битбордов"""
+    if KNIGHT_ATTACKS[i] & boards[by_color | KNIGHT] & mask:
+        return True
+    if KING_ATTACKS[i] & boards[by_color | KING]:
+        return True
+    # Пешка цвета by_color бьет i, если пешка противоположного цвета с i бьет ее клетку
+    if PAWN_ATTACKS[(by_color ^ BLACK) >> 3][i] & boards[by_color | PAWN] & mask:
+        return True
+    queens = boards[by_color | QUEEN]
+    diagonal = (boards[by_color | BISHOP] | queens) & mask
+    if diagonal and bishop_attacks(i, occ) & diagonal:
+        return True
+    straight = (boards[by_color | ROOK] | queens) & mask
+    if straight and rook_attacks(i, occ) & straight:
+        return True
+    return False
+
+
+def pins(king, color, boards, own, occ):
+    """Связанные фигуры стороны color: {бит фигуры: клетки, куда она может ходить (линия до связывающей)}"""
+    pinned = {}
+    enemy_color = color ^ BLACK
+    enemy = boards[enemy_color]
+    queens = boards[enemy_color | QUEEN]
+    for attacks, sliders in ((rook_attacks(king, enemy), boards[enemy_color | ROOK] | queens),
+                             (bishop_attacks(king, enemy), boards[enemy_color | BISHOP] | queens)):
+        # Луч от короля сквозь свои фигуры до первой чужой: связать может только она
+        for pinner in _bits(attacks & sliders):
+            between = BETWEEN[king][pinner]
+            blockers = between & occ
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pinned[blockers] = between | (1 << pinner)
+    return pinned
+
+
+def _castling_table():
+    """Рокировки в индексах битбордов: (право, король, куда король, ладья, поле прохода, маска пустых полей)"""
+    table = {}
+    for color, castles in CASTLES.items():
+        entries = []
+        for flag, king_from, king_to, rook_from, rook_to, between in castles:
+            empty = 0
+            for sq in between:
+                empty |= 1 << FROM_MAILBOX[sq]
+            entries.append((flag, FROM_MAILBOX[king_from], FROM_MAILBOX[king_to],
+                            FROM_MAILBOX[rook_from], FROM_MAILBOX[rook_to], empty))
+        table[color] = tuple(entries)
+    return table
+
+
+CASTLING = _castling_table()
+
+
+def _bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BitboardGenerator:
+    """Генератор ходов на битбордах с таблицами атак"""
+
+    name = 'bitboard'
+
+    def _targets(self, i, kind, color, own, enemy, occ, ep_bit):
+        if kind == PAWN:
+            from_bit = 1 << i
+            if color == WHITE:
+                push = from_bit >> 8
+                double = push >> 8 if from_bit & ROW_2 else 0
+            else:
+                push = (from_bit << 8) & FULL
+                double = push << 8 if from_bit & ROW_7 else 0
+            targets = 0
+            if push and not push & occ:
+                targets = push
+                if double and not double & occ:
+                    targets |= double
+            return targets | (PAWN_ATTACKS[color >> 3][i] & (enemy | ep_bit))
+        if kind == KNIGHT:
+            attacks = KNIGHT_ATTACKS[i]
+        elif kind == KING:
+            attacks = KING_ATTACKS[i]
+        elif kind == BISHOP:
+            attacks = bishop_attacks(i, occ)
+        elif kind == ROOK:
+            attacks = rook_attacks(i, occ)
+        else:
+            attacks = bishop_attacks(i, occ) | rook_attacks(i, occ)
+        return attacks & ~own
+
+    def _generate(self, position, only=None):
+        boards = position.boards
+        color = position.side
+        enemy_color = color ^ BLACK
+        own = boards[color]
+        enemy = boards[enemy_color]
+        occ = own | enemy
+        king_bb = boards[color | KING]
+        king = king_bb.bit_length() - 1
+        checked = king >= 0 and attacked(king, enemy_color, boards, occ)
+        pinned = pins(king, color, boards, own, occ) if king >= 0 else {}
+        ep = FROM_MAILBOX[position.ep] if position.ep else -1
+        ep_bit = 1 << ep if ep >= 0 else 0
+        squares = position.squares
+        moves = []
+        sources = (only,) if only is not None else position.pieces[color >> 3]
+        for sq in sources:
+            i = FROM_MAILBOX[sq]
+            kind = squares[sq] & 7
+            targets = self._targets(i, kind, color, own, enemy, occ, ep_bit)
+            from_bit = 1 << i
+            if from_bit in pinned:
+                targets &= pinned[from_bit]  # Связанная фигура ходит только вдоль связки
+            # Без шаха проверять нужно только ходы короля: связки уже учтены
+            needs_check = king >= 0 and (checked or kind == KING)
+            for j in _bits(targets):
+                to_bit = 1 << j
+                if kind == PAWN and j == ep:
+                    # Взятие на проходе убирает с доски пешку рядом, проверяем всегда
+                    taken_bit = to_bit << 8 if color == WHITE else to_bit >> 8
+                    new_occ = (occ ^ from_bit ^ taken_bit) | to_bit
+                    if king >= 0 and attacked(king, enemy_color, boards, new_occ, ~taken_bit):
+                        continue
+                elif needs_check:
+                    new_occ = (occ ^ from_bit) | to_bit
+                    target_king = j if kind == KING else king
+                    if attacked(target_king, enemy_color, boards, new_occ, ~to_bit):
+                        continue
+                move = sq | (TO_MAILBOX[j] << 8)
+                if kind == PAWN and to_bit & LAST_ROWS:
+                    for promotion in PROMOTIONS:
+                        moves.append(move | (promotion << 16))
+                else:
+                    moves.append(move)
+            if kind == KING and position.castling and not checked:
+                for flag, king_from, king_to, rook_from, passing, empty in CASTLING[color]:
+                    if (position.castling & flag and i == king_from and boards[color | ROOK] >> rook_from & 1
+                            and not occ & empty
+                            and not attacked(passing, enemy_color, boards, occ)
+                            and not attacked(king_to, enemy_color, boards, occ)):
+                        moves.append(sq | (TO_MAILBOX[king_to] << 8))
+        return moves
+
+    def legal_moves(self, position):
+        return self._generate(position)
+
+    def legal_moves_from(self, position, sq):
+        piece = position.squares[sq]
+        if not piece or piece & BLACK != position.side or piece & 7 == 0:
+            return []
+        return self._generate(position, sq)
+
+    def has_legal_move(self, position):
+        return bool(self._generate(position))
+
+    def in_check(self, position, color):
+        boards = position.boards
+        king = boards[color | KING].bit_length() - 1
+        if king < 0:
+            return False
+        return attacked(king, color ^ BLACK, boards, boards[WHITE] | boards[BLACK])
@@ -0,0 +1,173 @@
+"""Дебютная книга: файл из 16-байтных записей в формате Polyglot, читается через mmap.
+
+Запись: ключ позиции (8 байт), ход (2), вес (2), learn (4), big-endian, записи отсортированы
+по ключу. В отличие от Polyglot, ключ - наш Zobrist из position.py, а рокировка записана
+ходом короля на две клетки (e1g1), поэтому книги Polyglot с этим файлом несовместимы.
+
+Файл не разбирается при открытии: поиск - двоичный по отображенной памяти, а страницы
+файла ОС делит между всеми процессами, открывшими одну книгу.
+
+    python book.py build games.pgn --output book.bin --plies 24
+    python book.py probe "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+"""
+
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+from collections import Counter
+
+from position import Position, START_FEN, square, coords, encode_move, move_from, move_to, move_promotion, move_to_uci
+from pgn import iter_games
+
+ENTRY = struct.Struct('>QHHI')
+KEY = struct.Struct('>Q')
+ФАЙЛ_КНИГИ = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book.bin')
+МАКС_ВЕС = 0xFFFF
+
+# Открытые книги на весь процесс: путь -> OpeningBook
+_books = {}
+
+
+def encode_book_move(move):
+    """Ход в 16 бит Polyglot: вертикаль и горизонталь 'куда', 'откуда', превращение"""
+    from_row, from_col = coords(move_from(move))
+    to_row, to_col = coords(move_to(move))
+    promotion = move_promotion(move)
+    return (to_col | (7 - to_row) << 3 | from_col << 6 | (7 - from_row) << 9
+            | ((promotion - 1) if promotion else 0) << 12)
+
+
+def decode_book_move(data):
+    to = square(7 - ((data >> 3) & 7), data & 7)
+    frm = square(7 - ((data >> 9) & 7), (data >> 6) & 7)
+    promotion = (data >> 12) & 7
+    return encode_move(frm, to, promotion + 1 if promotion else 0)
+
+
+class OpeningBook:
+    """Книга, отображенная в память"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.count = size // ENTRY.size
+        # Пустой файл отобразить нельзя - такая книга просто ничего не находит
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def close(self):
+        if self.data:
+            self.data.close()
+        self.file.close()
+
+    def _first(self, key):
+        """Номер первой записи с ключом не меньше key"""
+        low, high = 0, self.count
+        data = self.data
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def entries(self, key):
+        """Ходы книги для позиции: [(ход, вес), ...]"""
+        result = []
+        index = self._first(key)
+        while index < self.count:
+            entry_key, move, weight, _ = ENTRY.unpack_from(self.data, index * ENTRY.size)
+            if entry_key != key:
+                break
+            result.append((decode_book_move(move), weight))
+            index += 1
+        return result
+
+    def choose(self, position, movegen, rng=random):
+        """Случайный (с учетом веса) допустимый ход книги или None"""
+        candidates = [(move, weight) for move, weight in self.entries(position.key)
+                      if weight and move in movegen.legal_moves_from(position, move_from(move))]
+        if not candidates:
+            return None
+        pick = rng.uniform(0, sum(weight for _, weight in candidates))
+        for move, weight in candidates:
+            pick -= weight
+            if pick <= 0:
+                return move
+        return candidates[-1][0]
+
+
+def open_book(path=ФАЙЛ_КНИГИ):
+    """Книга по пути (одна на процесс) или None, если файла нет"""
+    if path not in _books:
+        _books[path] = OpeningBook(path) if path and os.path.exists(path) else None
+    return _books[path]
+
+
+def build_book(sources, max_plies=24, min_games=1):
+    """Собирает записи книги из партий PGN: вес хода - 2 за победу сделавшей его стороны, 1 за ничью"""
+    weights = Counter()
+    games = Counter()
+    for source in sources:
+        for game in iter_games(source, errors='skip'):
+            if 'FEN' in game.headers:
+                continue  # Партии не из начальной позиции в книгу не берем
+            score = {'1-0': (2, 0), '0-1': (0, 2), '1/2-1/2': (1, 1)}.get(game.result)
+            position = Position.from_fen(START_FEN)
+            for move in game.moves[:max_plies]:
+                entry = (position.key, encode_book_move(move))
+                games[entry] += 1
+                if score:
+                    weights[entry] += score[position.side >> 3]
+                position.make_move(move)
+    entries = [(key, move, weights[(key, move)]) for (key, move), count in games.items() if count >= min_games]
+    top = max((weight for _, _, weight in entries), default=0)
+    scale = МАКС_ВЕС / top if top > МАКС_ВЕС else 1
+    # Ходы, которые ни разу не принесли очков, оставляем с весом 1: книга их знает, но выбирает редко
+    entries = [(key, move, max(1, int(weight * scale))) for key, move, weight in entries]
+    entries.sort(key=lambda entry: (entry[0], -entry[2]))
+    return entries
+
+
+def write_book(entries, path):
+    with open(path, 'wb') as output:
+        for key, move, weight in entries:
+            output.write(ENTRY.pack(key, move, weight, 0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Дебютная книга")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="собрать книгу из PGN")
+    build.add_argument('pgn', nargs='+', help="файлы PGN")
+    build.add_argument('--output', default=ФАЙЛ_КНИГИ, help="файл книги")
+    build.add_argument('--plies', type=int, default=24, help="сколько полуходов партии брать в книгу")
+    build.add_argument('--min-games', type=int, default=1, help="ход должен встретиться хотя бы в стольких партиях")
+    probe = commands.add_parser('probe', help="показать ходы книги для позиции")
+    probe.add_argument('fen', help="позиция в FEN")
+    probe.add_argument('--book', default=ФАЙЛ_КНИГИ, help="файл книги")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        sources = [open(path, encoding='utf-8', errors='replace') for path in args.pgn]
+        try:
+            entries = build_book(sources, args.plies, args.min_games)
+        finally:
+            for source in sources:
+                source.close()
+        write_book(entries, args.output)
+        print(f"Записей: {len(entries)}, файл: {args.output}")
+    else:
+        book = OpeningBook(args.book)
+        position = Position.from_fen(args.fen)
+        for move, weight in book.entries(position.key):
+            print(f"{move_to_uci(move)} {weight}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,308 @@
+"""Шахматная партия без интерфейса: правила, часы и ИИ. Модуль не зависит от pygame.
+
+Окно (1.py), пакетные прогоны и серверы используют один и тот же класс Game:
+
+    from engine import Game
+    game = Game(workers=1)
+    result = game.find_move(1.0)     # ход ИИ за сторону, чей ход
+    message = game.play(result.move)  # "Шах!", "Пат!" и т.п. или None
+
+Пока думает человек, ИИ может анализировать позицию (analyze в отдельном потоке до
+stop_event.set()) или сразу искать ответ на ожидаемый ход (expected_reply): если человек
+сыграл его, уже идущий поиск и становится ходом ИИ.
+"""
+
+import os
+import time
+from datetime import date
+
+from position import Position, BLACK, COLORS, START_FEN, square, coords, move_from, move_to, move_to_uci
+from movegen import get_generator
+from search import MATE, TB_WIN, MAX_DEPTH, SearchResult
+from parallel import make_search
+from tt import TranspositionTable, EXACT, TERMINAL_DEPTH
+from pgn import format_pgn
+from book import open_book, ФАЙЛ_КНИГИ
+from tablebase import open_tablebase, ПАПКА_ТАБЛИЦ, WIN, LOSS
+
+ДОЛЯ_ВРЕМЕНИ_НА_ХОД = 30  # ИИ тратит на ход 1/30 оставшегося времени
+МИН_ВРЕМЯ_НА_ХОД = 0.1
+ХЕШ_МБ = 32  # Размер таблицы транспозиций (при параллельном поиске - на все процессы вместе)
+ХЕШ_ПАРТИИ_МБ = 1  # Своя таблица партии при параллельном поиске: в ней только отметки мата и пата
+ЧИСЛО_ПРОЦЕССОВ_ПОИСКА = os.cpu_count() or 1  # 1 - искать в текущем процессе
+ВРЕМЯ_НА_ПАРТИЮ = 180  # 3 минуты в секундах
+ЧИСЛО_ВАРИАНТОВ = 3  # Сколько лучших вариантов показывает анализ
+ВРЕМЯ_АНАЛИЗА = 24 * 3600  # Без ограничения анализ идет, пока его не остановят
+
+
+class Game:
+    """Состояние партии: позиция, очередь хода, часы и итог"""
+
+    def __init__(self, movegen='mailbox', workers=ЧИСЛО_ПРОЦЕССОВ_ПОИСКА, fen=START_FEN,
+                 clock=ВРЕМЯ_НА_ПАРТИЮ, hash_mb=ХЕШ_МБ, book=ФАЙЛ_КНИГИ, tablebase=ПАПКА_ТАБЛИЦ):
+        self.movegen = get_generator(movegen)  # 'mailbox' или 'bitboard'
+        self.book = open_book(book) if book else None  # Дебютная книга (None - нет файла)
+        self.tablebase = open_tablebase(tablebase)  # Эндшпильные таблицы (None - не построены)
+        self.tt = None
+        self.configure_search(workers, hash_mb, tablebase)
+        self.board = self.fen_to_board(fen)
+        self.start_fen = fen
+        self.history = []  # Сделанные ходы по порядку - для записи партии
+        self.current_player = 'white' if self.board.side != BLACK else 'black'
+        self.game_over = False
+        self.winner = None # победитель
+        self.message = None  # Последнее сообщение о ходе: шах, мат, пат, ничья
+        self.reason = None  # Почему партия закончилась: 'checkmate', 'stalemate', 'repetition', 'time'
+
+        # Ходы текущей позиции считаются один раз: ключ Zobrist -> (ходы, ходы по клеткам, шах)
+        self.moves_key = None
+        self.moves = []
+        self.moves_by_square = {}
+        self.check = False
+
+        # Таймеры
+        self.white_time = clock
+        self.black_time = clock
+        self.start_time = time.time()
+
+    def configure_search(self, workers, hash_mb, tablebase=ПАПКА_ТАБЛИЦ):
+        """Поиск на workers процессах; hash_mb - память под таблицы транспозиций на всех вместе"""
+        size = hash_mb if not workers or workers <= 1 else ХЕШ_ПАРТИИ_МБ  # Иначе таблицы - в процессах пула
+        if self.tt is None:
+            self.tt = TranspositionTable(size)
+        elif self.tt.size_mb != size:
+            self.tt.resize(size)
+        self.search = make_search(workers, self.movegen.name, self.tt, hash_mb, tablebase)
+
+    def fen_to_board(self, fen):
+        """Преобразует FEN в доску"""
+        return Position.from_fen(fen)
+
+    def update_timer(self):
+        """Обновляет таймеры игроков"""
+        if not self.game_over:
+            elapsed_time = time.time() - self.start_time
+            self.start_time = time.time()  # Сбрасываем время
+
+            if self.current_player == 'white':
+                self.white_time -= elapsed_time
+                if self.white_time <= 0:
+                    self.white_time = 0
+                    self.game_over = True
+                    self.winner = 'black'
+                    self.reason = 'time'
+                    self.message = "Black wins on time!"
+            else:
+                self.black_time -= elapsed_time
+                if self.black_time <= 0:
+                    self.black_time = 0
+                    self.game_over = True
+                    self.winner = 'white'
+                    self.reason = 'time'
+                    self.message = "White wins on time!"
+            self.white_time = max(0, self.white_time)
+            self.black_time = max(0, self.black_time)
+
+    def refresh_moves(self):
+        """Генерирует ходы, только если позиция изменилась с прошлого вызова"""
+        if self.moves_key != self.board.key:
+            self.moves = self.movegen.legal_moves(self.board)
+            self.moves_by_square = {}
+            for move in self.moves:
+                self.moves_by_square.setdefault(move_from(move), []).append(move)
+            self.check = self.movegen.in_check(self.board, self.board.side)
+            self.moves_key = self.board.key
+
+    def legal_moves(self):
+        """Все допустимые ходы стороны, чей ход (из кеша)"""
+        self.refresh_moves()
+        return self.moves
+
+    def get_valid_moves(self, row, col):
+       """Возвращает допустимые ходы для фигуры, исключая те, после которых король под шахом."""
+       piece = self.board.piece_at(row, col)
+       if not piece or piece & BLACK != COLORS[self.current_player]:
+           return []
+       self.refresh_moves()
+       # Варианты превращения пешки ведут на одну клетку - оставляем ее один раз
+       targets = dict.fromkeys(move_to(move) for move in self.moves_by_square.get(square(row, col), ()))
+       return [coords(sq) for sq in targets]
+
+    def parse_move(self, text):
+        """Ход в записи UCI ('e2e4', 'e7e8q') среди допустимых; None, если такого хода нет"""
+        for move in self.legal_moves():
+            if move_to_uci(move) == text:
+                return move
+        return None
+
+    def is_own_piece(self, row, col):
+        """Проверяет, стоит ли на клетке фигура текущего игрока"""
+        piece = self.board.piece_at(row, col)
+        return bool(piece) and piece & BLACK == COLORS[self.current_player]
+
+    def make_move(self, start, end):
+        """Выполняет ход (пешка на последней горизонтали превращается в ферзя); возвращает ход или None"""
+        to = square(*end)
+        self.refresh_moves()
+        for move in self.moves_by_square.get(square(*start), ()):
+            if move_to(move) == to:
+                self.board.make_move(move)  # Ферзь идет первым среди превращений
+                self.history.append(move)
+                return move
+        return None
+
+    def play(self, move):
+        """Делает готовый ход, переключает часы и проверяет конец партии; возвращает сообщение"""
+        self.board.make_move(move)
+        self.history.append(move)
+        self.update_timer()  # Списываем время раздумий с часов ходившего
+        if self.game_over:
+            return self.message  # Флажок упал раньше хода: итог - проигрыш по времени
+        self.switch_player()
+        return self.check_game_end()
+
+    def switch_player(self):
+        """Меняет текущего игрока"""
+        self.current_player = 'black' if self.current_player == 'white' else 'white'
+        self.start_time = time.time() # Сбрасываем таймер
+
+    def computer_time_limit(self, player=None):
+        """Время на ход - доля оставшегося времени на часах player (по умолчанию - стороны, чей ход)"""
+        if player is None:
+            player = self.current_player
+        clock = self.white_time if player == 'white' else self.black_time
+        return max(МИН_ВРЕМЯ_НА_ХОД, clock / ДОЛЯ_ВРЕМЕНИ_НА_ХОД)
+
+    def find_move(self, time_limit=None, stop_event=None, position=None):
+        """Поиск хода ИИ (блокирующий вызов); position - например, копия доски для другого потока"""
+        if time_limit is None:
+            time_limit = self.computer_time_limit()
+        if position is None:
+            position = self.board
+        if position.key == self.board.key:
+            moves = self.legal_moves()
+            if len(moves) < 2:
+                # Выбирать не из чего - поиск не запускаем
+                return SearchResult(moves[0] if moves else None, 0, 0, 0)
+        if self.book is not None:
+            move = self.book.choose(position, self.movegen)
+            if move is not None:
+                return SearchResult(move, 0, 0, 0)  # Ход из книги - без поиска
+        if self.tablebase is not None:
+            best = self.tablebase.best_move(position, self.movegen)
+            if best is not None:
+                # Точный ход из таблиц: быстрейший мат или самая долгая защита
+                move, result, plies = best
+                score = TB_WIN - plies if result == WIN else -TB_WIN + plies if result == LOSS else 0
+                return SearchResult(move, score, 0, 0)
+        return self.search.search(position, time_limit, stop_event=stop_event)
+
+    def analyze(self, stop_event, multi_pv=ЧИСЛО_ВАРИАНТОВ, on_update=None, position=None):
+        """Анализ позиции до stop_event.set() (блокирующий вызов); возвращает последние варианты.
+
+        Глубина растет по одной, после каждой вызывается on_update(варианты, глубина), где
+        варианты - [(оценка за сторону, чей ход, [ход, ответ, ...])].
+        """
+        if position is None:
+            position = self.board
+        lines = []
+        for depth in range(1, MAX_DEPTH + 1):
+            result = self.search.search(position, ВРЕМЯ_АНАЛИЗА, depth, stop_event=stop_event, multi_pv=multi_pv)
+            if stop_event.is_set() or result.move is None:
+                break
+            lines = self.search.lines(position, multi_pv)
+            if on_update:
+                on_update(lines, result.depth)
+            if result.depth < depth:
+                break  # Найден мат - глубже искать нечего
+        return lines
+
+    def expected_reply(self, position, move):
+        """Ожидаемый ответ соперника на ход move из позиции position - второй ход главного
+        варианта последнего поиска; None, если вариант не начинается с move или короче.
+        По нему окно заранее ищет следующий ход ИИ (пондеринг)."""
+        pv = self.search.principal_variation(position, 2)
+        return pv[1] if len(pv) > 1 and pv[0] == move else None
+
+    def computer_move(self):
+        """ИИ для игры против компьютера: поиск с альфа-бета отсечением (блокирующий вызов)"""
+        result = self.find_move()
+        if result.move is not None:
+            self.play(result.move)
+
+    def check_game_end(self):
+        """Проверяет мат, пат, троекратное повторение и шах после хода; возвращает сообщение.
+
+        Если партия уже закончена (например, по времени), итог не меняется.
+        """
+        if self.game_over:
+            return self.message
+        self.message = None
+        if self.is_checkmate(self.current_player):
+            self.game_over = True
+            self.winner = 'white' if self.current_player == 'black' else 'black'
+            self.reason = 'checkmate'
+            self.message = f"{'Белые' if self.current_player == 'black' else 'Черные'} выиграли матом!"
+        elif self.is_stalemate(self.current_player):
+            self.game_over = True
+            self.reason = 'stalemate'
+            self.message = "Пат!"
+        elif self.board.repetitions() >= 2:
+            self.game_over = True
+            self.reason = 'repetition'
+            self.message = "Ничья: троекратное повторение позиции!"
+        elif self.is_king_in_check(self.current_player):
+            self.message = "Шах!"
+        return self.message
+
+    def result(self):
+        """Итог в записи PGN: '1-0', '0-1', '1/2-1/2' или '*', если партия идет"""
+        if not self.game_over:
+            return '*'
+        if self.winner:
+            return '1-0' if self.winner == 'white' else '0-1'
+        return '1/2-1/2'
+
+    def to_pgn(self, headers=None):
+        """Запись партии в PGN"""
+        pgn_headers = {'Event': 'Ghhs-chess', 'Date': date.today().strftime('%Y.%m.%d')}
+        pgn_headers.update(headers or {})
+        if self.reason:
+            pgn_headers['Termination'] = self.reason
+        return format_pgn(self.history, pgn_headers, self.result(), self.start_fen)
+
+    def save_pgn(self, path, headers=None):
+        """Дописывает партию в конец файла PGN"""
+        with open(path, 'a', encoding='utf-8') as output:
+            output.write(self.to_pgn(headers))
+
+    def is_king_in_check(self, player, board=None):
+        """Проверяет, находится ли король под шахом."""
+        if board is None:
+            board = self.board
+            if board.side == COLORS[player]:
+                self.refresh_moves()
+                return self.check
+        return self.movegen.in_check(board, COLORS[player])
+
+    def is_checkmate(self, player):
+        """Проверяет, есть ли мат"""
+        if not self.is_king_in_check(player):
+            return False  # Нет шаха - нет мата
+        # Ходы ищем для стороны, чей ход в позиции
+        return self.board.side == COLORS[player] and not self.has_legal_move()
+
+    def is_stalemate(self, player):
+        """Проверяет, есть ли пат"""
+        if self.is_king_in_check(player):
+            return False # Если есть шах, то это не пат
+        return self.board.side == COLORS[player] and not self.has_legal_move()
+
+    def has_legal_move(self):
+        """Есть ли ход у стороны, чей ход"""
+        self.refresh_moves()
+        if self.moves:
+            return True
+        # Запоминаем для поиска: мат (оценка от текущего узла) или пат
+        self.tt.store(self.board.key, 0, TERMINAL_DEPTH, EXACT, -MATE if self.check else 0)
+        return False
@@ -0,0 +1,98 @@
+"""Оценка позиции: материал и таблицы положения фигур (piece-square tables)."""
+
+from position import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, square
+
+PIECE_VALUES = {PAWN: 100, KNIGHT: 320, BISHOP: 330, ROOK: 500, QUEEN: 900, KING: 0}
+
+# Таблицы с точки зрения белых: первая строка - восьмая горизонталь
+PST = {
+    PAWN: (
+        (0, 0, 0, 0, 0, 0, 0, 0),
+        (50, 50, 50, 50, 50, 50, 50, 50),
+        (10, 10, 20, 30, 30, 20, 10, 10),
+        (5, 5, 10, 25, 25, 10, 5, 5),
+        (0, 0, 0, 20, 20, 0, 0, 0),
+        (5, -5, -10, 0, 0, -10, -5, 5),
+        (5, 10, 10, -20, -20, 10, 10, 5),
+        (0, 0, 0, 0, 0, 0, 0, 0),
+    ),
+    KNIGHT: (
+        (-50, -40, -30, -30, -30, -30, -40, -50),
+        (-40, -20, 0, 0, 0, 0, -20, -40),
+        (-30, 0, 10, 15, 15, 10, 0, -30),
+        (-30, 5, 15, 20, 20, 15, 5, -30),
+        (-30, 0, 15, 20, 20, 15, 0, -30),
+        (-30, 5, 10, 15, 15, 10, 5, -30),
+        (-40, -20, 0, 5, 5, 0, -20, -40),
+        (-50, -40, -30, -30, -30, -30, -40, -50),
+    ),
+    BISHOP: (
+        (-20, -10, -10, -10, -10, -10, -10, -20),
+        (-10, 0, 0, 0, 0, 0, 0, -10),
+        (-10, 0, 5, 10, 10, 5, 0, -10),
+        (-10, 5, 5, 10, 10, 5, 5, -10),
+        (-10, 0, 10, 10, 10, 10, 0, -10),
+        (-10, 10, 10, 10, 10, 10, 10, -10),
+        (-10, 5, 0, 0, 0, 0, 5, -10),
+        (-20, -10, -10, -10, -10, -10, -10, -20),
+    ),
+    ROOK: (
+        (0, 0, 0, 0, 0, 0, 0, 0),
+        (5, 10, 10, 10, 10, 10, 10, 5),
+        (-5, 0, 0, 0, 0, 0, 0, -5),
+        (-5, 0, 0, 0, 0, 0, 0, -5),
+        (-5, 0, 0, 0, 0, 0, 0, -5),
+        (-5, 0, 0, 0, 0, 0, 0, -5),
+        (-5, 0, 0, 0, 0, 0, 0, -5),
+        (0, 0, 0, 5, 5, 0, 0, 0),
+    ),
+    QUEEN: (
+        (-20, -10, -10, -5, -5, -10, -10, -20),
+        (-10, 0, 0, 0, 0, 0, 0, -10),
+        (-10, 0, 5, 5, 5, 5, 0, -10),
+        (-5, 0, 5, 5, 5, 5, 0, -5),
+        (0, 0, 5, 5, 5, 5, 0, -5),
+        (-10, 5, 5, 5, 5, 5, 0, -10),
+        (-10, 0, 5, 0, 0, 0, 0, -10),
+        (-20, -10, -10, -5, -5, -10, -10, -20),
+    ),
+    KING: (
+        (-30, -40, -40, -50, -50, -40, -40, -30),
+        (-30, -40, -40, -50, -50, -40, -40, -30),
+        (-30, -40, -40, -50, -50, -40, -40, -30),
+        (-30, -40, -40, -50, -50, -40, -40, -30),
+        (-20, -30, -30, -40, -40, -30, -30, -20),
+        (-10, -20, -20, -20, -20, -20, -20, -10),
+        (20, 20, 0, 0, 0, 0, 20, 20),
+        (20, 30, 10, 0, 0, 10, 30, 20),
+    ),
+}
+
+
+def _square_tables():
+    """SQUARE_VALUES[код фигуры][клетка 10x12] = материал + позиционный бонус (для черных зеркально)"""
+    tables = [None] * 16
+    for kind, table in PST.items():
+        for color in (WHITE, BLACK):
+            values = [0] * 120
+            for row in range(8):
+                for col in range(8):
+                    pst_row = row if color == WHITE else 7 - row
+                    values[square(row, col)] = PIECE_VALUES[kind] + table[pst_row][col]
+            tables[color | kind] = tuple(values)
+    return tables
+
+
+SQUARE_VALUES = _square_tables()
+
+
+def evaluate(position):
+    """Оценка в сантипешках с точки зрения стороны, чей ход"""
+    squares = position.squares
+    white = 0
+    for sq in position.pieces[0]:
+        white += SQUARE_VALUES[squares[sq]][sq]
+    black = 0
+    for sq in position.pieces[1]:
+        black += SQUARE_VALUES[squares[sq]][sq]
+    return white - black if position.side == WHITE else black - white
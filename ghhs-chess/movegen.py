@@ -0,0 +1,35 @@
+"""Подключаемые генераторы ходов. Все работают с Position и возвращают ходы в одном формате."""
+
+from bitboard import BitboardGenerator
+
+
+class MailboxGenerator:
+    """Генератор ходов на доске 10x12 (методы самой позиции)"""
+
+    name = 'mailbox'
+
+    def legal_moves(self, position):
+        return position.legal_moves()
+
+    def legal_moves_from(self, position, sq):
+        return position.legal_moves_from(sq)
+
+    def has_legal_move(self, position):
+        return position.has_legal_move()
+
+    def in_check(self, position, color):
+        return position.in_check(color)
+
+
+GENERATORS = {
+    MailboxGenerator.name: MailboxGenerator,
+    BitboardGenerator.name: BitboardGenerator,
+}
+
+
+def get_generator(name='mailbox'):
+    """Возвращает генератор ходов по имени"""
+    try:
+        return GENERATORS[name]()
+    except KeyError:
+        raise ValueError(f"Неизвестный генератор ходов: {name}") from None
@@ -0,0 +1,295 @@
+"""Параллельный поиск: ходы из корня делятся между процессами пула (root splitting).
+
+Каждый процесс держит свой Search и свою таблицу транспозиций между вызовами. Итог
+выбирается по самой большой глубине, которую завершили все процессы. Какой процесс
+получит какие ходы, решает пул, а таблицы процессов помнят прошлые поиски, поэтому даже
+при фиксированной глубине (max_depth) итог может зависеть от того, что искали раньше.
+
+На одном пуле могут идти несколько поисков сразу (например, анализ и ход ИИ): у каждого
+свой слот - флаг остановки в общем массиве и очередь, по которой процессы присылают итоги
+каждой глубины. stop одного поиска не трогает другие, а on_iteration вызывается по ходу
+поиска, как только глубину завершили все процессы.
+"""
+
+import atexit
+import itertools
+import multiprocessing
+import multiprocessing.pool
+import os
+import signal
+import threading
+import time
+import weakref
+
+from movegen import get_generator
+from search import Search, SearchResult, MAX_DEPTH, MATE_BOUND
+from tt import TranspositionTable
+from tablebase import open_tablebase
+
+POLL_INTERVAL = 0.02  # Как часто проверять отмену, пока процессы считают
+ПОИСКОВ_НА_ПУЛ = 16  # Сколько поисков может одновременно идти на одном пуле
+
+# Состояние процесса-воркера
+_worker_search = None
+_worker_stop_flags = None
+_worker_progress = None
+
+_search_ids = itertools.count(1)  # Номера поисков: по ним отбрасываются опоздавшие итоги прошлых поисков
+
+# Пулы процессов: (число процессов, генератор, МБ хеша, таблицы) -> _Pool.
+# Пул закрывается, когда не осталось ни одного ParallelSearch, который им пользуется
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class _StopSlot:
+    """Флаг остановки одного поиска в процессе-воркере: ячейка общего массива флагов"""
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def is_set(self):
+        return bool(_worker_stop_flags[self.slot])
+
+
+class _Pool:
+    """Пул процессов, общие флаги остановки, очереди итогов и кто им пользуется"""
+
+    def __init__(self, workers, movegen_name, hash_mb, tablebase):
+        self.stop_flags = multiprocessing.Array('b', ПОИСКОВ_НА_ПУЛ)
+        self.progress = [multiprocessing.SimpleQueue() for _ in range(ПОИСКОВ_НА_ПУЛ)]
+        self.free_slots = list(range(ПОИСКОВ_НА_ПУЛ))
+        self.owners = weakref.WeakSet()  # ParallelSearch с такими настройками
+        self.pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                         initargs=(self.stop_flags, self.progress, movegen_name,
+                                                   hash_mb / workers, tablebase))
+
+    def alive(self):
+        return self.pool._state == multiprocessing.pool.RUN
+
+    def take_slot(self):
+        """Слот флага остановки для нового поиска"""
+        with _pools_lock:
+            if not self.free_slots:
+                raise RuntimeError(f"На одном пуле не может идти больше {ПОИСКОВ_НА_ПУЛ} поисков сразу")
+            slot = self.free_slots.pop()
+        self.stop_flags[slot] = 0
+        return slot
+
+    def received(self, slot):
+        """Итоги глубин, которые процессы уже прислали в очередь слота"""
+        queue = self.progress[slot]
+        messages = []
+        while not queue.empty():
+            messages.append(queue.get())
+        return messages
+
+    def release_slot(self, slot):
+        with _pools_lock:
+            self.free_slots.append(slot)
+
+
+def _init_worker(stop_flags, progress, movegen_name, hash_mb, tablebase):
+    """hash_mb - доля процесса: общий размер Hash делится между процессами пула"""
+    global _worker_search, _worker_stop_flags, _worker_progress
+    # После fork процесс наследует обработчик SIGTERM из SDL, и terminate() его не завершит
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C обрабатывает главный процесс
+    _worker_search = Search(get_generator(movegen_name), TranspositionTable(hash_mb), open_tablebase(tablebase))
+    _worker_stop_flags = stop_flags
+    _worker_progress = progress
+
+
+def _part_pv(position, result):
+    """Главный вариант части: лучший ход и продолжение из таблицы (корень части в таблицу не пишется)"""
+    position.make_move(result.move)
+    pv = [result.move] + _worker_search.principal_variation(position, result.depth - 1)
+    position.unmake_move()
+    return pv
+
+
+def _search_part(position, moves, time_limit, max_depth, multi_pv=1, slot=0, search_id=0, part=0):
+    """Ищет в процессе-воркере среди части ходов из корня; возвращает итоги, варианты и главные
+    варианты по глубинам и число узлов.
+
+    slot - ячейка флагов остановки и очередь итогов, выданные поиску search_id; part - номер части.
+    """
+    iterations = []
+    lines = []
+    pvs = []
+
+    def on_iteration(result):
+        iterations.append(result)
+        lines.append(_worker_search.lines(position, multi_pv))
+        pvs.append(_part_pv(position, result))
+        _worker_progress[slot].put((search_id, part, result, lines[-1], pvs[-1]))
+
+    result = _worker_search.search(position, time_limit, max_depth, stop_event=_StopSlot(slot),
+                                   root_moves=moves, on_iteration=on_iteration, multi_pv=multi_pv)
+    return iterations, lines, pvs, result.nodes
+
+
+def _get_pool(owner, workers, movegen_name, hash_mb, tablebase):
+    """Пул с такими настройками для owner; пулы, которыми никто не пользуется, закрываются"""
+    key = (workers, movegen_name, hash_mb, tablebase)
+    with _pools_lock:
+        for other in list(_pools):
+            if other != key and not _pools[other].owners:
+                _pools.pop(other).pool.terminate()  # Все ParallelSearch с этими настройками уже удалены
+        entry = _pools.get(key)
+        if entry is None or not entry.alive():
+            entry = _pools[key] = _Pool(workers, movegen_name, hash_mb, tablebase)
+        entry.owners.add(owner)
+    return entry
+
+
+@atexit.register
+def shutdown_pools():
+    """Закрывает все пулы процессов"""
+    with _pools_lock:
+        for entry in _pools.values():
+            entry.pool.terminate()
+        _pools.clear()
+
+
+class ParallelSearch:
+    """Поиск с делением ходов из корня между процессами; интерфейс как у Search"""
+
+    def __init__(self, workers=None, movegen='mailbox', hash_mb=16, tablebase=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.movegen_name = movegen
+        self.movegen = get_generator(movegen)
+        self.hash_mb = hash_mb  # На все процессы вместе
+        self.tablebase = tablebase  # Папка с эндшпильными таблицами: каждый процесс открывает их сам
+        self.nodes = 0
+        self.root_lines = []  # Лучшие варианты последнего поиска из всех процессов
+        self.root_pv = []  # Главный вариант последнего поиска
+
+    def start_pool(self):
+        """Запускает процессы заранее, не дожидаясь первого поиска"""
+        _get_pool(self, self.workers, self.movegen_name, self.hash_mb, self.tablebase)
+
+    def split_moves(self, moves):
+        """Раздает ходы по кругу, чтобы у процессов были ходы разного качества"""
+        parts = [moves[i::self.workers] for i in range(self.workers)]
+        return [part for part in parts if part]
+
+    def search(self, position, time_limit, max_depth=MAX_DEPTH, stop_event=None, on_iteration=None, multi_pv=1):
+        """Как Search.search; on_iteration вызывается после каждой глубины, завершенной всеми процессами"""
+        self.root_lines = []
+        self.root_pv = []
+        self.nodes = 0
+        moves = self.movegen.legal_moves(position)
+        if not moves:
+            return SearchResult(None, 0, 0, 0)
+        split = self.split_moves(moves)
+        # По частям: итоги, варианты и главные варианты по глубинам, узлы
+        iterations = [[] for _ in split]
+        lines = [[] for _ in split]
+        pvs = [[] for _ in split]
+        nodes = [0] * len(split)
+        reported = 0
+        search_id = next(_search_ids)
+        entry = _get_pool(self, self.workers, self.movegen_name, self.hash_mb, self.tablebase)
+        slot = entry.take_slot()
+        try:
+            entry.received(slot)  # Опоздавшие итоги прошлого поиска в этом слоте
+            pending = [entry.pool.apply_async(_search_part, (position, part, time_limit, max_depth, multi_pv,
+                                                             slot, search_id, index))
+                       for index, part in enumerate(split)]
+            while not all(task.ready() for task in pending):
+                if not entry.alive():
+                    break  # Пул закрыли (например, при выходе): задачи не завершатся, берем присланное
+                if stop_event is not None and stop_event.wait(POLL_INTERVAL):
+                    entry.stop_flags[slot] = 1  # Процессы сами остановятся на ближайшей проверке
+                elif stop_event is None:
+                    time.sleep(POLL_INTERVAL)
+                for message_id, index, result, part_lines, pv in entry.received(slot):
+                    if message_id == search_id:
+                        iterations[index].append(result)
+                        lines[index].append(part_lines)
+                        pvs[index].append(pv)
+                        nodes[index] = result.nodes
+                if not entry.stop_flags[slot] and any(part and part[-1].score >= MATE_BOUND for part in iterations):
+                    entry.stop_flags[slot] = 1  # Мат найден - остальным процессам искать дальше незачем
+                if on_iteration and all(iterations):
+                    reported = self._report(iterations, lines, pvs, nodes, split, moves, reported, on_iteration)
+            if all(task.ready() for task in pending):
+                parts = [task.get() for task in pending]
+            else:
+                parts = list(zip(iterations, lines, pvs, nodes))
+        finally:
+            entry.release_slot(slot)
+        # Окончательные итоги - из ответов процессов; части, не завершившие и первой глубины, не в счет
+        finished = [index for index, part in enumerate(parts) if part[0]]
+        iterations = [parts[index][0] for index in finished]
+        lines = [parts[index][1] for index in finished]
+        pvs = [parts[index][2] for index in finished]
+        split = [split[index] for index in finished]
+        nodes = [part[3] for part in parts]
+        self.nodes = sum(nodes)
+        if not finished:
+            return SearchResult(moves[0], 0, 0, self.nodes)
+        if on_iteration:
+            self._report(iterations, lines, pvs, nodes, split, moves, reported, on_iteration)
+        depth = self.completed_depth(iterations)
+        self.root_lines = self.combine_lines(lines, depth, moves)
+        self.root_pv = self.combine_pv(iterations, pvs, split, moves, depth)
+        return self.combine(iterations, moves)
+
+    def _report(self, iterations, lines, pvs, nodes, split, moves, reported, on_iteration):
+        """Вызывает on_iteration для глубин, завершенных всеми частями после reported; возвращает последнюю"""
+        depth = self.completed_depth(iterations)
+        for current in range(reported + 1, depth + 1):
+            self.nodes = sum(nodes)
+            self.root_lines = self.combine_lines(lines, current, moves)
+            self.root_pv = self.combine_pv(iterations, pvs, split, moves, current)
+            result = self.combine(iterations, moves, current)
+            if result.depth == current:  # Мат, найденный раньше, уже сообщен на своей глубине
+                on_iteration(result)
+        return max(reported, depth)
+
+    def completed_depth(self, parts):
+        """Самая большая глубина, завершенная всеми частями (часть с матом завершена на любой)"""
+        # Процесс, нашедший мат, останавливается раньше - его оценка уже точная
+        open_depths = [len(iterations) for iterations in parts if abs(iterations[-1].score) < MATE_BOUND]
+        return min(open_depths) if open_depths else max(len(iterations) for iterations in parts)
+
+    def combine(self, parts, moves, depth=None):
+        """Лучший ход на глубине depth (по умолчанию - самой большой, завершенной всеми частями)"""
+        order = {move: index for index, move in enumerate(moves)}
+        if depth is None:
+            depth = self.completed_depth(parts)
+        # При равной оценке берем ход, который раньше в списке
+        best = max((iterations[min(depth, len(iterations)) - 1] for iterations in parts),
+                   key=lambda result: (result.score, -order[result.move]))
+        return best._replace(nodes=self.nodes)
+
+    def combine_pv(self, parts, pvs, split, moves, depth):
+        """Главный вариант той части, чей ход лучший на глубине depth"""
+        best = self.combine(parts, moves, depth)
+        for index, part in enumerate(split):
+            if best.move in part:
+                return pvs[index][min(depth, len(pvs[index])) - 1]
+        return [best.move]
+
+    def combine_lines(self, parts, depth, moves):
+        """Варианты всех процессов на глубине итога (или последней, что успел процесс), лучшие первыми"""
+        order = {move: index for index, move in enumerate(moves)}
+        lines = [line for part in parts if part for line in part[min(depth, len(part)) - 1]]
+        return sorted(lines, key=lambda line: (-line[0], order[line[1][0]]))
+
+    def lines(self, position, count=1):
+        """Как Search.lines - по итогам последнего поиска"""
+        return self.root_lines[:count]
+
+    def principal_variation(self, position, max_length=MAX_DEPTH):
+        """Как Search.principal_variation - главный вариант последнего итога из процесса, нашедшего ход"""
+        return self.root_pv[:max_length]
+
+
+def make_search(workers, movegen='mailbox', tt=None, hash_mb=16, tablebase=None):
+    """Обычный поиск для одного процесса, параллельный - для нескольких; tablebase - папка таблиц"""
+    if workers and workers > 1:
+        return ParallelSearch(workers, movegen, hash_mb, tablebase)
+    return Search(get_generator(movegen), tt, open_tablebase(tablebase))
@@ -0,0 +1,144 @@
+"""Perft: подсчет позиций на глубину N для проверки и замера генератора ходов (без окна pygame).
+
+Примеры:
+    python perft.py --depth 4
+    python perft.py "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1" --depth 3 --divide
+    python perft.py --suite --max-depth 3 --movegen bitboard
+
+--suite заодно проверяет, что позиция, прочитанная из FEN, получает тот же ключ Zobrist,
+что и после ходов (иначе не сработают книга, таблица транспозиций и повторения).
+"""
+
+import argparse
+import sys
+import time
+
+from position import Position, START_FEN, move_to_uci, parse_square
+from movegen import get_generator, GENERATORS
+
+# Стандартные позиции и известное число узлов по глубинам (начиная с глубины 1)
+SUITE = [
+    ("Начальная позиция", START_FEN,
+     [20, 400, 8902, 197281, 4865609]),
+    ("Kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603]),
+    ("Эндшпиль (позиция 3)", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624]),
+    ("Позиция 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333]),
+    ("Позиция 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487]),
+    ("Позиция 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594]),
+]
+
+
+def perft(position, depth, movegen):
+    """Число листьев дерева ходов глубины depth"""
+    moves = movegen.legal_moves(position)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1, movegen)
+        position.unmake_move()
+    return nodes
+
+
+def divide(position, depth, movegen):
+    """Число листьев отдельно для каждого хода из корня"""
+    result = {}
+    for move in movegen.legal_moves(position):
+        position.make_move(move)
+        result[move_to_uci(move)] = perft(position, depth - 1, movegen) if depth > 1 else 1
+        position.unmake_move()
+    return result
+
+
+def timed_perft(fen, depth, movegen):
+    """Возвращает (узлы, секунды)"""
+    position = Position.from_fen(fen)
+    start = time.perf_counter()
+    nodes = perft(position, depth, movegen) if depth > 0 else 1
+    return nodes, time.perf_counter() - start
+
+
+def format_nps(nodes, seconds):
+    return f"{nodes / seconds:,.0f} nps" if seconds > 0 else "- nps"
+
+
+def check_keys(position, depth, movegen):
+    """Ключ позиции из ее FEN совпадает с ключом, полученным ходами; возвращает число расхождений"""
+    errors = 0
+    if Position.from_fen(position.to_fen()).key != position.key:
+        print(f"Ключ из FEN не совпадает: {position.to_fen()}")
+        errors += 1
+    if depth > 0:
+        for move in movegen.legal_moves(position):
+            position.make_move(move)
+            errors += check_keys(position, depth - 1, movegen)
+            position.unmake_move()
+    return errors
+
+
+def run_suite(max_depth, movegen):
+    """Прогоняет стандартные позиции; возвращает True, если все числа совпали"""
+    all_ok = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, expected in SUITE:
+        for depth, count in enumerate(expected[:max_depth], start=1):
+            nodes, seconds = timed_perft(fen, depth, movegen)
+            total_nodes += nodes
+            total_time += seconds
+            ok = nodes == count
+            all_ok = all_ok and ok
+            status = "OK" if ok else f"ОШИБКА (ожидалось {count})"
+            print(f"{name:24} глубина {depth}: {nodes:>10} {status:28} {seconds:8.3f} с  {format_nps(nodes, seconds)}")
+    print(f"Итого: {total_nodes} узлов за {total_time:.3f} с, {format_nps(total_nodes, total_time)}")
+    # Начальная позиция + e2e4: FEN с полем e3 и ходы должны давать одну и ту же позицию
+    played = Position.from_fen(START_FEN)
+    played.make_move(parse_square('e2') | parse_square('e4') << 8)
+    errors = 0
+    if Position.from_fen("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1").key != played.key:
+        print("Ключ из FEN с полем e3 не совпадает с ключом после e2e4")
+        errors += 1
+    for name, fen, _ in SUITE:
+        errors += check_keys(Position.from_fen(fen), 2, movegen)
+    print("Ключи из FEN: OK" if not errors else f"Ключи из FEN: расхождений {errors}")
+    return all_ok and not errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft для генератора ходов")
+    parser.add_argument('fen', nargs='?', default=START_FEN, help="позиция в FEN (по умолчанию начальная)")
+    parser.add_argument('--depth', type=int, default=3, help="глубина перебора")
+    parser.add_argument('--divide', action='store_true', help="вывести число узлов для каждого хода из корня")
+    parser.add_argument('--suite', action='store_true', help="прогнать набор стандартных позиций")
+    parser.add_argument('--max-depth', type=int, default=3, help="максимальная глубина для --suite")
+    parser.add_argument('--movegen', choices=sorted(GENERATORS), default='mailbox', help="генератор ходов")
+    args = parser.parse_args(argv)
+
+    movegen = get_generator(args.movegen)
+    if args.suite:
+        return 0 if run_suite(args.max_depth, movegen) else 1
+
+    if args.divide:
+        position = Position.from_fen(args.fen)
+        start = time.perf_counter()
+        result = divide(position, args.depth, movegen)
+        seconds = time.perf_counter() - start
+        for move in sorted(result):
+            print(f"{move}: {result[move]}")
+        nodes = sum(result.values())
+        print(f"\nХодов: {len(result)}")
+    else:
+        nodes, seconds = timed_perft(args.fen, args.depth, movegen)
+    print(f"Узлов: {nodes}")
+    print(f"Время: {seconds:.3f} с, {format_nps(nodes, seconds)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""PGN: запись и потоковое чтение партий, ходы в стандартной алгебраической нотации (SAN).
+
+Чтение идет партия за партией через генератор, поэтому архив любого размера не
+загружается в память целиком:
+
+    python pgn.py archive.pgn            # проиграть все партии и показать скорость
+"""
+
+import argparse
+import re
+import sys
+import time
+from collections import namedtuple
+
+from position import (Position, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, START_FEN,
+                      square_name, parse_square, move_from, move_to, move_promotion)
+
+SAN_PIECES = {KNIGHT: 'N', BISHOP: 'B', ROOK: 'R', QUEEN: 'Q', KING: 'K'}
+SAN_KINDS = {char: kind for kind, char in SAN_PIECES.items()}
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+PgnGame = namedtuple('PgnGame', 'headers moves result')
+
+# Заголовок [Name "Value"] и лексемы текста ходов: комментарии, варианты, NAG, номера ходов
+HEADER_RE = re.compile(r'\[\s*(\w+)\s+"(.*)"\s*\]$')  # Неэкранированные кавычки тоже встречаются
+TOKEN_RE = re.compile(r'\{[^}]*\}?|;[^\n]*|\(|\)|\$\d+|\d+\.+|[^\s{}();$]+')
+ШИРИНА_СТРОКИ = 80  # PGN рекомендует строки не длиннее 80 символов
+
+
+def moves_to(position, kind, to, promotion=0, hint=''):
+    """Допустимые ходы фигур вида kind стороны, чей ход, на клетку to.
+
+    Ходы генерируются только для подходящих фигур (hint - вертикаль и/или горизонталь
+    клетки, откуда идет ход), а не для всей позиции - так SAN разбирается быстрее.
+    """
+    squares = position.squares
+    color = position.side
+    piece = color | kind
+    moves = []
+    for frm in tuple(position.pieces[color >> 3]):  # make_move меняет множество
+        if squares[frm] != piece:
+            continue
+        if hint:
+            name = square_name(frm)
+            if not all(char in name for char in hint):
+                continue
+        for move in position.pseudo_moves_from(frm):
+            if (move >> 8) & 0xFF == to and move >> 16 == promotion:
+                position.make_move(move)
+                if not position.in_check(color):
+                    moves.append(move)
+                position.unmake_move()
+    return moves
+
+
+def move_to_san(position, move, legal=None):
+    """Ход в SAN ('Nf3', 'exd5', 'O-O', 'e8=Q+'); legal - готовый список ходов позиции"""
+    frm, to = move_from(move), move_to(move)
+    piece = position.squares[frm]
+    kind = piece & 7
+    if kind == KING and abs(to - frm) == 2:
+        san = 'O-O' if to > frm else 'O-O-O'
+    elif kind == PAWN:
+        san = ''
+        if (to - frm) % 10:  # Пешка ушла на другую вертикаль - взятие
+            san = square_name(frm)[0] + 'x'
+        san += square_name(to)
+        if move_promotion(move):
+            san += '=' + SAN_PIECES[move_promotion(move)]
+    else:
+        san = SAN_PIECES[kind]
+        # Другие такие же фигуры, которые могут пойти на ту же клетку
+        if legal is None:
+            legal = moves_to(position, kind, to)
+        rivals = [move_from(other) for other in legal
+                  if move_to(other) == to and move_from(other) != frm and position.squares[move_from(other)] == piece]
+        if rivals:
+            name = square_name(frm)
+            if all(square_name(rival)[0] != name[0] for rival in rivals):
+                san += name[0]
+            elif all(square_name(rival)[1] != name[1] for rival in rivals):
+                san += name[1]
+            else:
+                san += name
+        if position.squares[to]:
+            san += 'x'
+        san += square_name(to)
+
+    position.make_move(move)
+    if position.in_check(position.side):
+        san += '+' if position.has_legal_move() else '#'
+    position.unmake_move()
+    return san
+
+
+def escape(value):
+    """Кавычки и обратная косая черта в значении заголовка"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def format_pgn(moves, headers=None, result='*', fen=START_FEN):
+    """Партия в PGN: заголовки и ходы (в кодировке Position) от позиции fen"""
+    headers = dict(headers or {})
+    headers['Result'] = result
+    if fen != START_FEN:
+        headers['SetUp'] = '1'
+        headers['FEN'] = fen
+    lines = [f'[{name} "{escape(value)}"]' for name, value in headers.items()]
+    lines.append('')
+
+    position = Position.from_fen(fen)
+    tokens = []
+    for index, move in enumerate(moves):
+        if position.side == WHITE:
+            tokens.append(f"{position.fullmove}.")
+        elif index == 0:
+            tokens.append(f"{position.fullmove}...")
+        tokens.append(move_to_san(position, move))
+        position.make_move(move)
+    tokens.append(result)
+
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > ШИРИНА_СТРОКИ:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+
+def parse_san(position, san, legal=None):
+    """Ход по записи SAN среди допустимых ходов позиции; ValueError, если хода нет или он неоднозначен"""
+    text = san.rstrip('+#!?')
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        king = position.kings[position.side >> 3]
+        to = king + (2 if len(text) == 3 else -2)
+        if legal is None:
+            legal = moves_to(position, KING, to)
+        candidates = [move for move in legal if move_from(move) == king and move_to(move) == to]
+    else:
+        promotion = 0
+        if len(text) > 2 and text[-1] in SAN_KINDS and text[-2] != 'x' and not text[-2].isupper():
+            promotion = SAN_KINDS[text[-1]]  # 'e8=Q' или 'e8Q'
+            text = text[:-2] if text[-2] == '=' else text[:-1]
+        if len(text) < 2 or text[-2] not in 'abcdefgh' or text[-1] not in '12345678':
+            raise ValueError(f"Не удалось разобрать ход: {san}")
+        to = parse_square(text[-2:])
+        if text[0] in SAN_KINDS:
+            kind, hint = SAN_KINDS[text[0]], text[1:-2]
+        else:
+            kind, hint = PAWN, text[:-2]
+        hint = hint.replace('x', '')
+        if legal is None:
+            candidates = moves_to(position, kind, to, promotion, hint)
+            legal = ()
+        else:
+            candidates = []
+        squares = position.squares
+        for move in legal:
+            if move_to(move) != to or move_promotion(move) != promotion:
+                continue
+            frm = move_from(move)
+            if squares[frm] & 7 != kind:
+                continue
+            name = square_name(frm)
+            if all(char in name for char in hint):
+                candidates.append(move)
+    if len(candidates) != 1:
+        reason = "Недопустимый" if not candidates else "Неоднозначный"
+        raise ValueError(f"{reason} ход {san} в позиции {position.to_fen()}")
+    return candidates[0]
+
+
+def read_games(source):
+    """Генератор (заголовки, текст ходов) по файлу PGN - по одной партии, не читая файл целиком"""
+    headers = {}
+    movetext = []
+    in_comment = False  # Комментарий {...} может занимать несколько строк
+    for line in source:
+        stripped = line.strip()
+        if in_comment:
+            movetext.append(stripped)
+            in_comment = stripped.rfind('{') > stripped.rfind('}')
+            continue
+        if stripped.startswith('%'):
+            continue  # Строка-экранирование
+        if stripped.startswith('['):
+            if movetext:
+                # Заголовок после ходов - началась следующая партия (пустой строки между ними нет)
+                yield headers, ' '.join(movetext)
+                headers, movetext = {}, []
+            match = HEADER_RE.match(stripped)
+            if match:
+                headers[match.group(1)] = re.sub(r'\\([\\"])', r'\1', match.group(2))
+        elif stripped:
+            movetext.append(stripped)
+            in_comment = stripped.rfind('{') > stripped.rfind('}')
+            if not in_comment and stripped.split()[-1] in RESULTS:
+                yield headers, ' '.join(movetext)
+                headers, movetext = {}, []
+    if headers or movetext:
+        yield headers, ' '.join(movetext)
+
+
+def parse_movetext(movetext, fen=START_FEN):
+    """Ходы основного варианта (комментарии и варианты пропускаются) и итог"""
+    position = Position.from_fen(fen)
+    moves = []
+    result = '*'
+    depth = 0  # Вложенность вариантов в скобках
+    for token in TOKEN_RE.findall(movetext):
+        first = token[0]
+        if first == '(':
+            depth += 1
+        elif first == ')':
+            depth -= 1
+        elif depth or first in '{;$' or first.isdigit() and token.rstrip('.').isdigit():
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            move = parse_san(position, token)
+            position.make_move(move)
+            moves.append(move)
+    return moves, result
+
+
+def iter_games(source, errors='raise'):
+    """Генератор PgnGame по файлу; errors='skip' пропускает партии с недопустимыми ходами"""
+    for number, (headers, movetext) in enumerate(read_games(source), start=1):
+        try:
+            moves, result = parse_movetext(movetext, headers.get('FEN', START_FEN))
+        except ValueError as error:
+            if errors == 'skip':
+                continue
+            raise ValueError(f"Партия {number}: {error}") from None
+        yield PgnGame(headers, moves, headers.get('Result', result))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Потоковое чтение PGN: проигрывает все партии файла")
+    parser.add_argument('path', help="файл PGN")
+    parser.add_argument('--skip-errors', action='store_true', help="пропускать партии с недопустимыми ходами")
+    args = parser.parse_args(argv)
+
+    games = plies = 0
+    started = time.perf_counter()
+    with open(args.path, encoding='utf-8', errors='replace') as source:
+        for game in iter_games(source, 'skip' if args.skip_errors else 'raise'):
+            games += 1
+            plies += len(game.moves)
+    seconds = time.perf_counter() - started
+    print(f"Партий: {games}, полуходов: {plies}, время: {seconds:.2f} с")
+    if seconds > 0:
+        print(f"Полуходов/с: {plies / seconds:,.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
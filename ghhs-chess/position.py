@@ -0,0 +1,552 @@
+"""Компактное представление позиции: доска 10x12 в bytearray, списки фигур и ход с откатом."""
+
+import random
+
+# Типы фигур
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+
+# Цвета (старший бит кода фигуры)
+WHITE, BLACK = 0, 8
+
+EMPTY = 0
+OFFBOARD = 16
+
+COLORS = {'white': WHITE, 'black': BLACK}
+COLOR_NAMES = {WHITE: 'white', BLACK: 'black'}
+TYPE_NAMES = {PAWN: 'pawn', KNIGHT: 'knight', BISHOP: 'bishop', ROOK: 'rook', QUEEN: 'queen', KING: 'king'}
+
+FEN_PIECES = {
+    'P': WHITE | PAWN, 'N': WHITE | KNIGHT, 'B': WHITE | BISHOP,
+    'R': WHITE | ROOK, 'Q': WHITE | QUEEN, 'K': WHITE | KING,
+    'p': BLACK | PAWN, 'n': BLACK | KNIGHT, 'b': BLACK | BISHOP,
+    'r': BLACK | ROOK, 'q': BLACK | QUEEN, 'k': BLACK | KING,
+}
+
+FEN_CHARS = {code: char for char, code in FEN_PIECES.items()}
+
+# Имена фигур в формате, который использует интерфейс ('white_knight' и т.д.)
+PIECE_NAMES = {code: f'{COLOR_NAMES[code & BLACK]}_{TYPE_NAMES[code & 7]}' for code in FEN_PIECES.values()}
+
+# Смещения на доске 10x12 (строка 0 - восьмая горизонталь, поэтому "вверх" это -10)
+KNIGHT_OFFSETS = (-21, -19, -12, -8, 8, 12, 19, 21)
+KING_OFFSETS = (-11, -10, -9, -1, 1, 9, 10, 11)
+ROOK_DIRECTIONS = (-10, -1, 1, 10)
+BISHOP_DIRECTIONS = (-11, -9, 9, 11)
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+SLIDER_DIRECTIONS = {BISHOP: BISHOP_DIRECTIONS, ROOK: ROOK_DIRECTIONS, QUEEN: QUEEN_DIRECTIONS}
+STEP_OFFSETS = {KNIGHT: KNIGHT_OFFSETS, KING: KING_OFFSETS}
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Права на рокировку (битовая маска)
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+CASTLING_CHARS = (('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE), ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE))
+
+# Фигуры, в которые превращается пешка (ферзь первым - его выбирает интерфейс)
+PROMOTIONS = (QUEEN, ROOK, BISHOP, KNIGHT)
+PROMOTION_CHARS = {QUEEN: 'q', ROOK: 'r', BISHOP: 'b', KNIGHT: 'n'}
+
+
+def square(row, col):
+    """Переводит (строка, столбец) в индекс доски 10x12"""
+    return 21 + row * 10 + col
+
+
+def coords(sq):
+    """Переводит индекс доски 10x12 в (строка, столбец)"""
+    return divmod(sq - 21, 10)
+
+
+def encode_move(frm, to, promotion=0):
+    """Упаковывает ход в одно целое число (promotion - тип фигуры при превращении)"""
+    return frm | (to << 8) | (promotion << 16)
+
+
+def move_from(move):
+    return move & 0xFF
+
+
+def move_to(move):
+    return (move >> 8) & 0xFF
+
+
+def move_promotion(move):
+    return move >> 16
+
+
+def square_name(sq):
+    """Имя клетки в шахматной нотации ('e4')"""
+    row, col = coords(sq)
+    return 'abcdefgh'[col] + str(8 - row)
+
+
+def parse_square(name):
+    """Индекс клетки по имени ('e4')"""
+    return square(8 - int(name[1]), 'abcdefgh'.index(name[0]))
+
+
+def move_to_uci(move):
+    """Ход в координатной нотации ('e2e4', 'e7e8q')"""
+    text = square_name(move & 0xFF) + square_name((move >> 8) & 0xFF)
+    if move >> 16:
+        text += PROMOTION_CHARS[move >> 16]
+    return text
+
+
+# Какие права на рокировку остаются после хода с клетки или на клетку
+CASTLING_MASK = [0xF] * 120
+CASTLING_MASK[square(7, 4)] = 0xF & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[square(7, 7)] = 0xF & ~WHITE_KINGSIDE
+CASTLING_MASK[square(7, 0)] = 0xF & ~WHITE_QUEENSIDE
+CASTLING_MASK[square(0, 4)] = 0xF & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASK[square(0, 7)] = 0xF & ~BLACK_KINGSIDE
+CASTLING_MASK[square(0, 0)] = 0xF & ~BLACK_QUEENSIDE
+
+# Рокировки: (право, клетка короля, куда идет король, клетка ладьи, куда идет ладья, клетки, которые должны быть пусты)
+CASTLES = {
+    WHITE: (
+        (WHITE_KINGSIDE, square(7, 4), square(7, 6), square(7, 7), square(7, 5), (square(7, 5), square(7, 6))),
+        (WHITE_QUEENSIDE, square(7, 4), square(7, 2), square(7, 0), square(7, 3), (square(7, 1), square(7, 2), square(7, 3))),
+    ),
+    BLACK: (
+        (BLACK_KINGSIDE, square(0, 4), square(0, 6), square(0, 7), square(0, 5), (square(0, 5), square(0, 6))),
+        (BLACK_QUEENSIDE, square(0, 4), square(0, 2), square(0, 0), square(0, 3), (square(0, 1), square(0, 2), square(0, 3))),
+    ),
+}
+
+
+BOARD_SQUARES = tuple(square(row, col) for row in range(8) for col in range(8))
+# Бит клетки в битбордах позиции: индекс row * 8 + col (строка 0 - восьмая горизонталь)
+BITS = [0] * 120
+for _i, _sq in enumerate(BOARD_SQUARES):
+    BITS[_sq] = 1 << _i
+
+
+def is_square_attacked(sq, by_color, position):
+    """Проверяет, бьет ли сторона by_color клетку sq (поиск от клетки наружу)"""
+    squares = position.squares
+    # Пешки бьют по диагонали вперед, значит атакующая пешка стоит "позади" клетки
+    pawn = by_color | PAWN
+    if by_color == WHITE:
+        if squares[sq + 9] == pawn or squares[sq + 11] == pawn:
+            return True
+    elif squares[sq - 9] == pawn or squares[sq - 11] == pawn:
+        return True
+    knight = by_color | KNIGHT
+    for offset in KNIGHT_OFFSETS:
+        if squares[sq + offset] == knight:
+            return True
+    king = by_color | KING
+    for offset in KING_OFFSETS:
+        if squares[sq + offset] == king:
+            return True
+    queen = by_color | QUEEN
+    rook = by_color | ROOK
+    for direction in ROOK_DIRECTIONS:
+        to = sq + direction
+        while squares[to] == EMPTY:
+            to += direction
+        if squares[to] == rook or squares[to] == queen:
+            return True
+    bishop = by_color | BISHOP
+    for direction in BISHOP_DIRECTIONS:
+        to = sq + direction
+        while squares[to] == EMPTY:
+            to += direction
+        if squares[to] == bishop or squares[to] == queen:
+            return True
+    return False
+
+
+# Ключи Zobrist: фиксированное зерно, чтобы ключи совпадали во всех процессах и запусках
+_zobrist_random = random.Random(20240601)
+ZOBRIST_PIECES = [[_zobrist_random.getrandbits(64) for _ in range(120)] for _ in range(16)]
+ZOBRIST_SIDE = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EP = [_zobrist_random.getrandbits(64) for _ in range(120)]
+ZOBRIST_EP[0] = 0  # Нет взятия на проходе
+del _zobrist_random
+
+
+class Position:
+    """Позиция на доске 10x12: фигуры, очередь хода, рокировки, взятие на проходе, счетчики ходов"""
+
+    def __init__(self):
+        self.squares = bytearray([OFFBOARD]) * 120
+        for sq in BOARD_SQUARES:
+            self.squares[sq] = EMPTY
+        self.pieces = (set(), set())  # Клетки фигур: [0] - белые, [1] - черные
+        self.kings = [None, None]  # Кэш клеток королей
+        # Битборды, обновляются в make_move: [код фигуры] - клетки таких фигур, [WHITE] и [BLACK] - все фигуры цвета
+        self.boards = [0] * 16
+        self.side = WHITE
+        self.castling = 0
+        self.ep = 0  # Клетка для взятия на проходе (0 - нет)
+        self.halfmove = 0
+        self.fullmove = 1
+        self.key = 0  # Ключ Zobrist, обновляется в make_move
+        self.undo_stack = []
+
+    @classmethod
+    def from_fen(cls, fen):
+        """Создает позицию из FEN"""
+        pos = cls()
+        parts = fen.split()
+        for row_idx, row in enumerate(parts[0].split('/')):
+            col_idx = 0
+            for char in row:
+                if char.isdigit():
+                    col_idx += int(char)
+                else:
+                    pos.put(square(row_idx, col_idx), FEN_PIECES[char])
+                    col_idx += 1
+        if len(parts) > 1 and parts[1] == 'b':
+            pos.side = BLACK
+        if len(parts) > 2:
+            for char, flag in CASTLING_CHARS:
+                if char in parts[2]:
+                    pos.castling |= flag
+        if len(parts) > 3 and parts[3] != '-':
+            ep = parse_square(parts[3])
+            # Как в make_move: поле взятия на проходе запоминаем, только если рядом с
+            # прошедшей пешкой стоит пешка стороны, чей ход, - иначе ключ позиции был бы другим
+            passed = ep - 10 if pos.side == BLACK else ep + 10
+            own_pawn = pos.side | PAWN
+            if pos.squares[passed - 1] == own_pawn or pos.squares[passed + 1] == own_pawn:
+                pos.ep = ep
+        if len(parts) > 5:
+            pos.halfmove = int(parts[4])
+            pos.fullmove = int(parts[5])
+        pos.key = pos.compute_key()
+        return pos
+
+    def compute_key(self):
+        """Считает ключ Zobrist с нуля (make_move обновляет его по ходу)"""
+        key = ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_EP[self.ep]
+        if self.side == BLACK:
+            key ^= ZOBRIST_SIDE
+        for color_idx in (0, 1):
+            for sq in self.pieces[color_idx]:
+                key ^= ZOBRIST_PIECES[self.squares[sq]][sq]
+        return key
+
+    def repetitions(self):
+        """Сколько раз текущая позиция уже встречалась после последнего необратимого хода"""
+        key = self.key
+        stack = self.undo_stack
+        count = 0
+        for i in range(2, min(self.halfmove, len(stack)) + 1, 2):
+            if stack[-i][5] == key:
+                count += 1
+        return count
+
+    def to_fen(self):
+        """Записывает позицию в FEN"""
+        rows = []
+        for row in range(8):
+            text = ''
+            empty = 0
+            for col in range(8):
+                piece = self.squares[square(row, col)]
+                if piece:
+                    if empty:
+                        text += str(empty)
+                        empty = 0
+                    text += FEN_CHARS[piece]
+                else:
+                    empty += 1
+            if empty:
+                text += str(empty)
+            rows.append(text)
+        castling = ''.join(char for char, flag in CASTLING_CHARS if self.castling & flag) or '-'
+        ep = square_name(self.ep) if self.ep else '-'
+        side = 'w' if self.side == WHITE else 'b'
+        return f"{'/'.join(rows)} {side} {castling} {ep} {self.halfmove} {self.fullmove}"
+
+    def copy(self):
+        """Независимая копия позиции"""
+        pos = Position.__new__(Position)
+        pos.squares = self.squares[:]
+        pos.pieces = (set(self.pieces[0]), set(self.pieces[1]))
+        pos.kings = self.kings[:]
+        pos.boards = self.boards[:]
+        pos.side = self.side
+        pos.castling = self.castling
+        pos.ep = self.ep
+        pos.halfmove = self.halfmove
+        pos.fullmove = self.fullmove
+        pos.key = self.key
+        pos.undo_stack = self.undo_stack[:]  # Нужна для поиска повторений
+        return pos
+
+    def put(self, sq, piece):
+        """Ставит фигуру на пустую клетку"""
+        self.squares[sq] = piece
+        self.pieces[piece >> 3].add(sq)
+        bit = BITS[sq]
+        self.boards[piece] |= bit
+        self.boards[piece & BLACK] |= bit
+        if piece & 7 == KING:
+            self.kings[piece >> 3] = sq
+
+    def piece_at(self, row, col):
+        return self.squares[square(row, col)]
+
+    def piece_name(self, row, col):
+        """Имя фигуры на клетке ('white_knight') или None"""
+        piece = self.squares[square(row, col)]
+        return PIECE_NAMES[piece] if piece else None
+
+    def make_move(self, move):
+        """Выполняет ход на месте и запоминает, как его откатить"""
+        frm = move & 0xFF
+        to = (move >> 8) & 0xFF
+        promotion = move >> 16
+        squares = self.squares
+        pieces = self.pieces
+        boards = self.boards
+        piece = squares[frm]
+        captured = squares[to]
+        color = piece & BLACK
+        key = self.key
+        to_bit = BITS[to]
+        self.undo_stack.append((move, captured, self.castling, self.ep, self.halfmove, key))
+        if captured:
+            pieces[captured >> 3].remove(to)
+            boards[captured] ^= to_bit
+            boards[captured & BLACK] ^= to_bit
+            key ^= ZOBRIST_PIECES[captured][to]
+        own = pieces[color >> 3]
+        own.remove(frm)
+        own.add(to)
+        squares[frm] = EMPTY
+        new_piece = color | promotion if promotion else piece
+        squares[to] = new_piece
+        from_bit = BITS[frm]
+        boards[piece] ^= from_bit
+        boards[new_piece] ^= to_bit
+        boards[color] ^= from_bit | to_bit
+        key ^= ZOBRIST_PIECES[piece][frm] ^ ZOBRIST_PIECES[new_piece][to]
+        ep = self.ep
+        if ep:
+            key ^= ZOBRIST_EP[ep]
+            self.ep = 0
+        kind = piece & 7
+        if kind == PAWN:
+            self.halfmove = 0
+            if to == ep:
+                # Взятие на проходе: побитая пешка стоит рядом с исходной клеткой
+                taken = to + 10 if color == WHITE else to - 10
+                squares[taken] = EMPTY
+                pieces[(color ^ BLACK) >> 3].remove(taken)
+                boards[(color ^ BLACK) | PAWN] ^= BITS[taken]
+                boards[color ^ BLACK] ^= BITS[taken]
+                key ^= ZOBRIST_PIECES[(color ^ BLACK) | PAWN][taken]
+            elif to - frm == 20 or frm - to == 20:
+                enemy_pawn = (color ^ BLACK) | PAWN
+                if squares[to - 1] == enemy_pawn or squares[to + 1] == enemy_pawn:
+                    self.ep = (frm + to) >> 1
+                    key ^= ZOBRIST_EP[self.ep]
+        else:
+            self.halfmove = 0 if captured else self.halfmove + 1
+            if kind == KING:
+                self.kings[color >> 3] = to
+                if to - frm == 2:
+                    self._move_rook(frm + 3, frm + 1, own)
+                    key ^= ZOBRIST_PIECES[color | ROOK][frm + 3] ^ ZOBRIST_PIECES[color | ROOK][frm + 1]
+                elif frm - to == 2:
+                    self._move_rook(frm - 4, frm - 1, own)
+                    key ^= ZOBRIST_PIECES[color | ROOK][frm - 4] ^ ZOBRIST_PIECES[color | ROOK][frm - 1]
+        castling = self.castling & CASTLING_MASK[frm] & CASTLING_MASK[to]
+        if castling != self.castling:
+            key ^= ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_CASTLING[castling]
+            self.castling = castling
+        if color == BLACK:
+            self.fullmove += 1
+        self.side = color ^ BLACK
+        self.key = key ^ ZOBRIST_SIDE
+
+    def _move_rook(self, frm, to, own):
+        squares = self.squares
+        rook = squares[to] = squares[frm]
+        squares[frm] = EMPTY
+        own.remove(frm)
+        own.add(to)
+        bits = BITS[frm] | BITS[to]
+        self.boards[rook] ^= bits
+        self.boards[rook & BLACK] ^= bits
+
+    def unmake_move(self):
+        """Откатывает последний ход"""
+        move, captured, self.castling, ep, self.halfmove, self.key = self.undo_stack.pop()
+        self.ep = ep
+        frm = move & 0xFF
+        to = (move >> 8) & 0xFF
+        squares = self.squares
+        pieces = self.pieces
+        boards = self.boards
+        moved = piece = squares[to]
+        color = piece & BLACK
+        if move >> 16:
+            piece = color | PAWN
+        own = pieces[color >> 3]
+        own.remove(to)
+        own.add(frm)
+        squares[frm] = piece
+        squares[to] = captured
+        from_bit = BITS[frm]
+        to_bit = BITS[to]
+        boards[moved] ^= to_bit
+        boards[piece] ^= from_bit
+        boards[color] ^= from_bit | to_bit
+        if captured:
+            pieces[captured >> 3].add(to)
+            boards[captured] ^= to_bit
+            boards[captured & BLACK] ^= to_bit
+        kind = piece & 7
+        if kind == PAWN:
+            if to == ep:
+                taken = to + 10 if color == WHITE else to - 10
+                squares[taken] = (color ^ BLACK) | PAWN
+                pieces[(color ^ BLACK) >> 3].add(taken)
+                boards[(color ^ BLACK) | PAWN] ^= BITS[taken]
+                boards[color ^ BLACK] ^= BITS[taken]
+        elif kind == KING:
+            self.kings[color >> 3] = frm
+            if to - frm == 2:
+                self._move_rook(frm + 1, frm + 3, own)
+            elif frm - to == 2:
+                self._move_rook(frm - 1, frm - 4, own)
+        if color == BLACK:
+            self.fullmove -= 1
+        self.side = color
+
+    def pseudo_moves_from(self, frm):
+        """Ходы фигуры без проверки шаха своему королю"""
+        squares = self.squares
+        piece = squares[frm]
+        color = piece & BLACK
+        kind = piece & 7
+        moves = []
+        if kind == PAWN:
+            step = -10 if color == WHITE else 10
+            last_row = 0 if color == WHITE else 7
+            targets = []
+            to = frm + step
+            if squares[to] == EMPTY:
+                targets.append(to)
+                start_row = 6 if color == WHITE else 1
+                if (frm - 21) // 10 == start_row and squares[to + step] == EMPTY:
+                    targets.append(to + step)
+            for to in (frm + step - 1, frm + step + 1):
+                target = squares[to]
+                if (target and target != OFFBOARD and target & BLACK != color) or (to == self.ep and target == EMPTY):
+                    targets.append(to)
+            for to in targets:
+                if (to - 21) // 10 == last_row:
+                    for promotion in PROMOTIONS:
+                        moves.append(frm | (to << 8) | (promotion << 16))
+                else:
+                    moves.append(frm | (to << 8))
+        elif kind in STEP_OFFSETS:
+            for offset in STEP_OFFSETS[kind]:
+                to = frm + offset
+                target = squares[to]
+                if target == EMPTY or (target != OFFBOARD and target & BLACK != color):
+                    moves.append(frm | (to << 8))
+            if kind == KING and self.castling and color == self.side:
+                self._castling_moves(frm, color, moves)
+        else:
+            for direction in SLIDER_DIRECTIONS[kind]:
+                to = frm + direction
+                target = squares[to]
+                while target == EMPTY:
+                    moves.append(frm | (to << 8))
+                    to += direction
+                    target = squares[to]
+                if target != OFFBOARD and target & BLACK != color:
+                    moves.append(frm | (to << 8))  # Взятие
+        return moves
+
+    def pseudo_captures(self):
+        """Взятия и превращения в ферзя стороны, чей ход, без проверки шаха (для поиска по взятиям)"""
+        squares = self.squares
+        color = self.side
+        enemy = color ^ BLACK
+        moves = []
+        for frm in self.pieces[color >> 3]:
+            kind = squares[frm] & 7
+            if kind == PAWN:
+                step = -10 if color == WHITE else 10
+                promotion = QUEEN << 16 if (frm + step - 21) // 10 == (0 if color == WHITE else 7) else 0
+                for to in (frm + step - 1, frm + step + 1):
+                    target = squares[to]
+                    if (target and target != OFFBOARD and target & BLACK == enemy) or (to == self.ep and target == EMPTY):
+                        moves.append(frm | (to << 8) | promotion)
+                if promotion and squares[frm + step] == EMPTY:
+                    moves.append(frm | ((frm + step) << 8) | promotion)
+            elif kind in STEP_OFFSETS:
+                for offset in STEP_OFFSETS[kind]:
+                    target = squares[frm + offset]
+                    if target and target != OFFBOARD and target & BLACK == enemy:
+                        moves.append(frm | ((frm + offset) << 8))
+            else:
+                for direction in SLIDER_DIRECTIONS[kind]:
+                    to = frm + direction
+                    while squares[to] == EMPTY:
+                        to += direction
+                    target = squares[to]
+                    if target != OFFBOARD and target & BLACK == enemy:
+                        moves.append(frm | (to << 8))
+        return moves
+
+    def _castling_moves(self, frm, color, moves):
+        """Рокировки: путь свободен, король не под шахом и не проходит через битое поле"""
+        squares = self.squares
+        enemy = color ^ BLACK
+        for flag, king_from, king_to, rook_from, rook_to, between in CASTLES[color]:
+            if not self.castling & flag or frm != king_from or squares[rook_from] != color | ROOK:
+                continue
+            if any(squares[sq] for sq in between):
+                continue
+            if is_square_attacked(king_from, enemy, self) or is_square_attacked(rook_to, enemy, self):
+                continue
+            moves.append(king_from | (king_to << 8))  # Клетку назначения проверит фильтр легальности
+
+    def king_square(self, color):
+        return self.kings[color >> 3]
+
+    def in_check(self, color):
+        """Проверяет, атакован ли король указанного цвета"""
+        king_sq = self.kings[color >> 3]
+        if king_sq is None:
+            return False  # Король не найден
+        return is_square_attacked(king_sq, color ^ BLACK, self)
+
+    def legal_moves_from(self, frm):
+        """Допустимые ходы фигуры стороны, чей сейчас ход"""
+        piece = self.squares[frm]
+        color = self.side
+        if not piece or piece == OFFBOARD or piece & BLACK != color:
+            return []
+        moves = []
+        for move in self.pseudo_moves_from(frm):
+            self.make_move(move)
+            if not self.in_check(color):
+                moves.append(move)
+            self.unmake_move()
+        return moves
+
+    def legal_moves(self):
+        """Все допустимые ходы стороны, чей сейчас ход"""
+        moves = []
+        for sq in tuple(self.pieces[self.side >> 3]):
+            moves.extend(self.legal_moves_from(sq))
+        return moves
+
+    def has_legal_move(self):
+        for sq in tuple(self.pieces[self.side >> 3]):
+            if self.legal_moves_from(sq):
+                return True
+        return False
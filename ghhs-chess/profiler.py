@@ -0,0 +1,190 @@
+"""Встроенные замеры: сколько раз и как долго работают генератор ходов, проверка шаха,
+копирование доски, поиск ИИ и отрисовка.
+
+По умолчанию выключено и ничего не стоит: методы оборачиваются счетчиками только после
+enable(). Включить на весь запуск - переменной окружения, замеры запишутся в JSON при выходе:
+
+    GHHS_PROFILE=1 python 1.py                 # в profile.json
+    GHHS_PROFILE=session.json python uci.py
+
+В окне замеры включает и показывает поверх доски клавиша F3.
+
+Замеры ведутся в текущем процессе: процессы параллельного поиска в них не попадают.
+"""
+
+import atexit
+import functools
+import json
+import os
+from collections import Counter, deque
+from time import perf_counter
+
+from position import Position
+from movegen import GENERATORS
+from search import Search
+from parallel import ParallelSearch
+from engine import Game
+
+ПЕРЕМЕННАЯ_ОКРУЖЕНИЯ = 'GHHS_PROFILE'
+ФАЙЛ_ПРОФИЛЯ = 'profile.json'
+КАДРОВ_ДЛЯ_ПЕРЦЕНТИЛЕЙ = 1000  # Перцентили времени кадра - по последним кадрам
+
+ENABLED = False
+timers = {}  # Имя -> [вызовы, секунды]
+counters = Counter()  # Узлы поиска, попадания в кеши
+frames = deque(maxlen=КАДРОВ_ДЛЯ_ПЕРЦЕНТИЛЕЙ)  # Время кадров, мс
+
+
+def record(name, seconds):
+    entry = timers.get(name)
+    if entry is None:
+        entry = timers[name] = [0, 0.0]
+    entry[0] += 1
+    entry[1] += seconds
+
+
+def frame(seconds):
+    """Время одного кадра главного цикла"""
+    frames.append(seconds * 1000)
+
+
+def timed(name, function):
+    """Обертка, которая считает вызовы и время функции под именем name"""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(name, perf_counter() - started)
+    return wrapper
+
+
+def instrument(cls, method, name):
+    """Заменяет метод класса на обертку со счетчиком"""
+    setattr(cls, method, timed(name, getattr(cls, method)))
+
+
+def _instrument_search(cls):
+    original = cls.search
+
+    @functools.wraps(original)
+    def search(self, *args, **kwargs):
+        tt = getattr(self, 'tt', None)  # У параллельного поиска таблицы в процессах пула
+        probes, hits = (tt.probes, tt.hits) if tt is not None else (0, 0)
+        started = perf_counter()
+        try:
+            result = original(self, *args, **kwargs)
+        finally:
+            record('search', perf_counter() - started)
+        counters['nodes'] += result.nodes
+        if tt is not None:
+            counters['tt_probes'] += tt.probes - probes
+            counters['tt_hits'] += tt.hits - hits
+        return result
+    cls.search = search
+
+
+def _instrument_move_cache():
+    original = Game.refresh_moves
+
+    @functools.wraps(original)
+    def refresh_moves(self):
+        counters['moves_cache_hits' if self.moves_key == self.board.key else 'moves_cache_misses'] += 1
+        return original(self)
+    Game.refresh_moves = refresh_moves
+
+
+def enable(path=None):
+    """Включает замеры; path - куда записать JSON при выходе (None - не записывать)"""
+    global ENABLED
+    if ENABLED:
+        return
+    ENABLED = True
+    for generator in GENERATORS.values():
+        instrument(generator, 'legal_moves', 'movegen')
+        instrument(generator, 'legal_moves_from', 'movegen')
+        instrument(generator, 'has_legal_move', 'movegen')
+        instrument(generator, 'in_check', 'check')
+    instrument(Position, 'copy', 'board_copy')
+    instrument(Game, 'get_valid_moves', 'get_valid_moves')
+    instrument(Game, 'is_checkmate', 'is_checkmate')
+    instrument(Game, 'is_stalemate', 'is_stalemate')
+    _instrument_move_cache()
+    _instrument_search(Search)
+    _instrument_search(ParallelSearch)
+    if path:
+        atexit.register(dump, path)
+
+
+def path_from_env():
+    """Файл для замеров из переменной GHHS_PROFILE (1 - profile.json) или None, если замеры не нужны"""
+    value = os.environ.get(ПЕРЕМЕННАЯ_ОКРУЖЕНИЯ)
+    if not value or value == '0':
+        return None
+    return ФАЙЛ_ПРОФИЛЯ if value == '1' else value
+
+
+def enable_from_env():
+    """Включает замеры, если задана переменная GHHS_PROFILE; возвращает ENABLED"""
+    path = path_from_env()
+    if path:
+        enable(path)
+    return ENABLED
+
+
+def _rate(hits, total):
+    return round(hits / total, 4) if total else None
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else None
+
+
+def snapshot():
+    """Все замеры словарем (для JSON)"""
+    search_seconds = timers.get('search', (0, 0.0))[1]
+    cache_total = counters['moves_cache_hits'] + counters['moves_cache_misses']
+    return {
+        'timers': {name: {'calls': calls, 'seconds': round(seconds, 6),
+                          'avg_us': round(seconds / calls * 1e6, 2) if calls else 0}
+                   for name, (calls, seconds) in sorted(timers.items())},
+        'counters': dict(counters),
+        'nodes': counters['nodes'],
+        'nps': int(counters['nodes'] / search_seconds) if search_seconds else 0,
+        'moves_cache_hit_rate': _rate(counters['moves_cache_hits'], cache_total),
+        'tt_hit_rate': _rate(counters['tt_hits'], counters['tt_probes']),
+        'frame_ms': {
+            'count': len(frames),
+            'p50': percentile(frames, 0.5),
+            'p95': percentile(frames, 0.95),
+            'p99': percentile(frames, 0.99),
+            'max': max(frames, default=None),
+        },
+    }
+
+
+def summary_lines():
+    """Короткая сводка для показа поверх доски"""
+    data = snapshot()
+    lines = []
+    for name, entry in data['timers'].items():
+        lines.append(f"{name}: {entry['calls']} x {entry['avg_us']:.0f} мкс = {entry['seconds'] * 1000:.0f} мс")
+    lines.append(f"узлы: {data['nodes']}, nps: {data['nps']}")
+    for name, key in (('кеш ходов', 'moves_cache_hit_rate'), ('TT', 'tt_hit_rate')):
+        if data[key] is not None:
+            lines.append(f"{name}: {data[key]:.0%} попаданий")
+    frame_ms = data['frame_ms']
+    if frame_ms['count']:
+        lines.append(f"кадр, мс: p50 {frame_ms['p50']:.1f}  p95 {frame_ms['p95']:.1f}  p99 {frame_ms['p99']:.1f}")
+    return lines
+
+
+def dump(path=ФАЙЛ_ПРОФИЛЯ):
+    """Записывает замеры в JSON"""
+    try:
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump(snapshot(), output, ensure_ascii=False, indent=2)
+    except OSError as error:
+        print(f"Не удалось записать замеры: {error}")
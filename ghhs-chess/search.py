@@ -0,0 +1,471 @@
+"""Поиск хода: negamax с альфа-бета отсечением, итеративным углублением и поиском по взятиям за горизонтом."""
+
+import heapq
+import time
+from collections import namedtuple
+
+from position import (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, EMPTY, WHITE, BLACK,
+                      KNIGHT_OFFSETS, KING_OFFSETS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, QUEEN_DIRECTIONS)
+from evaluation import evaluate, PIECE_VALUES, SQUARE_VALUES
+from movegen import get_generator
+from tt import TranspositionTable, EXACT, LOWER, UPPER, TERMINAL_DEPTH
+from tablebase import WIN, LOSS
+
+MATE = 100000
+INFINITY = 1000000
+MAX_DEPTH = 64
+MATE_BOUND = MATE - 1000  # Оценки выше - это мат через сколько-то ходов
+CHECK_EVERY = 1024  # Как часто (в узлах) проверять время
+TB_WIN = 50000  # Выигрыш по эндшпильным таблицам: выше любой оценки, но ниже мата
+DELTA_MARGIN = 200  # Запас дельта-отсечения: взятие, которое даже с ним не поднимает alpha, не смотрим
+MAX_PLY = 2 * MAX_DEPTH  # Предел длины варианта вместе с поиском по взятиям
+
+SearchResult = namedtuple('SearchResult', 'move score depth nodes')
+
+
+class SearchTimeout(Exception):
+    """Время на ход истекло или поиск остановлен"""
+
+
+# Значения для MVV-LVA: ценнее жертва - раньше, дешевле нападающий - раньше
+ORDER_VALUES = dict(PIECE_VALUES)
+ORDER_VALUES[KING] = 1000
+
+# Значения для размена на клетке (SEE): короля отдать нельзя, взятие им под боем проигрывает все
+SEE_VALUES = dict(PIECE_VALUES)
+SEE_VALUES[KING] = MATE
+
+
+def score_to_tt(score, ply):
+    """Оценка мата в таблице хранится от текущего узла, а не от корня"""
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def least_attacker(squares, sq, color):
+    """Клетка самой дешевой фигуры цвета color, бьющей sq, или 0"""
+    pawn = color | PAWN
+    for offset in ((9, 11) if color == WHITE else (-9, -11)):
+        if squares[sq + offset] == pawn:
+            return sq + offset
+    knight = color | KNIGHT
+    for offset in KNIGHT_OFFSETS:
+        if squares[sq + offset] == knight:
+            return sq + offset
+    for piece, directions in ((color | BISHOP, BISHOP_DIRECTIONS), (color | ROOK, ROOK_DIRECTIONS),
+                              (color | QUEEN, QUEEN_DIRECTIONS)):
+        for direction in directions:
+            to = sq + direction
+            while squares[to] == EMPTY:
+                to += direction
+            if squares[to] == piece:
+                return to
+    king = color | KING
+    for offset in KING_OFFSETS:
+        if squares[sq + offset] == king:
+            return sq + offset
+    return 0
+
+
+def move_gain(position, move):
+    """Насколько ход меняет материал и положение фигур (SQUARE_VALUES) для того, кто ходит.
+
+    Оценка после хода - это -(оценка до хода + move_gain): так поиск по взятиям считает
+    оценки без обхода всей доски. Рокировки не учитываются - в поиске по взятиям их нет.
+    """
+    squares = position.squares
+    frm = move & 0xFF
+    to = (move >> 8) & 0xFF
+    piece = squares[frm]
+    new_piece = (piece & BLACK) | (move >> 16) if move >> 16 else piece
+    gain = SQUARE_VALUES[new_piece][to] - SQUARE_VALUES[piece][frm]
+    victim = squares[to]
+    if victim:
+        gain += SQUARE_VALUES[victim][to]
+    elif piece & 7 == PAWN and to == position.ep:
+        taken = to + 10 if piece & BLACK == WHITE else to - 10
+        gain += SQUARE_VALUES[squares[taken]][taken]
+    return gain
+
+
+def see(position, move):
+    """Статическая оценка размена (SEE): итог серии взятий на клетке хода, в сантипешках.
+
+    Каждая сторона бьет самой дешевой фигурой и может остановиться, когда продолжать
+    невыгодно. Фигуры убираются с копии доски, поэтому дальнобойные фигуры за ними
+    (рентген) вступают в размен сами. Связки не учитываются.
+    """
+    squares = bytearray(position.squares)
+    frm = move & 0xFF
+    to = (move >> 8) & 0xFF
+    piece = squares[frm]
+    victim = squares[to]
+    if victim:
+        gains = [SEE_VALUES[victim & 7]]
+    elif piece & 7 == PAWN and to == position.ep:
+        gains = [SEE_VALUES[PAWN]]
+        squares[to + 10 if piece & BLACK == WHITE else to - 10] = EMPTY
+    else:
+        gains = [0]
+    on_square = SEE_VALUES[piece & 7]
+    if move >> 16:
+        gains[0] += SEE_VALUES[move >> 16] - SEE_VALUES[PAWN]
+        on_square = SEE_VALUES[move >> 16]
+    squares[frm] = EMPTY
+    color = (piece & BLACK) ^ BLACK
+    while True:
+        attacker = least_attacker(squares, to, color)
+        if not attacker:
+            break
+        # Выигрыш стороны, если она возьмет и останется на клетке
+        gains.append(on_square - gains[-1])
+        if max(-gains[-2], gains[-1]) < 0:
+            break  # Размен уже решен, кто бы ни продолжал
+        on_square = SEE_VALUES[squares[attacker] & 7]
+        squares[attacker] = EMPTY
+        color ^= BLACK
+    # С конца серии: каждая сторона выбирает лучшее из "взять" и "не брать"
+    for index in range(len(gains) - 1, 0, -1):
+        gains[index - 1] = -max(-gains[index - 1], gains[index])
+    return gains[0]
+
+
+class Search:
+    """Поиск лучшего хода в пределах времени"""
+
+    def __init__(self, movegen=None, tt=None, tablebase=None, batch_eval=None):
+        self.movegen = movegen or get_generator()
+        self.tt = tt if tt is not None else TranspositionTable()
+        self.tablebase = tablebase  # Эндшпильные таблицы (tablebase.Tablebase) или None
+        # Пакетная оценка листьев: batch_eval(доски, очередь хода) -> оценки, например batcheval.evaluate_boards
+        self.batch_eval = batch_eval
+        self.nodes = 0
+        self.next_check = CHECK_EVERY
+        self.deadline = None
+        self.stop_event = None
+        self.partial_root = False
+        self.killers = [[0, 0] for _ in range(MAX_DEPTH + 1)]
+        self.history = {}
+        self.root_scores = []  # (оценка, ход) корня последней завершенной глубины, лучшие первыми
+
+    def search(self, position, time_limit, max_depth=MAX_DEPTH, stop_event=None, root_moves=None, on_iteration=None,
+               multi_pv=1):
+        """Итеративное углубление до max_depth, до конца времени или до stop_event.set().
+
+        root_moves ограничивает перебор в корне, on_iteration(SearchResult) вызывается
+        после каждой завершенной глубины. При multi_pv > 1 точные оценки получают
+        multi_pv лучших ходов корня, а не только лучший (варианты - lines()).
+        """
+        self.nodes = 0
+        self.next_check = CHECK_EVERY
+        self.deadline = time.perf_counter() + time_limit
+        self.stop_event = stop_event
+        self.killers = [[0, 0] for _ in range(MAX_DEPTH + 1)]
+        self.history.clear()
+        self.root_scores = []
+        self.tt.new_search()
+
+        # Оценка корня по части ходов неполная - такую в таблицу не пишем
+        self.partial_root = root_moves is not None
+        if root_moves is None:
+            root_moves = self.movegen.legal_moves(position)
+        else:
+            root_moves = list(root_moves)
+        if not root_moves:
+            return SearchResult(None, 0, 0, 0)
+        tt_move = self.tt.best_move(position.key)
+        if tt_move in root_moves:
+            root_moves.remove(tt_move)
+            root_moves.insert(0, tt_move)
+        best = SearchResult(root_moves[0], 0, 0, 0)
+        base = len(position.undo_stack)
+
+        for depth in range(1, max_depth + 1):
+            try:
+                move, score = self._root(position, root_moves, depth, multi_pv)
+            except SearchTimeout:
+                while len(position.undo_stack) > base:
+                    position.unmake_move()
+                break
+            best = SearchResult(move, score, depth, self.nodes)
+            if on_iteration:
+                on_iteration(best)
+            # Лучший ход прошлой итерации смотрим первым
+            root_moves.remove(move)
+            root_moves.insert(0, move)
+            if abs(score) >= MATE_BOUND:
+                break  # Мат найден, глубже искать незачем
+        return best._replace(nodes=self.nodes)
+
+    def _root(self, position, moves, depth, multi_pv=1):
+        alpha = -INFINITY
+        best = -INFINITY
+        best_move = moves[0]
+        scores = []
+        top = []  # multi_pv лучших оценок: ход должен обойти худшую из них, чтобы попасть в варианты
+        for move in moves:
+            position.make_move(move)
+            score = -self._negamax(position, depth - 1, -INFINITY, -alpha, 1)
+            position.unmake_move()
+            scores.append((score, move))
+            if score > best:
+                best = score
+                best_move = move
+            if len(top) < multi_pv:
+                heapq.heappush(top, score)
+            else:
+                heapq.heappushpop(top, score)
+            if len(top) == multi_pv:
+                alpha = top[0]
+        self.root_scores = sorted(scores, key=lambda item: -item[0])
+        if not self.partial_root:
+            self.tt.store(position.key, best_move, depth, EXACT, best)
+        return best_move, best
+
+    def _count_node(self):
+        """Считает узел; раз в CHECK_EVERY узлов проверяет время и остановку"""
+        self.nodes += 1
+        if self.nodes >= self.next_check:
+            self.next_check = self.nodes + CHECK_EVERY
+            if time.perf_counter() > self.deadline or (self.stop_event and self.stop_event.is_set()):
+                raise SearchTimeout()
+
+    def _negamax(self, position, depth, alpha, beta, ply):
+        self._count_node()
+        if position.halfmove >= 100 or position.repetitions():
+            return 0  # Повторение позиции или правило 50 ходов - ничья
+        tablebase = self.tablebase
+        if tablebase is not None and len(position.pieces[0]) + len(position.pieces[1]) <= tablebase.max_pieces:
+            result = tablebase.probe_wdl(position)
+            if result is not None:
+                # Исход известен точно - дальше не ищем; ближе к корню выигрыш лучше
+                return TB_WIN - ply if result == WIN else -TB_WIN + ply if result == LOSS else 0
+
+        key = position.key
+        entry = self.tt.probe(key)
+        tt_move = 0
+        if entry:
+            tt_move, tt_depth, bound, tt_score = entry
+            if tt_depth >= depth:
+                tt_score = score_from_tt(tt_score, ply)
+                if (bound == EXACT or (bound == LOWER and tt_score >= beta)
+                        or (bound == UPPER and tt_score <= alpha)):
+                    return tt_score
+        if depth <= 0:
+            return self._quiesce(position, alpha, beta, ply)
+
+        moves = self.movegen.legal_moves(position)
+        if not moves:
+            if self.movegen.in_check(position, position.side):
+                score = -MATE + ply  # Мат: чем ближе, тем хуже для проигравшего
+            else:
+                score = 0  # Пат
+            self.tt.store(key, 0, TERMINAL_DEPTH, EXACT, score_to_tt(score, ply))
+            return score
+
+        if depth == 1 and self.batch_eval is not None and (
+                tablebase is None or len(position.pieces[0]) + len(position.pieces[1]) > tablebase.max_pieces + 1):
+            return self._frontier(position, moves, alpha, beta, ply, tt_move)
+
+        alpha_start = alpha
+        best = -INFINITY
+        best_move = 0
+        for move in self.order_moves(position, moves, ply, tt_move):
+            position.make_move(move)
+            score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score > best:
+                best = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if position.squares[(move >> 8) & 0xFF] == EMPTY and not move >> 16:
+                            self._remember_quiet(position, move, depth, ply)
+                        break
+        if best <= alpha_start:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.store(key, best_move, depth, bound, score_to_tt(best, ply))
+        return best
+
+    def _frontier(self, position, moves, alpha, beta, ply, tt_move):
+        """Узел на глубине 1: оценки всех листьев считаются одним вызовом batch_eval, а не по одному.
+
+        Оценки листьев идут в поиск по взятиям как оценка "без хода" (stand pat).
+        """
+        boards = []
+        for move in moves:
+            position.make_move(move)
+            boards.append(bytes(position.squares))
+            position.unmake_move()
+        values = dict(zip(moves, self.batch_eval(boards, position.side ^ BLACK)))
+        alpha_start = alpha
+        best = -INFINITY
+        best_move = 0
+        for move in self.order_moves(position, moves, ply, tt_move):
+            position.make_move(move)
+            if position.halfmove >= 100 or position.repetitions():
+                self.nodes += 1
+                score = 0
+            else:
+                score = -self._quiesce(position, -beta, -alpha, ply + 1, values[move])
+            position.unmake_move()
+            if score > best:
+                best = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        if best <= alpha_start:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.store(position.key, best_move, 1, bound, score_to_tt(best, ply))
+        return best
+
+    def _quiesce(self, position, alpha, beta, ply, stand_pat=None):
+        """Поиск за горизонтом только по взятиям и превращениям, чтобы не оценивать позицию посреди размена.
+
+        Взятия, проигрывающие материал по SEE, и взятия, которые даже с запасом DELTA_MARGIN
+        не поднимут alpha (дельта-отсечение), не перебираются. Под шахом перебираются все ходы.
+        stand_pat - уже посчитанная оценка позиции (например, пакетом в _frontier). Полная
+        оценка считается только в первом узле, дальше она меняется на move_gain ходов: с
+        batch_eval поправки NumPy (подвижность, пешки) берутся с листа, а материал и таблицы
+        положения - те же, что в NumPy.
+        """
+        self._count_node()
+        color = position.side
+        movegen = self.movegen
+        if stand_pat is None:
+            stand_pat = self.evaluate(position)
+        if ply < MAX_PLY and movegen.in_check(position, color):
+            # Под шахом "не ходить" нельзя: перебираем все ответы
+            moves = movegen.legal_moves(position)
+            if not moves:
+                return -MATE + ply
+            best = -INFINITY
+            for move in self.order_moves(position, moves, ply):
+                child = -(stand_pat + move_gain(position, move))
+                position.make_move(move)
+                score = -self._quiesce(position, -beta, -alpha, ply + 1, child)
+                position.unmake_move()
+                if score > best:
+                    best = score
+                    if score > alpha:
+                        alpha = score
+                        if alpha >= beta:
+                            break
+            return best
+
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        best = stand_pat
+        squares = position.squares
+        for move in self.order_moves(position, position.pseudo_captures(), ply):
+            to = (move >> 8) & 0xFF
+            if not move >> 16:
+                victim = squares[to] & 7 or PAWN  # Пустая клетка - взятие на проходе
+                if stand_pat + PIECE_VALUES[victim] + DELTA_MARGIN <= alpha:
+                    continue
+                # Бьем не дороже жертвы - в минусе не останемся, считать размен незачем
+                if SEE_VALUES[squares[move & 0xFF] & 7] > SEE_VALUES[victim] and see(position, move) < 0:
+                    continue
+            child = -(stand_pat + move_gain(position, move))
+            position.make_move(move)
+            if movegen.in_check(position, color):
+                position.unmake_move()  # Ход оставляет короля под боем
+                continue
+            score = -self._quiesce(position, -beta, -alpha, ply + 1, child)
+            position.unmake_move()
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+    def evaluate(self, position):
+        """Оценка позиции для стороны, чей ход: тем же batch_eval, что и на глубине 1, если он задан
+        (пачка из одной доски - только там, где _frontier оценку не передал)"""
+        if self.batch_eval is not None:
+            return self.batch_eval([bytes(position.squares)], position.side)[0]
+        return evaluate(position)
+
+    def _remember_quiet(self, position, move, depth, ply):
+        """Тихий ход, давший отсечение: в killer-ходы и историю"""
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        key = (position.squares[move & 0xFF], (move >> 8) & 0xFF)
+        self.history[key] = self.history.get(key, 0) + depth * depth
+
+    def order_moves(self, position, moves, ply, tt_move=0):
+        """Ход из таблицы транспозиций, взятия по MVV-LVA, killer-ходы, затем по истории"""
+        squares = position.squares
+        killers = self.killers[ply] if ply <= MAX_DEPTH else (0, 0)
+        history = self.history
+        scored = []
+        for move in moves:
+            piece = squares[move & 0xFF]
+            victim = squares[(move >> 8) & 0xFF]
+            if move == tt_move:
+                score = 2000000
+            elif victim:
+                score = 1000000 + ORDER_VALUES[victim & 7] * 10 - ORDER_VALUES[piece & 7] // 10
+            elif move >> 16:
+                score = 900000 + ORDER_VALUES[move >> 16]
+            elif move == killers[0]:
+                score = 800000
+            elif move == killers[1]:
+                score = 700000
+            else:
+                score = history.get((piece, (move >> 8) & 0xFF), 0)
+            scored.append((score, move))
+        scored.sort(reverse=True)
+        return [move for _, move in scored]
+
+    def lines(self, position, count=1):
+        """Лучшие варианты последней завершенной глубины: [(оценка, [ход, ответ, ...])]"""
+        lines = []
+        for score, move in self.root_scores[:count]:
+            position.make_move(move)
+            lines.append((score, [move] + self.principal_variation(position)))
+            position.unmake_move()
+        return lines
+
+    def principal_variation(self, position, max_length=MAX_DEPTH):
+        """Главный вариант по лучшим ходам из таблицы транспозиций"""
+        line = []
+        seen = set()
+        while len(line) < max_length and position.key not in seen:
+            seen.add(position.key)
+            move = self.tt.best_move(position.key)
+            if not move or move not in self.movegen.legal_moves_from(position, move & 0xFF):
+                break
+            position.make_move(move)
+            line.append(move)
+        for _ in line:
+            position.unmake_move()
+        return line
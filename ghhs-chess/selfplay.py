@@ -0,0 +1,178 @@
+"""Пакетная игра без окна: N партий между выбранными игроками на пуле процессов.
+
+Игроки:
+    random   - случайный допустимый ход
+    computer - ход ИИ, как в окне (время - доля оставшегося на часах)
+    search   - поиск на фиксированную глубину (--depth) с ограничением --movetime
+
+Примеры:
+    python selfplay.py --games 200 --white random --black random
+    python selfplay.py --games 20 --white search --black computer --depth 3 --output games.pgn
+    python selfplay.py --games 100 --output games.jsonl --workers 4
+
+Результаты пишутся по мере готовности (JSONL - строка на партию, или PGN), в конце -
+партий/с, полуходов/с и разбивка по итогам.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import time
+from collections import Counter
+
+from position import move_to_uci
+from movegen import GENERATORS
+from engine import Game
+from pgn import format_pgn
+from book import ФАЙЛ_КНИГИ
+from tablebase import ПАПКА_ТАБЛИЦ
+
+ИГРОКИ = ('random', 'computer', 'search')
+
+
+def choose_move(game, player, rng, options):
+    """Ход игрока player в текущей позиции партии"""
+    if player == 'random':
+        return rng.choice(game.legal_moves())
+    if player == 'computer':
+        return game.find_move().move
+    return game.search.search(game.board, options['movetime'], options['depth']).move
+
+
+def play_game(task):
+    """Играет одну партию; возвращает словарь с итогом и ходами"""
+    index, white, black, options = task
+    rng = random.Random(options['seed'] + index)  # Партия воспроизводится по номеру
+    game = Game(options['movegen'], workers=1, clock=options['clock'], hash_mb=options['hash'],
+                book=options['book'], tablebase=options['tablebase'])
+    if options['eval'] == 'numpy':
+        from batcheval import evaluate_boards, require_numpy
+        require_numpy()
+        game.search.batch_eval = evaluate_boards  # Листья поиска оцениваются пачками
+    players = {'white': white, 'black': black}
+    started = time.perf_counter()
+    game.start_time = time.time()
+    while not game.game_over and len(game.history) < options['max_plies']:
+        game.play(choose_move(game, players[game.current_player], rng, options))
+    return {
+        'game': index,
+        'white': white,
+        'black': black,
+        'result': game.result(),
+        'reason': game.reason or 'max_plies',
+        'plies': len(game.history),
+        'seconds': round(time.perf_counter() - started, 4),
+        'fen': game.board.to_fen(),
+        'moves': game.history,
+    }
+
+
+def write_game(output, record, fmt):
+    """Пишет партию в файл сразу после окончания"""
+    moves = record.pop('moves')
+    if fmt == 'pgn':
+        headers = {
+            'Event': 'Ghhs-chess selfplay',
+            'Round': record['game'] + 1,
+            'White': record['white'],
+            'Black': record['black'],
+            'Termination': record['reason'],
+        }
+        output.write(format_pgn(moves, headers, record['result']))
+    else:
+        record['moves'] = ' '.join(move_to_uci(move) for move in moves)
+        output.write(json.dumps(record, ensure_ascii=False) + '\n')
+    output.flush()
+
+
+def _init_worker():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C обрабатывает главный процесс
+
+
+def run(games, white, black, options, workers=1, output=None, fmt='jsonl'):
+    """Играет партии и пишет их в output; возвращает (итоги, полуходы, секунды)"""
+    tasks = [(index, white, black, options) for index in range(games)]
+    outcomes = Counter()
+    plies = 0
+    started = time.perf_counter()
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker)
+        records = pool.imap_unordered(play_game, tasks)
+    else:
+        pool = None
+        records = map(play_game, tasks)
+    try:
+        for record in records:
+            outcomes[(record['result'], record['reason'])] += 1
+            plies += record['plies']
+            if output is not None:
+                write_game(output, record, fmt)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return outcomes, plies, time.perf_counter() - started
+
+
+def print_report(outcomes, plies, seconds):
+    games = sum(outcomes.values())
+    print(f"Партий: {games} за {seconds:.2f} с")
+    if seconds > 0:
+        print(f"Партий/с: {games / seconds:.2f}, полуходов/с: {plies / seconds:.1f}")
+    if games:
+        print(f"Средняя длина: {plies / games:.1f} полуходов")
+    for (result, reason), count in sorted(outcomes.items(), key=lambda item: -item[1]):
+        print(f"  {result:8} {reason:12} {count:6}  {100 * count / games:5.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная игра партий без окна")
+    parser.add_argument('--games', type=int, default=100, help="число партий")
+    parser.add_argument('--white', choices=ИГРОКИ, default='random', help="игрок за белых")
+    parser.add_argument('--black', choices=ИГРОКИ, default='random', help="игрок за черных")
+    parser.add_argument('--depth', type=int, default=2, help="глубина для игрока search")
+    parser.add_argument('--movetime', type=float, default=1.0, help="предел времени на ход для search, с")
+    parser.add_argument('--clock', type=float, default=180, help="время на партию каждой стороне, с")
+    parser.add_argument('--max-plies', type=int, default=400, help="предел длины партии в полуходах")
+    parser.add_argument('--hash', type=int, default=4, help="таблица транспозиций на партию, МБ")
+    parser.add_argument('--movegen', choices=sorted(GENERATORS), default='mailbox', help="генератор ходов")
+    parser.add_argument('--book', default=ФАЙЛ_КНИГИ, help="дебютная книга для игрока computer ('' - без книги)")
+    parser.add_argument('--eval', choices=('pst', 'numpy'), default='pst',
+                        help="оценка листьев: по одному (pst) или пачками на NumPy с подвижностью и пешками")
+    parser.add_argument('--tablebase', default=ПАПКА_ТАБЛИЦ, help="папка эндшпильных таблиц ('' - без таблиц)")
+    parser.add_argument('--seed', type=int, default=0, help="начальное значение для случайных ходов")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="число процессов")
+    parser.add_argument('--output', help="файл для партий (.pgn или .jsonl)")
+    parser.add_argument('--format', choices=('jsonl', 'pgn'), help="формат файла (по умолчанию - по расширению)")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('pgn' if args.output and args.output.endswith('.pgn') else 'jsonl')
+    options = {
+        'depth': args.depth,
+        'movetime': args.movetime,
+        'clock': args.clock,
+        'max_plies': args.max_plies,
+        'hash': args.hash,
+        'movegen': args.movegen,
+        'seed': args.seed,
+        'book': args.book,
+        'tablebase': args.tablebase,
+        'eval': args.eval,
+    }
+    output = open(args.output, 'w', encoding='utf-8') if args.output else None
+    try:
+        outcomes, plies, seconds = run(args.games, args.white, args.black, options,
+                                       max(1, args.workers), output, fmt)
+    finally:
+        if output is not None:
+            output.close()
+    print_report(outcomes, plies, seconds)
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
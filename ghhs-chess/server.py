@@ -0,0 +1,409 @@
+"""Сервер партий на asyncio: много одновременных партий без окна в одном процессе.
+
+Протокол строчный (UTF-8, строка - команда) поверх TCP. Сессия - это партия engine.Game
+со своими часами; ходы ИИ считает ограниченный пул процессов, сессии только хранят
+позицию, поэтому на одну партию уходят килобайты памяти.
+
+Команды клиента (ответ - строка 'ok ...' или 'error <текст>'):
+    new <white|black> [ai|human] [секунды]   новая партия за указанный цвет; соперник -
+                                              ИИ или человек, который подключится через join
+    join <id>                                 занять свободный цвет в партии с человеком
+    move <id> <ход>                           ход в записи UCI (e2e4, e7e8q)
+    fen <id> / clock <id>                     позиция и часы партии
+    resign <id>                               сдаться
+    quit                                      закрыть соединение
+
+Сервер рассылает участникам партии:
+    move <id> <ход> <часы белых> <часы черных>
+    end <id> <итог> <причина>                 итог в записи PGN: 1-0, 0-1, 1/2-1/2
+
+    python server.py serve --port 7070 --workers 4
+    python server.py client --games 200 --port 7070   # тестовый клиент: случайные ходы против ИИ
+"""
+
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from position import Position, START_FEN, move_to_uci
+from movegen import GENERATORS, get_generator
+from engine import Game, ВРЕМЯ_НА_ПАРТИЮ
+from book import ФАЙЛ_КНИГИ
+from tablebase import ПАПКА_ТАБЛИЦ
+
+ХОСТ = '127.0.0.1'
+ПОРТ = 7070
+МАКС_СЕССИЙ = 10000
+МАКС_ВРЕМЯ_НА_ХОД = 1.0  # ИИ думает не дольше, даже при большом запасе на часах
+ХЕШ_ВОРКЕРА_МБ = 16  # Таблица транспозиций процесса пула (у сессий своей нет)
+ИИ = 'ai'  # Место за доской, которое занимает ИИ
+COLORS = ('white', 'black')
+
+# Партия процесса пула: переиспользуется для всех ходов, которые ему достаются
+_worker_game = None
+
+
+def _init_worker(movegen, hash_mb, book, tablebase):
+    global _worker_game
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C обрабатывает главный процесс
+    _worker_game = Game(movegen, workers=1, hash_mb=hash_mb, book=book, tablebase=tablebase)
+
+
+def _think(fen, moves, time_limit):
+    """Ход ИИ в позиции после moves от fen (история нужна поиску для повторений)"""
+    game = _worker_game
+    game.board = game.fen_to_board(fen)
+    for move in moves:
+        game.board.make_move(move)
+    return game.find_move(time_limit).move
+
+
+class Session:
+    """Одна партия на сервере: позиция и часы, игроки и таймер флажка"""
+
+    __slots__ = ('id', 'game', 'players', 'timer')
+
+    def __init__(self, session_id, game, players):
+        self.id = session_id
+        self.game = game
+        self.players = players  # {'white': соединение, ИИ или None (ждем join), 'black': ...}
+        self.timer = None  # asyncio.TimerHandle: проверка флажка стороны, чей ход
+
+    def started(self):
+        return all(player is not None for player in self.players.values())
+
+    def clocks(self):
+        return f"{self.game.white_time:.1f} {self.game.black_time:.1f}"
+
+
+class Connection:
+    """Клиент сервера и партии, в которых он играет"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.sessions = set()
+
+    def send(self, line):
+        if not self.writer.is_closing():
+            self.writer.write((line + '\n').encode())
+
+
+class GameServer:
+    """Сессии, соединения и пул процессов для ходов ИИ"""
+
+    def __init__(self, workers=1, movegen='mailbox', clock=ВРЕМЯ_НА_ПАРТИЮ, movetime=МАКС_ВРЕМЯ_НА_ХОД,
+                 hash_mb=ХЕШ_ВОРКЕРА_МБ, book=ФАЙЛ_КНИГИ, tablebase=ПАПКА_ТАБЛИЦ, max_sessions=МАКС_СЕССИЙ):
+        self.movegen = movegen
+        self.clock = clock
+        self.movetime = movetime
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.ids = itertools.count(1)
+        # Процессов не больше workers: ходы остальных партий ждут в очереди пула
+        self.pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                        initargs=(movegen, hash_mb, book, tablebase))
+
+    async def handle_client(self, reader, writer):
+        connection = Connection(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = self.handle(connection, line.decode(errors='replace').split())
+                except ValueError as error:
+                    reply = f"error {error}"
+                if reply is False:
+                    break
+                if reply:
+                    connection.send(reply)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for session_id in list(connection.sessions):
+                session = self.sessions.get(session_id)
+                if session is not None:
+                    color = next(color for color, player in session.players.items() if player is connection)
+                    self.finish(session, 'black' if color == 'white' else 'white', 'abandoned')
+            writer.close()
+
+    def handle(self, connection, parts):
+        """Выполняет команду; возвращает ответ, None (ответ уже разослан) или False на quit"""
+        if not parts:
+            return None
+        command, args = parts[0], parts[1:]
+        if command == 'quit':
+            return False
+        if command == 'new':
+            return self.new_session(connection, args)
+        if command not in ('join', 'move', 'fen', 'clock', 'resign'):
+            raise ValueError(f"неизвестная команда {command}")
+        if not args:
+            raise ValueError(f"не указана партия: {command}")
+        session = self.sessions.get(int(args[0]) if args[0].isdigit() else None)
+        if session is None:
+            raise ValueError(f"нет партии {args[0]}")
+        game = session.game
+        if command == 'join':
+            return self.join(connection, session)
+        if command == 'move':
+            return self.human_move(connection, session, args[1:])
+        if command == 'fen':
+            return f"fen {session.id} {game.board.to_fen()}"
+        if command == 'clock':
+            if session.started():
+                game.update_timer()
+            reply = f"clock {session.id} {session.clocks()}"
+            if game.game_over:
+                connection.send(reply)
+                self.finish(session)  # Флажок упал: итог всем участникам сразу, не дожидаясь таймера
+                return None
+            return reply
+        color = self.color_of(connection, session)  # resign
+        self.finish(session, 'black' if color == 'white' else 'white', 'resignation')
+        return None
+
+    def new_session(self, connection, args):
+        if len(self.sessions) >= self.max_sessions:
+            raise ValueError("сервер заполнен")
+        color = args[0] if args else 'white'
+        opponent = args[1] if len(args) > 1 else ИИ
+        if color not in COLORS or opponent not in (ИИ, 'human'):
+            raise ValueError("new <white|black> [ai|human] [секунды]")
+        clock = float(args[2]) if len(args) > 2 else self.clock
+        # Поиск сессии идет в пуле: своя таблица транспозиций, книга и таблицы ей не нужны
+        game = Game(self.movegen, workers=1, clock=clock, hash_mb=0, book=None, tablebase=None)
+        players = {color: connection, 'black' if color == 'white' else 'white': ИИ if opponent == ИИ else None}
+        session = Session(next(self.ids), game, players)
+        self.sessions[session.id] = session
+        connection.sessions.add(session.id)
+        connection.send(f"ok new {session.id} {color}")
+        if session.started():
+            self.start(session)
+        return None
+
+    def join(self, connection, session):
+        free = [color for color, player in session.players.items() if player is None]
+        if not free:
+            raise ValueError(f"в партии {session.id} нет свободного места")
+        session.players[free[0]] = connection
+        connection.sessions.add(session.id)
+        for player in self.humans(session):
+            player.send(f"ok join {session.id} {free[0]}" if player is connection else f"joined {session.id}")
+        self.start(session)
+        return None
+
+    def start(self, session):
+        session.game.start_time = time.time()  # Часы идут с момента, когда за доской оба игрока
+        self.next_turn(session)
+
+    def humans(self, session):
+        return [player for player in session.players.values() if isinstance(player, Connection)]
+
+    def color_of(self, connection, session):
+        for color, player in session.players.items():
+            if player is connection:
+                return color
+        raise ValueError(f"вы не играете в партии {session.id}")
+
+    def human_move(self, connection, session, args):
+        game = session.game
+        if not session.started():
+            raise ValueError(f"партия {session.id} еще не началась")
+        if self.color_of(connection, session) != game.current_player:
+            raise ValueError("сейчас не ваш ход")
+        move = game.parse_move(args[0]) if args else None
+        if move is None:
+            raise ValueError(f"недопустимый ход {' '.join(args)}")
+        self.play(session, move)
+        return None
+
+    def play(self, session, move):
+        game = session.game
+        game.update_timer()
+        if game.game_over:
+            self.finish(session)  # Флажок упал, пока сторона думала
+            return
+        game.play(move)
+        for player in self.humans(session):
+            player.send(f"move {session.id} {move_to_uci(move)} {session.clocks()}")
+        if game.game_over:
+            self.finish(session)
+        else:
+            self.next_turn(session)
+
+    def next_turn(self, session):
+        """Заводит проверку флажка и, если ходит ИИ, отдает позицию в пул"""
+        game = session.game
+        self.arm_flag(session)
+        if session.players[game.current_player] is ИИ:
+            time_limit = min(self.movetime, game.computer_time_limit())
+            future = asyncio.get_running_loop().run_in_executor(self.pool, _think, game.start_fen, list(game.history), time_limit)
+            future.add_done_callback(lambda done: self.on_computer_move(session, done))
+
+    def on_computer_move(self, session, future):
+        if session.id not in self.sessions:
+            return  # Партия закончилась, пока ИИ думал
+        try:
+            move = future.result()
+        except Exception as error:
+            print(f"Ошибка ИИ в партии {session.id}: {error!r}", file=sys.stderr)
+            self.finish(session, None, 'error')
+            return
+        self.play(session, move)
+
+    def check_flag(self, session):
+        session.timer = None
+        if session.id not in self.sessions:
+            return
+        session.game.update_timer()
+        if session.game.game_over:
+            self.finish(session)
+        else:
+            self.arm_flag(session)
+
+    def arm_flag(self, session):
+        """Таймер на момент, когда у стороны, чей ход, кончится время"""
+        game = session.game
+        if session.timer is not None:
+            session.timer.cancel()
+        remaining = game.white_time if game.current_player == 'white' else game.black_time
+        session.timer = asyncio.get_running_loop().call_later(remaining + 0.01, self.check_flag, session)
+
+    def finish(self, session, winner=None, reason=None):
+        """Закрывает партию и рассылает итог; winner и reason - если партия кончилась не по правилам"""
+        game = session.game
+        if reason is not None:
+            game.game_over = True
+            game.winner = winner
+            game.reason = reason
+        if session.timer is not None:
+            session.timer.cancel()
+        self.sessions.pop(session.id, None)
+        for player in self.humans(session):
+            player.sessions.discard(session.id)
+            player.send(f"end {session.id} {game.result()} {game.reason}")
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def serve(host, port, server):
+    listener = await asyncio.start_server(server.handle_client, host, port)
+    print(f"Сервер слушает {host}:{port}")
+    async with listener:
+        await listener.serve_forever()
+
+
+async def run_client(host, port, games, connections, clock, seed):
+    """Тестовый клиент: games партий случайными ходами против ИИ по connections соединениям"""
+    rng = random.Random(seed)
+    movegen = get_generator()
+    outcomes = Counter()
+    plies = 0
+    started = time.perf_counter()
+
+    async def player(count):
+        nonlocal plies
+        reader, writer = await asyncio.open_connection(host, port)
+        positions = {}  # id партии -> Position на стороне клиента
+        colors = {}
+        pending = 0
+
+        def reply(session_id):
+            position = positions[session_id]
+            moves = movegen.legal_moves(position)
+            if moves and position.side >> 3 == colors[session_id]:  # Без ходов - ждем 'end'
+                move = rng.choice(moves)
+                writer.write(f"move {session_id} {move_to_uci(move)}\n".encode())
+
+        for _ in range(count):
+            writer.write(f"new {rng.choice(COLORS)} ai {clock}\n".encode())
+            pending += 1
+        while pending or positions:
+            line = await reader.readline()
+            if not line:
+                break
+            parts = line.decode().split()
+            if parts[0] == 'ok' and parts[1] == 'new':
+                pending -= 1
+                session_id = parts[2]
+                positions[session_id] = Position.from_fen(START_FEN)
+                colors[session_id] = COLORS.index(parts[3])
+                reply(session_id)
+            elif parts[0] == 'move':
+                position = positions[parts[1]]
+                position.make_move(next(move for move in movegen.legal_moves(position)
+                                        if move_to_uci(move) == parts[2]))
+                plies += 1
+                reply(parts[1])
+            elif parts[0] == 'end':
+                del positions[parts[1]]
+                outcomes[(parts[2], parts[3])] += 1
+            elif parts[0] == 'error':
+                print(line.decode().rstrip(), file=sys.stderr)
+            await writer.drain()
+        writer.write(b"quit\n")
+        writer.close()
+
+    shares = [games // connections + (1 if index < games % connections else 0) for index in range(connections)]
+    await asyncio.gather(*(player(count) for count in shares if count))
+    seconds = time.perf_counter() - started
+    finished = sum(outcomes.values())
+    print(f"Партий: {finished} за {seconds:.2f} с, ходов: {plies}")
+    if seconds > 0:
+        print(f"Партий/с: {finished / seconds:.2f}, ходов/с: {plies / seconds:.1f}")
+    for (result, reason), count in sorted(outcomes.items(), key=lambda item: -item[1]):
+        print(f"  {result:8} {reason:12} {count:6}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сервер партий и тестовый клиент")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help="запустить сервер")
+    serve_parser.add_argument('--host', default=ХОСТ, help="адрес")
+    serve_parser.add_argument('--port', type=int, default=ПОРТ, help="порт")
+    serve_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="процессов для ходов ИИ")
+    serve_parser.add_argument('--movegen', choices=sorted(GENERATORS), default='mailbox', help="генератор ходов")
+    serve_parser.add_argument('--clock', type=float, default=ВРЕМЯ_НА_ПАРТИЮ, help="время на партию по умолчанию, с")
+    serve_parser.add_argument('--movetime', type=float, default=МАКС_ВРЕМЯ_НА_ХОД, help="предел раздумий ИИ на ход, с")
+    serve_parser.add_argument('--hash', type=int, default=ХЕШ_ВОРКЕРА_МБ, help="таблица транспозиций процесса, МБ")
+    serve_parser.add_argument('--book', default=ФАЙЛ_КНИГИ, help="дебютная книга ('' - без книги)")
+    serve_parser.add_argument('--tablebase', default=ПАПКА_ТАБЛИЦ, help="папка эндшпильных таблиц ('' - без таблиц)")
+    serve_parser.add_argument('--max-sessions', type=int, default=МАКС_СЕССИЙ, help="предел одновременных партий")
+    client_parser = commands.add_parser('client', help="тестовый клиент: случайные ходы против ИИ")
+    client_parser.add_argument('--host', default=ХОСТ, help="адрес")
+    client_parser.add_argument('--port', type=int, default=ПОРТ, help="порт")
+    client_parser.add_argument('--games', type=int, default=100, help="сколько партий играть одновременно")
+    client_parser.add_argument('--connections', type=int, default=10, help="число соединений")
+    client_parser.add_argument('--clock', type=float, default=60, help="время на партию, с")
+    client_parser.add_argument('--seed', type=int, default=0, help="начальное значение для случайных ходов")
+    args = parser.parse_args(argv)
+
+    if args.command == 'client':
+        asyncio.run(run_client(args.host, args.port, args.games, max(1, args.connections), args.clock, args.seed))
+        return 0
+    server = GameServer(max(1, args.workers), args.movegen, args.clock, args.movetime,
+                        args.hash, args.book, args.tablebase, args.max_sessions)
+    try:
+        asyncio.run(serve(args.host, args.port, server))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
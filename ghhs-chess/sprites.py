@@ -0,0 +1,144 @@
+"""Картинки фигур и шрифты окна - один кеш на весь процесс.
+
+Двенадцать PNG фигур собираются в один атлас (строка белых, строка черных). Под каждый
+размер клетки атлас масштабируется один раз, фигуры - его подповерхности; шрифты
+создаются один раз на имя и размер. Новая партия и смена размера доски картинки с
+диска не читают.
+
+Папка assets ищется рядом с этим файлом (или в папке распаковки PyInstaller), а не в
+текущей папке. Готовый атлас сохраняется в assets/atlas.png и при следующем запуске
+читается вместо исходных PNG; собрать его заранее, например перед сборкой PyInstaller:
+
+    python sprites.py
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pygame
+
+from position import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, PIECE_NAMES
+
+ПАПКА_РЕСУРСОВ = os.path.join(getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__))), 'assets')
+ФАЙЛ_АТЛАСА = os.path.join(ПАПКА_РЕСУРСОВ, 'atlas.png')
+РАЗМЕР_СПРАЙТА = 256  # Клетка атласа: до такого размера клетки доски фигуры только уменьшаются
+РАЗМЕРОВ_В_КЕШЕ = 8  # Сколько размеров клетки держать отмасштабированными
+
+KINDS = (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING)
+FILES = {
+    WHITE | PAWN: 'White_Pawn.png',
+    WHITE | KNIGHT: 'White_Knight.png',
+    WHITE | BISHOP: 'White_Bishop.png',
+    WHITE | ROOK: 'White_rook.png',
+    WHITE | QUEEN: 'White_Queen.png',
+    WHITE | KING: 'White_King.png',
+    BLACK | PAWN: 'Black_Pawn.png',
+    BLACK | KNIGHT: 'Black_Knight.png',
+    BLACK | BISHOP: 'Black_Bishop.png',
+    BLACK | ROOK: 'Black_Rook.png',
+    BLACK | QUEEN: 'Black_Queen.png',
+    BLACK | KING: 'Black_King.png',
+}
+PLACEHOLDER_COLORS = {WHITE: (255, 0, 0), BLACK: (0, 0, 255)}  # Заглушка вместо отсутствующей картинки
+
+_atlas = None
+_scaled = {}  # Размер клетки -> {имя фигуры: поверхность}
+_fonts = {}  # (имя, размер) -> шрифт
+
+
+def cell(code, size):
+    """Место фигуры в атласе с клеткой size: (x, y, size, size)"""
+    return KINDS.index(code & 7) * size, (code >> 3) * size, size, size
+
+
+def build_atlas():
+    """Собирает атлас из отдельных PNG (медленно: исходные картинки большие)"""
+    atlas = pygame.Surface((len(KINDS) * РАЗМЕР_СПРАЙТА, 2 * РАЗМЕР_СПРАЙТА), pygame.SRCALPHA)
+    for code, filename in FILES.items():
+        rect = cell(code, РАЗМЕР_СПРАЙТА)
+        try:
+            image = pygame.image.load(os.path.join(ПАПКА_РЕСУРСОВ, filename))
+            if image.get_bitsize() < 24:
+                image = image.convert(32, pygame.SRCALPHA)  # smoothscale работает только с 24 и 32 битами
+            atlas.blit(pygame.transform.smoothscale(image, rect[2:]), rect)
+        except (pygame.error, FileNotFoundError):
+            print(f"Не удалось загрузить {filename}")
+            atlas.fill(PLACEHOLDER_COLORS[code & BLACK], rect)
+    return atlas
+
+
+def _read_atlas():
+    """Сохраненный атлас, если он не старше исходных картинок, иначе None"""
+    try:
+        saved = os.path.getmtime(ФАЙЛ_АТЛАСА)
+        if any(os.path.getmtime(os.path.join(ПАПКА_РЕСУРСОВ, filename)) > saved for filename in FILES.values()):
+            return None
+        return pygame.image.load(ФАЙЛ_АТЛАСА)
+    except (OSError, pygame.error):
+        return None
+
+
+def save_atlas(atlas, path=ФАЙЛ_АТЛАСА):
+    try:
+        pygame.image.save(atlas, path)
+    except (OSError, pygame.error) as error:
+        print(f"Не удалось сохранить атлас: {error}")
+
+
+def load_atlas():
+    """Атлас фигур: из памяти, из assets/atlas.png или собранный заново (и сохраненный)"""
+    global _atlas
+    if _atlas is None:
+        atlas = _read_atlas()
+        if atlas is None:
+            atlas = build_atlas()
+            if os.access(ПАПКА_РЕСУРСОВ, os.W_OK):  # В папке распаковки PyInstaller не сохраняем
+                save_atlas(atlas)
+        _atlas = atlas
+    return _atlas
+
+
+def pieces(size):
+    """Картинки фигур под клетку size x size: {'white_pawn': Surface, ...}"""
+    images = _scaled.get(size)
+    if images is None:
+        if len(_scaled) >= РАЗМЕРОВ_В_КЕШЕ:
+            _scaled.clear()  # Окно много раз меняло размер - старые размеры уже не нужны
+        atlas = load_atlas()
+        target = (len(KINDS) * size, 2 * size)
+        if size <= РАЗМЕР_СПРАЙТА:
+            scaled = pygame.transform.smoothscale(atlas, target)
+        else:
+            scaled = pygame.transform.scale(atlas, target)  # Увеличение: без сглаживания не смешиваем соседние клетки
+        if pygame.display.get_surface() is not None:
+            scaled = scaled.convert_alpha()  # Формат экрана - быстрее вывод
+        images = _scaled[size] = {PIECE_NAMES[code]: scaled.subsurface(cell(code, size)) for code in FILES}
+    return images
+
+
+def font(name, size):
+    """Системный шрифт: поиск по системе и загрузка - один раз на имя и размер"""
+    key = (name, size)
+    result = _fonts.get(key)
+    if result is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        result = _fonts[key] = pygame.font.SysFont(name, size)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Собирает атлас фигур из картинок в assets")
+    parser.add_argument('--output', default=ФАЙЛ_АТЛАСА, help="куда сохранить атлас")
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    atlas = build_atlas()
+    save_atlas(atlas, args.output)
+    print(f"Атлас {atlas.get_width()}x{atlas.get_height()} за {time.perf_counter() - started:.2f} с: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
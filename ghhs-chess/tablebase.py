@@ -0,0 +1,603 @@
+"""Эндшпильные таблицы для 2-4 фигур: ретроградный анализ, компактные файлы и чтение через mmap.
+
+Для каждого соотношения материала ('KQvK', 'KRvKB', ...) строятся два файла:
+    <имя>.dtm - байт на позицию: расстояние до мата в ходах и исход
+    <имя>.wdl - 2 бита на позицию: выигрыш / ничья / проигрыш (для отсечений в поиске)
+
+Индекс позиции: очередь хода, клетка белого короля на вертикалях a-d (доску с королем
+на e-h отражаем зеркально - рокировок в таблицах нет) и клетки остальных фигур. Взятие
+на проходе и рокировки таблицы не учитывают: в таких позициях зонд возвращает None.
+
+Построение идет от меньшего материала к большему: взятия и превращения ведут в уже
+готовые таблицы, таблицы одного уровня считаются параллельно в пуле процессов.
+
+    python tablebase.py build                      # все таблицы до 3 фигур
+    python tablebase.py build --pieces 4 --workers 4
+    python tablebase.py build KQvKR                # одна таблица и все, от которых она зависит
+    python tablebase.py probe "8/8/8/8/8/2k5/8/K6Q w - - 0 1"
+
+Построение на чистом Python: все таблицы из 3 фигур считаются меньше минуты, каждая из 4 -
+минуты (KRvKN - около 6 минут на одном ядре), все вместе из 4 - часы без --workers.
+"""
+
+import argparse
+import mmap
+import multiprocessing
+import os
+import sys
+from itertools import combinations_with_replacement
+
+from position import Position, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, coords
+
+ПАПКА_ТАБЛИЦ = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables')
+
+# Исходы с точки зрения стороны, чей ход
+WIN, DRAW, LOSS = 1, 0, -1
+
+# Байт в файле .dtm: 0 - ничья, 1..127 - выигрыш за N ходов, 128..254 - проигрыш через N ходов
+DTM_DRAW, DTM_LOSS, DTM_INVALID = 0, 128, 255
+# 2 бита в файле .wdl
+WDL_CODES = {DRAW: 0, WIN: 1, LOSS: 2}
+WDL_VALUES = (DRAW, WIN, LOSS, None)
+
+ORDER = (KING, QUEEN, ROOK, BISHOP, KNIGHT, PAWN)  # Порядок фигур в имени таблицы и в индексе
+LETTERS = {KING: 'K', QUEEN: 'Q', ROOK: 'R', BISHOP: 'B', KNIGHT: 'N', PAWN: 'P'}
+KINDS = {letter: kind for kind, letter in LETTERS.items()}
+RANK = {kind: len(ORDER) - index for index, kind in enumerate(ORDER)}
+PROMOTION_KINDS = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+
+# Геометрия доски 8x8: клетка = строка * 8 + столбец (строка 0 - восьмая горизонталь)
+def _targets(offsets):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        table.append(tuple((row + dr) * 8 + col + dc for dr, dc in offsets
+                           if 0 <= row + dr < 8 and 0 <= col + dc < 8))
+    return tuple(table)
+
+
+def _rays(directions):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        rays = []
+        for dr, dc in directions:
+            ray = []
+            r, c = row + dr, col + dc
+            while 0 <= r < 8 and 0 <= c < 8:
+                ray.append(r * 8 + c)
+                r, c = r + dr, c + dc
+            if ray:
+                rays.append(tuple(ray))
+        table.append(tuple(rays))
+    return tuple(table)
+
+
+KING_TARGETS = _targets([(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)])
+KNIGHT_TARGETS = _targets([(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)])
+PAWN_CAPTURES = (_targets([(-1, -1), (-1, 1)]), _targets([(1, -1), (1, 1)]))  # [индекс цвета][клетка]
+ROOK_RAYS = _rays([(-1, 0), (1, 0), (0, -1), (0, 1)])
+BISHOP_RAYS = _rays([(-1, -1), (-1, 1), (1, -1), (1, 1)])
+SLIDER_RAYS = {ROOK: ROOK_RAYS, BISHOP: BISHOP_RAYS, QUEEN: tuple(r + b for r, b in zip(ROOK_RAYS, BISHOP_RAYS))}
+STEP_TARGETS = {KING: KING_TARGETS, KNIGHT: KNIGHT_TARGETS}
+KING_SETS = tuple(frozenset(targets) for targets in KING_TARGETS)
+KNIGHT_SETS = tuple(frozenset(targets) for targets in KNIGHT_TARGETS)
+PAWN_CAPTURE_SETS = tuple(tuple(frozenset(targets) for targets in table) for table in PAWN_CAPTURES)
+
+# LINES[a][b] - тип линии между клетками (ROOK, BISHOP или 0), BETWEEN[a][b] - клетки между ними
+LINES = [[0] * 64 for _ in range(64)]
+BETWEEN = [[()] * 64 for _ in range(64)]
+for _kind, _table in ((ROOK, ROOK_RAYS), (BISHOP, BISHOP_RAYS)):
+    for _sq in range(64):
+        for _ray in _table[_sq]:
+            for _i, _to in enumerate(_ray):
+                LINES[_sq][_to] = _kind
+                BETWEEN[_sq][_to] = _ray[:_i]
+
+# Клетки белого короля в индексе: вертикали a-d
+KING_SQUARES = tuple(row * 8 + col for row in range(8) for col in range(4))
+KING_INDEX = {sq: index for index, sq in enumerate(KING_SQUARES)}
+
+
+def attacks(kind, color, frm, target, occupied):
+    """Бьет ли фигура с клетки frm клетку target"""
+    if kind == KING:
+        return target in KING_SETS[frm]
+    if kind == KNIGHT:
+        return target in KNIGHT_SETS[frm]
+    if kind == PAWN:
+        return target in PAWN_CAPTURE_SETS[color >> 3][frm]
+    line = LINES[frm][target]
+    if not line or (kind != QUEEN and kind != line):
+        return False
+    for sq in BETWEEN[frm][target]:
+        if sq in occupied:
+            return False
+    return True
+
+
+def is_attacked(target, by_color, pieces, squares, occupied):
+    for (color, kind), sq in zip(pieces, squares):
+        if color == by_color and sq is not None and attacks(kind, color, sq, target, occupied):
+            return True
+    return False
+
+
+def table_name(white, black):
+    """Имя таблицы по типам фигур сторон ('KQvKR')"""
+    def letters(kinds):
+        return ''.join(LETTERS[kind] for kind in sorted(kinds, key=ORDER.index))
+    return f"{letters(white)}v{letters(black)}"
+
+
+def strength(kinds):
+    return len(kinds), sorted((RANK[kind] for kind in kinds), reverse=True)
+
+
+def canonical(white, black):
+    """Имя таблицы, в которой лежит такой материал, и нужно ли поменять цвета"""
+    if strength(black) > strength(white):
+        return table_name(black, white), True
+    return table_name(white, black), False
+
+
+def encode_dtm(result, moves):
+    if result == DRAW:
+        return DTM_DRAW
+    if moves > 126:
+        raise ValueError(f"Расстояние до мата {moves} не помещается в байт")
+    return moves if result == WIN else DTM_LOSS + moves
+
+
+def decode_dtm(value):
+    """(исход, расстояние до мата в полуходах) по байту .dtm; None для невозможной позиции"""
+    if value == DTM_INVALID:
+        return None
+    if value == DTM_DRAW:
+        return DRAW, 0
+    if value < DTM_LOSS:
+        return WIN, 2 * value - 1  # Выигрыш - нечетное число полуходов, последний ход - мат
+    return LOSS, 2 * (value - DTM_LOSS)
+
+
+class Table:
+    """Раскладка индекса одной таблицы"""
+
+    def __init__(self, name):
+        self.name = name
+        white, black = name.split('v')
+        self.pieces = [(WHITE, KINDS[letter]) for letter in white] + [(BLACK, KINDS[letter]) for letter in black]
+        self.white_count = len(white)
+        self.count = len(self.pieces)
+        self.has_pawns = 'P' in name
+        self.size = 2 * len(KING_SQUARES) << 6 * (self.count - 1)
+
+    def index(self, side, squares):
+        """Индекс позиции: side - 0 (ход белых) или 1, squares - клетки фигур в порядке self.pieces"""
+        if squares[0] & 7 > 3:
+            squares = [sq ^ 7 for sq in squares]  # Зеркально по вертикали: король на a-d
+        index = side * len(KING_SQUARES) + KING_INDEX[squares[0]]
+        for sq in squares[1:]:
+            index = (index << 6) | sq
+        return index
+
+    def decode(self, index):
+        squares = [0] * self.count
+        for slot in range(self.count - 1, 0, -1):
+            squares[slot] = index & 63
+            index >>= 6
+        side, king = divmod(index, len(KING_SQUARES))
+        squares[0] = KING_SQUARES[king]
+        return side, squares
+
+    def subtables(self):
+        """Таблицы, куда ведут взятия и превращения"""
+        names = set()
+        white = [kind for color, kind in self.pieces if color == WHITE]
+        black = [kind for color, kind in self.pieces if color == BLACK]
+        for own, other, color in ((white, black, WHITE), (black, white, BLACK)):
+            for i, kind in enumerate(own):
+                if kind == KING:
+                    continue
+                rest = own[:i] + own[i + 1:]
+                sides = (rest, other) if color == WHITE else (other, rest)
+                names.add(canonical(*sides)[0])  # Фигуру взяли
+                if kind == PAWN:
+                    for promotion in PROMOTION_KINDS:
+                        changed = rest + [promotion]
+                        sides = (changed, other) if color == WHITE else (other, changed)
+                        names.add(canonical(*sides)[0])  # Пешка превратилась
+        return names
+
+
+def material_key(placed):
+    """Имя таблицы, нужна ли смена цветов и клетки фигур в порядке таблицы.
+
+    placed - список (цвет, тип, клетка); при смене цветов доска отражается по горизонтали.
+    """
+    white = [kind for color, kind, _ in placed if color == WHITE]
+    black = [kind for color, kind, _ in placed if color == BLACK]
+    name, flipped = canonical(white, black)
+    order = sorted(placed, key=lambda piece: (piece[0] != (BLACK if flipped else WHITE), ORDER.index(piece[1])))
+    squares = [sq ^ 56 if flipped else sq for _, _, sq in order]
+    return name, flipped, squares
+
+
+def generate_moves(table, side, squares):
+    """Допустимые ходы: (номер фигуры, новые клетки, номер взятой фигуры или None, превращение)"""
+    pieces = table.pieces
+    color = BLACK if side else WHITE
+    occupied = set(squares)
+    owner = {sq: slot for slot, sq in enumerate(squares)}
+    king_slot = 0 if color == WHITE else table.white_count
+    moves = []
+    for slot, (piece_color, kind) in enumerate(pieces):
+        if piece_color != color:
+            continue
+        frm = squares[slot]
+        targets = []  # (клетка, превращение)
+        if kind == PAWN:
+            step = -8 if color == WHITE else 8
+            to = frm + step
+            last = to < 8 or to >= 56
+            if to not in occupied:
+                targets.extend((to, promotion) for promotion in PROMOTION_KINDS) if last else targets.append((to, 0))
+                start_row = 6 if color == WHITE else 1
+                if frm >> 3 == start_row and to + step not in occupied:
+                    targets.append((to + step, 0))
+            for to in PAWN_CAPTURES[side][frm]:
+                if to in occupied and pieces[owner[to]][0] != color:
+                    targets.extend((to, promotion) for promotion in PROMOTION_KINDS) if last else targets.append((to, 0))
+        elif kind in STEP_TARGETS:
+            for to in STEP_TARGETS[kind][frm]:
+                if to not in occupied or pieces[owner[to]][0] != color:
+                    targets.append((to, 0))
+        else:
+            for ray in SLIDER_RAYS[kind][frm]:
+                for to in ray:
+                    if to in occupied:
+                        if pieces[owner[to]][0] != color:
+                            targets.append((to, 0))
+                        break
+                    targets.append((to, 0))
+
+        for to, promotion in targets:
+            captured = owner.get(to)
+            new = list(squares)
+            new[slot] = to
+            if captured is not None:
+                new[captured] = None
+            new_occupied = occupied - {frm} | {to}
+            king = to if slot == king_slot else new[king_slot]
+            if not is_attacked(king, color ^ BLACK, pieces, new, new_occupied):
+                moves.append((slot, new, captured, promotion))
+    return moves
+
+
+def is_valid(table, side, squares):
+    """Позиция возможна: фигуры на разных клетках, пешки не на крайних горизонталях,
+    король стороны, которая только что ходила, не под шахом"""
+    if len(set(squares)) != table.count:
+        return False
+    for (color, kind), sq in zip(table.pieces, squares):
+        if kind == PAWN and (sq < 8 or sq >= 56):
+            return False
+    waiting = WHITE if side else BLACK
+    king = squares[0 if waiting == WHITE else table.white_count]
+    return not is_attacked(king, waiting ^ BLACK, table.pieces, squares, set(squares))
+
+
+def unmoves(table, side, squares):
+    """Позиции, из которых ходом без взятия и превращения получается эта (ход у side ^ 1)"""
+    pieces = table.pieces
+    color = WHITE if side else BLACK  # Цвет, который только что ходил
+    occupied = set(squares)
+    result = []
+    for slot, (piece_color, kind) in enumerate(pieces):
+        if piece_color != color:
+            continue
+        to = squares[slot]
+        sources = []
+        if kind == PAWN:
+            back = 8 if color == WHITE else -8
+            frm = to + back
+            if frm not in occupied and 8 <= frm < 56:
+                sources.append(frm)
+                double_row = 4 if color == WHITE else 3
+                if to >> 3 == double_row and frm + back not in occupied:
+                    sources.append(frm + back)
+        elif kind in STEP_TARGETS:
+            sources = [frm for frm in STEP_TARGETS[kind][to] if frm not in occupied]
+        else:
+            for ray in SLIDER_RAYS[kind][to]:
+                for frm in ray:
+                    if frm in occupied:
+                        break
+                    sources.append(frm)
+        for frm in sources:
+            previous = list(squares)
+            previous[slot] = frm
+            # В предыдущей позиции ждала хода сторона side - ее король не может быть под шахом
+            waiting_king = previous[0 if side == 0 else table.white_count]
+            if not is_attacked(waiting_king, color, pieces, previous, occupied - {to} | {frm}):
+                result.append(table.index(side ^ 1, previous))
+    return result
+
+
+class Loader:
+    """Готовые таблицы в памяти процесса (для построения следующих)"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.cache = {}
+
+    def value(self, placed, side):
+        """(исход, полуходы до мата) для позиции из другой таблицы; side - 0/1, чей ход"""
+        if len(placed) == 2:
+            return DRAW, 0  # Одни короли
+        name, flipped, squares = material_key(placed)
+        if name not in self.cache:
+            with open(os.path.join(self.directory, name + '.dtm'), 'rb') as source:
+                self.cache[name] = (Table(name), source.read())
+        table, data = self.cache[name]
+        return decode_dtm(data[table.index(side ^ flipped, squares)])
+
+
+def build_table(name, directory):
+    """Ретроградный анализ одной таблицы; пишет <имя>.dtm и <имя>.wdl"""
+    table = Table(name)
+    loader = Loader(directory)
+    size = table.size
+    values = bytearray(size)
+    resolved = bytearray(size)
+    remaining = bytearray(size)  # Ходы, исход которых еще неизвестен или не проигрыш соперника
+    external_max = bytearray(size)  # Самый долгий проигрыш соперника среди ходов в другие таблицы
+    buckets = {}  # Полуходы до мата -> [(исход, индекс)]
+
+    def push(plies, result, index):
+        buckets.setdefault(plies, []).append((result, index))
+
+    # Проход 1: ходы каждой позиции; исходы взятий и превращений известны из готовых таблиц
+    for index in range(size):
+        side, squares = table.decode(index)
+        if not is_valid(table, side, squares):
+            values[index] = DTM_INVALID
+            resolved[index] = 1
+            continue
+        moves = generate_moves(table, side, squares)
+        best_win = None
+        count = 0
+        for slot, new, captured, promotion in moves:
+            if captured is None and not promotion:
+                count += 1
+                continue
+            placed = [(color, promotion if i == slot and promotion else kind, sq)
+                      for i, ((color, kind), sq) in enumerate(zip(table.pieces, new)) if sq is not None]
+            result, plies = loader.value(placed, side ^ 1)
+            if result == LOSS:
+                best_win = plies + 1 if best_win is None else min(best_win, plies + 1)
+            elif result == WIN:
+                external_max[index] = max(external_max[index], plies)
+            else:
+                count += 1  # Ход в ничью: позиция не проиграна никогда
+        remaining[index] = count
+        if best_win is not None:
+            push(best_win, WIN, index)
+        elif not moves:
+            king = squares[0 if side == 0 else table.white_count]
+            if is_attacked(king, WHITE if side else BLACK, table.pieces, squares, set(squares)):
+                push(0, LOSS, index)  # Мат
+            else:
+                resolved[index] = 1  # Пат
+        elif not count:
+            push(external_max[index] + 1, LOSS, index)
+
+    # Проход 2: от известных исходов назад по ходам, в порядке роста расстояния до мата
+    plies = 0
+    while buckets:
+        for result, index in buckets.pop(plies, ()):
+            if resolved[index]:
+                continue
+            resolved[index] = 1
+            values[index] = encode_dtm(result, (plies + 1) // 2)
+            side, squares = table.decode(index)
+            for previous in unmoves(table, side, squares):
+                if resolved[previous]:
+                    continue
+                if result == LOSS:
+                    push(plies + 1, WIN, previous)
+                else:
+                    remaining[previous] -= 1
+                    if not remaining[previous]:
+                        push(max(plies, external_max[previous]) + 1, LOSS, previous)
+        plies += 1
+
+    with open(os.path.join(directory, name + '.dtm'), 'wb') as output:
+        output.write(values)
+    wdl = bytearray((size + 3) // 4)
+    for index, value in enumerate(values):
+        decoded = decode_dtm(value)
+        code = 3 if decoded is None else WDL_CODES[decoded[0]]
+        wdl[index >> 2] |= code << ((index & 3) * 2)
+    with open(os.path.join(directory, name + '.wdl'), 'wb') as output:
+        output.write(wdl)
+    return name
+
+
+def all_tables(max_pieces):
+    """Имена всех таблиц с числом фигур от 3 до max_pieces"""
+    names = set()
+    for count in range(1, max_pieces - 1):
+        for extra in combinations_with_replacement((QUEEN, ROOK, BISHOP, KNIGHT, PAWN), count):
+            for split in range(len(extra) + 1):
+                white = [KING] + list(extra[:split])
+                black = [KING] + list(extra[split:])
+                names.add(canonical(white, black)[0])
+    return names
+
+
+def with_dependencies(names):
+    """Таблицы вместе со всеми, от которых они зависят"""
+    result = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name in result or name == 'KvK':
+            continue
+        result.add(name)
+        pending.extend(Table(name).subtables())
+    return result
+
+
+def build(names, directory=ПАПКА_ТАБЛИЦ, workers=1, log=print):
+    """Строит таблицы уровнями: сначала меньше фигур, при равенстве - меньше пешек"""
+    os.makedirs(directory, exist_ok=True)
+    levels = {}
+    for name in with_dependencies(names):
+        levels.setdefault((len(name) - 1, name.count('P')), []).append(name)
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        for level in sorted(levels):
+            todo = sorted(levels[level])
+            tasks = [(name, directory) for name in todo]
+            done = pool.starmap(build_table, tasks) if pool else [build_table(*task) for task in tasks]
+            log(f"Готово: {', '.join(done)}")
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+class Tablebase:
+    """Чтение таблиц во время игры; файлы отображаются в память при первом обращении"""
+
+    def __init__(self, directory=ПАПКА_ТАБЛИЦ):
+        self.directory = directory
+        self.files = {}
+        self.max_pieces = 0
+        if os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                if filename.endswith('.dtm'):
+                    self.max_pieces = max(self.max_pieces, len(filename) - len('v.dtm'))
+
+    def _open(self, name, extension):
+        key = name + extension
+        if key not in self.files:
+            path = os.path.join(self.directory, key)
+            if os.path.exists(path) and os.path.getsize(path):
+                with open(path, 'rb') as source:
+                    self.files[key] = (Table(name), mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ))
+            else:
+                self.files[key] = None
+        return self.files[key]
+
+    def _locate(self, position, extension):
+        """(таблица, данные, индекс) для позиции или None"""
+        if position.castling or position.ep:
+            return None
+        placed = []
+        for color_index in (0, 1):
+            for sq in position.pieces[color_index]:
+                row, col = coords(sq)
+                piece = position.squares[sq]
+                placed.append((piece & BLACK, piece & 7, row * 8 + col))
+        if len(placed) > self.max_pieces:
+            return None
+        name, flipped, squares = material_key(placed)
+        opened = self._open(name, extension)
+        if opened is None:
+            return None
+        table, data = opened
+        return table, data, table.index((position.side >> 3) ^ flipped, squares)
+
+    def probe_wdl(self, position):
+        """WIN, DRAW или LOSS для стороны, чей ход; None, если таблицы нет"""
+        if len(position.pieces[0]) + len(position.pieces[1]) == 2:
+            return DRAW
+        located = self._locate(position, '.wdl')
+        if located is None:
+            return None
+        _, data, index = located
+        return WDL_VALUES[(data[index >> 2] >> ((index & 3) * 2)) & 3]
+
+    def probe_dtm(self, position):
+        """(исход, полуходы до мата) для стороны, чей ход; None, если таблицы нет"""
+        if len(position.pieces[0]) + len(position.pieces[1]) == 2:
+            return DRAW, 0
+        located = self._locate(position, '.dtm')
+        if located is None:
+            return None
+        _, data, index = located
+        return decode_dtm(data[index])
+
+    def best_move(self, position, movegen):
+        """Лучший ход по таблицам: быстрейший мат, иначе ничья, иначе самое долгое сопротивление.
+
+        Возвращает (ход, исход, полуходы до мата) или None, если позиции нет в таблицах.
+        """
+        if self.probe_dtm(position) is None:
+            return None
+        best = None
+        for move in movegen.legal_moves(position):
+            position.make_move(move)
+            probed = self.probe_dtm(position)
+            position.unmake_move()
+            if probed is None:
+                return None
+            result, plies = -probed[0], probed[1] + 1
+            # Выигрыш: чем быстрее, тем лучше; проигрыш: чем дольше, тем лучше
+            rank = (result, -plies if result == WIN else plies)
+            if best is None or rank > best[0]:
+                best = (rank, move, result, plies)
+        return None if best is None else best[1:]
+
+
+# Таблицы на весь процесс: папка -> Tablebase
+_tablebases = {}
+
+
+def open_tablebase(directory=ПАПКА_ТАБЛИЦ):
+    """Таблицы из папки (одни на процесс) или None, если таблиц нет"""
+    if directory not in _tablebases:
+        tablebase = Tablebase(directory) if directory else None
+        _tablebases[directory] = tablebase if tablebase and tablebase.max_pieces else None
+    return _tablebases[directory]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Эндшпильные таблицы")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_parser = commands.add_parser('build', help="построить таблицы")
+    build_parser.add_argument('names', nargs='*', help="таблицы ('KQvKR'); по умолчанию - все до --pieces фигур")
+    build_parser.add_argument('--pieces', type=int, default=3, choices=(3, 4), help="сколько фигур (с королями)")
+    build_parser.add_argument('--directory', default=ПАПКА_ТАБЛИЦ, help="папка для таблиц")
+    build_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="число процессов")
+    probe_parser = commands.add_parser('probe', help="исход позиции и лучший ход")
+    probe_parser.add_argument('fen', help="позиция в FEN")
+    probe_parser.add_argument('--directory', default=ПАПКА_ТАБЛИЦ, help="папка с таблицами")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        names = [canonical(*[[KINDS[letter] for letter in side] for side in name.split('v')])[0]
+                 for name in args.names] or all_tables(args.pieces)
+        build(names, args.directory, max(1, args.workers))
+        return 0
+
+    from movegen import get_generator
+    from position import move_to_uci
+    tablebase = Tablebase(args.directory)
+    position = Position.from_fen(args.fen)
+    probed = tablebase.probe_dtm(position)
+    if probed is None:
+        print("Позиции нет в таблицах")
+        return 1
+    result, plies = probed
+    print({WIN: "Выигрыш", DRAW: "Ничья", LOSS: "Проигрыш"}[result] + (f", мат через {plies} полуходов" if result else ""))
+    best = tablebase.best_move(position, get_generator())
+    if best:
+        print(f"Лучший ход: {move_to_uci(best[0])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Таблица транспозиций фиксированного размера.
+
+Записи лежат в двух массивах array('Q'): ключ Zobrist и упакованные данные, поэтому
+память ограничена заданным числом мегабайт и не растет за долгую игру. Каждая корзина
+содержит две ячейки: первая заменяется только более глубоким (или устаревшим) результатом,
+вторая - всегда.
+"""
+
+from array import array
+
+# Типы оценки
+EXACT, LOWER, UPPER = 0, 1, 2
+
+ENTRY_BYTES = 16  # Ключ + данные
+SCORE_OFFSET = 1 << 20
+TERMINAL_DEPTH = 255  # Позиция без ходов (мат или пат): результат не зависит от глубины
+
+# Упаковка данных: ход (20 бит) | глубина (8) | тип (2) | оценка (21) | поколение (8)
+MOVE_BITS, DEPTH_SHIFT, BOUND_SHIFT, SCORE_SHIFT, AGE_SHIFT = 20, 20, 28, 30, 51
+
+
+class TranspositionTable:
+    """Хеш-таблица результатов поиска с ограниченной памятью"""
+
+    def __init__(self, size_mb=16):
+        self.resize(size_mb)
+
+    def resize(self, size_mb):
+        """Пересоздает таблицу под новый размер (содержимое теряется)"""
+        self.size_mb = size_mb
+        self.buckets = max(1, int(size_mb * 1024 * 1024) // (2 * ENTRY_BYTES))
+        slots = self.buckets * 2
+        self.keys = array('Q', bytes(8 * slots))
+        self.data = array('Q', bytes(8 * slots))
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        self.resize(self.size_mb)
+
+    def new_search(self):
+        """Новое поколение: записи старых поисков можно вытеснять"""
+        self.age = (self.age + 1) & 0xFF
+
+    def probe(self, key):
+        """Возвращает (ход, глубина, тип, оценка) или None"""
+        self.probes += 1
+        index = (key % self.buckets) * 2
+        keys = self.keys
+        if keys[index] == key:
+            data = self.data[index]
+        elif keys[index + 1] == key:
+            data = self.data[index + 1]
+        else:
+            return None
+        self.hits += 1
+        return (data & 0xFFFFF, (data >> DEPTH_SHIFT) & 0xFF, (data >> BOUND_SHIFT) & 3,
+                ((data >> SCORE_SHIFT) & 0x1FFFFF) - SCORE_OFFSET)
+
+    def store(self, key, move, depth, bound, score):
+        index = (key % self.buckets) * 2
+        keys = self.keys
+        data = self.data
+        old = data[index]
+        # Ячейка с приоритетом глубины: та же позиция, не меньшая глубина или старое поколение
+        if (keys[index] == key or depth >= (old >> DEPTH_SHIFT) & 0xFF
+                or (old >> AGE_SHIFT) & 0xFF != self.age):
+            if keys[index] != key and keys[index]:
+                # Вытесненная запись еще может пригодиться - во вторую ячейку
+                keys[index + 1] = keys[index]
+                data[index + 1] = old
+        else:
+            index += 1
+        if not move and keys[index] == key:
+            move = data[index] & 0xFFFFF  # Не теряем известный лучший ход
+        keys[index] = key
+        data[index] = (move | (min(depth, 255) << DEPTH_SHIFT) | (bound << BOUND_SHIFT)
+                       | ((score + SCORE_OFFSET) << SCORE_SHIFT) | (self.age << AGE_SHIFT))
+
+    def best_move(self, key):
+        entry = self.probe(key)
+        return entry[0] if entry else 0
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def usage(self):
+        """Доля занятых ячеек (по выборке первых 1000 корзин)"""
+        sample = min(1000, self.buckets) * 2
+        return sum(1 for i in range(sample) if self.keys[i]) / sample
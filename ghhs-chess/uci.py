@@ -0,0 +1,266 @@
+"""Режим UCI: движок общается с шахматными оболочками и программами для матчей через stdin/stdout.
+
+Запуск:
+    python uci.py
+    python uci.py --movegen bitboard
+
+Поддерживаются команды uci, isready, ucinewgame, setoption (Hash, Threads, MultiPV, OwnBook, TablebasePath),
+position (startpos/fen ... moves ...), go (depth, movetime, wtime/btime, winc/binc,
+movestogo, infinite), stop и quit.
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+from position import START_FEN, move_to_uci
+from movegen import GENERATORS
+from search import MAX_DEPTH, MATE, MATE_BOUND
+from parallel import ParallelSearch
+from engine import Game, ДОЛЯ_ВРЕМЕНИ_НА_ХОД, МИН_ВРЕМЯ_НА_ХОД, ХЕШ_МБ
+from tablebase import open_tablebase, ПАПКА_ТАБЛИЦ, WIN
+import profiler
+
+ИМЯ_ДВИЖКА = "Ghhs-chess"
+АВТОР = "GHHS-Chess"
+МАКС_ХЕШ_МБ = 1024
+МАКС_ПРОЦЕССОВ = 64
+МАКС_ВАРИАНТОВ = 16
+БЕЗ_ОГРАНИЧЕНИЯ_ВРЕМЕНИ = 365 * 24 * 3600  # go depth N и go infinite ищут без часов
+ЗАПАС_ВРЕМЕНИ = 0.05  # Секунды на передачу хода - не доводим часы до нуля
+
+
+def format_score(score):
+    """Оценка для строки info: 'cp N' или 'mate N' (в ходах, минус - мат нам)"""
+    if score >= MATE_BOUND:
+        return f"mate {(MATE - score + 1) // 2}"
+    if score <= -MATE_BOUND:
+        return f"mate {-((MATE + score) // 2)}"
+    return f"cp {score}"
+
+
+def parse_go(args):
+    """Параметры команды go: {'depth': 5, 'wtime': 60000, 'infinite': True, ...}"""
+    params = {}
+    i = 0
+    while i < len(args):
+        name = args[i]
+        if name in ('infinite', 'ponder'):
+            params[name] = True
+            i += 1
+        elif i + 1 < len(args):
+            try:
+                params[name] = int(args[i + 1])
+            except ValueError:
+                pass
+            i += 2
+        else:
+            i += 1
+    return params
+
+
+class UciEngine:
+    """Состояние сеанса UCI: партия, настройки и поток поиска"""
+
+    def __init__(self, movegen='mailbox', output=None):
+        self.movegen_name = movegen
+        self.output = output or sys.stdout
+        self.hash_mb = ХЕШ_МБ
+        self.threads = 1
+        self.multi_pv = 1
+        self.own_book = True
+        self.tablebase = ПАПКА_ТАБЛИЦ
+        self.game = Game(movegen, self.threads, hash_mb=self.hash_mb, tablebase=self.tablebase)
+        self.worker = None
+        self.stop_event = threading.Event()
+        self.print_lock = threading.Lock()
+
+    def send(self, line):
+        with self.print_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def handle(self, line):
+        """Выполняет одну команду; возвращает False на quit"""
+        parts = line.split()
+        if not parts:
+            return True
+        command, args = parts[0], parts[1:]
+        if command == 'uci':
+            self.send(f"id name {ИМЯ_ДВИЖКА}")
+            self.send(f"id author {АВТОР}")
+            self.send(f"option name Hash type spin default {ХЕШ_МБ} min 1 max {МАКС_ХЕШ_МБ}")
+            self.send(f"option name Threads type spin default 1 min 1 max {МАКС_ПРОЦЕССОВ}")
+            self.send(f"option name MultiPV type spin default 1 min 1 max {МАКС_ВАРИАНТОВ}")
+            self.send("option name OwnBook type check default true")
+            self.send(f"option name TablebasePath type string default {ПАПКА_ТАБЛИЦ}")
+            self.send("uciok")
+        elif command == 'isready':
+            self.send("readyok")
+        elif command == 'ucinewgame':
+            self.wait_search()
+            self.game.tt.clear()
+        elif command == 'setoption':
+            self.wait_search()
+            self.set_option(args)
+        elif command == 'position':
+            self.wait_search()
+            self.set_position(args)
+        elif command == 'go':
+            self.wait_search()
+            self.go(parse_go(args))
+        elif command == 'stop':
+            self.stop_event.set()
+        elif command == 'quit':
+            self.wait_search()
+            return False
+        return True
+
+    def set_option(self, args):
+        """setoption name <имя> value <значение>"""
+        if 'name' not in args or 'value' not in args:
+            return
+        name = ' '.join(args[args.index('name') + 1:args.index('value')]).lower()
+        if name == 'ownbook':
+            self.own_book = args[args.index('value') + 1:] == ['true']
+            return
+        if name == 'tablebasepath':
+            self.tablebase = ' '.join(args[args.index('value') + 1:])
+            self.game.tablebase = open_tablebase(self.tablebase)
+            self.rebuild_search()
+            return
+        try:
+            value = int(args[args.index('value') + 1])
+        except (IndexError, ValueError):
+            return
+        if name == 'hash':
+            self.hash_mb = max(1, min(МАКС_ХЕШ_МБ, value))
+        elif name == 'threads':
+            self.threads = max(1, min(МАКС_ПРОЦЕССОВ, value))
+        elif name == 'multipv':
+            self.multi_pv = max(1, min(МАКС_ВАРИАНТОВ, value))
+            return
+        else:
+            return
+        self.rebuild_search()
+
+    def rebuild_search(self):
+        """Поиск с текущими настройками"""
+        self.game.configure_search(self.threads, self.hash_mb, self.tablebase)
+        if isinstance(self.game.search, ParallelSearch):
+            # Процессы создаем из главного потока между чтениями stdin: fork во время
+            # чтения в другом потоке оставляет дочернему процессу занятую блокировку stdin
+            self.game.search.start_pool()
+
+    def set_position(self, args):
+        """position startpos | fen <FEN> [moves <ход> ...]"""
+        moves = []
+        if 'moves' in args:
+            moves = args[args.index('moves') + 1:]
+            args = args[:args.index('moves')]
+        if args[:1] == ['startpos']:
+            fen = START_FEN
+        elif args[:1] == ['fen']:
+            fen = ' '.join(args[1:])
+        else:
+            return
+        game = self.game
+        game.board = game.fen_to_board(fen)
+        game.start_fen = fen
+        game.history = []
+        for text in moves:
+            move = game.parse_move(text)
+            if move is None:
+                self.send(f"info string недопустимый ход {text}")
+                break
+            game.board.make_move(move)
+            game.history.append(move)
+        game.current_player = 'black' if game.board.side else 'white'
+
+    def time_limit(self, params):
+        """Время на ход по параметрам go"""
+        if 'movetime' in params:
+            return max(МИН_ВРЕМЯ_НА_ХОД, params['movetime'] / 1000 - ЗАПАС_ВРЕМЕНИ)
+        side = 'b' if self.game.board.side else 'w'
+        if f'{side}time' not in params:
+            return БЕЗ_ОГРАНИЧЕНИЯ_ВРЕМЕНИ
+        clock = params[f'{side}time'] / 1000
+        increment = params.get(f'{side}inc', 0) / 1000
+        limit = clock / params.get('movestogo', ДОЛЯ_ВРЕМЕНИ_НА_ХОД) + increment * 0.8
+        return max(МИН_ВРЕМЯ_НА_ХОД, min(limit, clock / 2 - ЗАПАС_ВРЕМЕНИ))
+
+    def go(self, params):
+        """Запускает поиск в отдельном потоке, чтобы читать stop и isready во время поиска"""
+        self.stop_event.clear()
+        time_limit = БЕЗ_ОГРАНИЧЕНИЯ_ВРЕМЕНИ if params.get('infinite') else self.time_limit(params)
+        max_depth = max(1, min(MAX_DEPTH, params.get('depth', MAX_DEPTH)))
+        self.worker = threading.Thread(
+            target=self._search,
+            args=(self.game.board.copy(), time_limit, max_depth, bool(params.get('infinite'))),
+            daemon=True)
+        self.worker.start()
+
+    def _search(self, position, time_limit, max_depth, infinite):
+        book = self.game.book
+        if self.own_book and book is not None and not infinite:
+            move = book.choose(position, self.game.movegen)
+            if move is not None:
+                self.send("info string book move")
+                self.send(f"bestmove {move_to_uci(move)}")
+                return
+        tablebase = self.game.tablebase
+        best = tablebase.best_move(position, self.game.movegen) if tablebase is not None and not infinite else None
+        if best is not None:
+            move, result, plies = best
+            score = f"mate {(plies + 1) // 2 if result == WIN else -(plies // 2)}" if result else "cp 0"
+            self.send(f"info depth {plies} score {score} nodes 0 pv {move_to_uci(move)}")
+            self.send(f"bestmove {move_to_uci(move)}")
+            return
+        search = self.game.search
+        multi_pv = self.multi_pv
+        started = time.perf_counter()
+
+        def report(result):
+            elapsed = time.perf_counter() - started
+            stats = f"nodes {result.nodes} nps {int(result.nodes / elapsed) if elapsed > 0 else 0} time {int(elapsed * 1000)}"
+            if multi_pv > 1:
+                # Каждый вариант - отдельной строкой info с номером multipv
+                for index, (score, pv) in enumerate(search.lines(position, multi_pv), start=1):
+                    self.send(f"info depth {result.depth} multipv {index} score {format_score(score)} {stats} "
+                              f"pv {' '.join(move_to_uci(move) for move in pv)}")
+                return
+            pv = search.principal_variation(position, result.depth) or [result.move]
+            self.send(f"info depth {result.depth} score {format_score(result.score)} {stats} "
+                      f"pv {' '.join(move_to_uci(move) for move in pv)}")
+
+        result = search.search(position, time_limit, max_depth, stop_event=self.stop_event, on_iteration=report,
+                               multi_pv=multi_pv)
+        if infinite:
+            self.stop_event.wait()  # В режиме infinite ход отдаем только после stop
+        self.send(f"bestmove {move_to_uci(result.move) if result.move is not None else '0000'}")
+
+    def wait_search(self):
+        """Останавливает текущий поиск и ждет его bestmove"""
+        if self.worker is not None:
+            self.stop_event.set()
+            self.worker.join()
+            self.worker = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Движок в режиме UCI")
+    parser.add_argument('--movegen', choices=sorted(GENERATORS), default='mailbox', help="генератор ходов")
+    args = parser.parse_args(argv)
+
+    profiler.enable_from_env()  # GHHS_PROFILE=файл.json - замеры сеанса при выходе
+    engine = UciEngine(args.movegen)
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    engine.wait_search()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())